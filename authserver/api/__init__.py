@@ -6,3 +6,6 @@ from authserver.api.role import role_bp
 from authserver.api.home import home_bp
 from authserver.api.scope import scope_bp
 from authserver.api.password_recovery import password_recovery_bp
+from authserver.api.permissions import permissions_bp
+from authserver.api.well_known import well_known_bp
+from authserver.api.export import export_bp
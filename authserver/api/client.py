@@ -11,10 +11,14 @@ from uuid import uuid4
 
 from flask import Blueprint
 from flask_restful import Api, Resource, request
+from injector import inject
+from sqlalchemy.orm import selectinload
 from werkzeug.security import gen_salt
 
+from authserver.config import AbstractConfiguration
 from authserver.db import (OAuth2Client, OAuth2ClientSchema, Role, User, UserSchema, db)
-from authserver.utilities import ResponseBody, require_oauth
+from authserver.oauth2 import get_token_cache
+from authserver.utilities import ResponseBody, paginate, query_budget, require_oauth
 
 
 class ClientResource(Resource):
@@ -24,19 +28,23 @@ class ClientResource(Resource):
 
     """
 
-    def __init__(self):
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
         self.client_schema = OAuth2ClientSchema()
         self.clients_schema = OAuth2ClientSchema(many=True)
         self.response_handler = ResponseBody()
 
+    @query_budget(3)
     @require_oauth()
     def get(self, id: str = None):
+        query = OAuth2Client.query.options(selectinload(OAuth2Client.roles))
         if not id:
-            clients = OAuth2Client.query.all()
-            clients_obj = self.clients_schema.dump(clients)
-            return self.response_handler.get_all_response(clients_obj)
+            page = paginate(query, OAuth2Client.id, self.config.page_size_default, self.config.page_size_max)
+            clients_obj = self.clients_schema.dump(page.items)
+            return self.response_handler.get_page_response(clients_obj, page.next)
         else:
-            client = OAuth2Client.query.filter_by(id=id).first()
+            client = query.filter_by(id=id).first()
             if client:
                 client_obj = self.client_schema.dump(client)
                 return self.response_handler.get_one_response(client_obj, request={'id': id})
@@ -141,6 +149,7 @@ class ClientResource(Resource):
                 client_obj = self.client_schema.dump(client)
                 db.session.delete(client)
                 db.session.commit()
+                get_token_cache().invalidate_client(client.client_id)
                 return self.response_handler.successful_delete_response('Client', id, client_obj)
             else:
                 return self.response_handler.not_found_response(id)
@@ -0,0 +1,47 @@
+"""Export API
+
+Streams every user, client, role or scope as newline-delimited JSON, for nightly syncs and backups.
+The response is gzip-compressed when the request accepts it.
+
+"""
+
+from flask import Blueprint, Response, stream_with_context
+from flask_restful import Api, Resource, request
+from injector import inject
+
+from authserver.config import AbstractConfiguration
+from authserver.utilities import ResponseBody, require_oauth
+from authserver.utilities.export import EXPORTS, export_ndjson, gzip_stream
+
+
+class ExportResource(Resource):
+    """Export Resource
+
+    `GET /export/<resource>` streams one of `users`, `clients`, `roles` or `scopes`.
+
+    """
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
+        self.response_handler = ResponseBody()
+
+    @require_oauth()
+    def get(self, resource: str):
+        if resource not in EXPORTS:
+            return self.response_handler.not_found_response(resource)
+
+        body = export_ndjson(resource, self.config.export_batch_size)
+        response = Response(mimetype='application/x-ndjson')
+        if 'gzip' in request.accept_encodings:
+            body = gzip_stream(body)
+            response.headers['Content-Encoding'] = 'gzip'
+        response.response = stream_with_context(body)
+        response.headers['Content-Disposition'] = f'attachment; filename={resource}.ndjson'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+export_bp = Blueprint('export_ep', __name__)
+export_api = Api(export_bp)
+export_api.add_resource(ExportResource, '/export/<string:resource>')
@@ -9,6 +9,7 @@ from flask_restful import Resource, Api
 from injector import inject
 from authserver.config import AbstractConfiguration
 from authserver.utilities import require_oauth
+from authserver.utilities.metrics import collect_metrics
 
 
 class HealthCheckResource(Resource):
@@ -22,6 +23,14 @@ class HealthCheckResource(Resource):
         return self.config.get_app_status(), 200
 
 
+class MetricsResource(Resource):
+    """Runtime statistics reported by the components of this worker process."""
+
+    def get(self):
+        return collect_metrics(), 200
+
+
 health_api_bp = Blueprint('health_ep', __name__)
 health_api = Api(health_api_bp)
 health_api.add_resource(HealthCheckResource, '/health')
+health_api.add_resource(MetricsResource, '/health/metrics')
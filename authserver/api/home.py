@@ -1,6 +1,14 @@
+import time
+
 from flask import Blueprint, render_template, request, redirect, session
 from wtforms import Form, StringField, PasswordField, validators
 from authserver.db import User
+from authserver.utilities.login_throttle import LoginThrottled, get_login_throttle
+from authserver.utilities.passwords import PasswordHasherBusy
+from authserver.utilities.responses import EXCEPTION_TYPES
+
+BUSY_MESSAGE = EXCEPTION_TYPES['PasswordHasherBusy']
+THROTTLED_MESSAGE = EXCEPTION_TYPES['LoginThrottled']
 
 home_bp = Blueprint('home_ep', __name__, static_folder='static',
                     template_folder='templates', url_prefix='/')
@@ -28,6 +36,15 @@ def login():
     if form.validate():
         username = form.username.data
         password = form.password.data
+        throttle = get_login_throttle()
+        try:
+            delay = throttle.attempt(request.remote_addr, username)
+        except LoginThrottled as e:
+            return render_template('login.html', client_id=client_id, return_to=return_to, form=form,
+                                   errors=THROTTLED_MESSAGE), 429, {'Retry-After': str(e.retry_after)}
+        if delay:
+            time.sleep(delay)
+
         user = User.query.filter_by(username=username).first()
         error_msg = "You did not enter valid login credentials."
 
@@ -35,9 +52,14 @@ def login():
             if (not user.active) or (not user.can_login) or (not user.verify_password(password)):
                 errors = error_msg
             else:
+                throttle.succeeded(request.remote_addr, username)
+                user.rehash_password_later(password)
                 session['id'] = user.id
                 return redirect(return_to)
         except AttributeError:
             errors = error_msg
+        except PasswordHasherBusy:
+            return render_template('login.html', client_id=client_id, return_to=return_to, form=form,
+                                   errors=BUSY_MESSAGE), 503
 
         return render_template('login.html', client_id=client_id, return_to=return_to, form=form, errors=errors)
@@ -14,9 +14,13 @@ from authlib.oauth2.rfc6749 import InvalidGrantError
 from flask import (Blueprint, redirect, render_template, request, session,
                    url_for)
 from flask_restful import Api, Resource, request
+from injector import inject
+from sqlalchemy.orm import noload
 from werkzeug.security import gen_salt
 
+from authserver.config import AbstractConfiguration
 from authserver.db import AuthorizedClient, OAuth2Client, OAuth2Token, User, db
+from authserver.oauth2 import get_revocation_log, get_stateless_tokens, get_token_cache, is_stateless_token
 from authserver.utilities import ResponseBody
 from authserver.utilities.oauth2 import authorization, require_oauth
 
@@ -27,7 +31,8 @@ oauth2_bp = Blueprint('oauth2_ep', __name__,
 def _current_user():
     if 'id' in session:
         uid = session['id']
-        return User.query.get(uid)
+        # The consent flow only needs the user's own columns.
+        return User.query.options(noload(User.role)).get(uid)
     return None
 
 
@@ -105,8 +110,15 @@ class ValidateOAuth2TokenResource(Resource):
     def post(self):
         req_json = request.get_json(force=True)
         access_token = req_json["token"]
-        access_token_in_db = OAuth2Token.query.filter_by(
-            access_token=access_token).first()
+
+        if is_stateless_token(access_token):
+            # Self-contained tokens are checked against their signature; they are not in the database.
+            token = get_stateless_tokens().verify(access_token)
+            is_valid = token is not None and not token.revoked and not token.is_access_token_expired()
+            return self.response_handler.custom_response(status="OK", code=200, messages={"valid": is_valid})
+
+        access_token_in_db = get_token_cache().get(
+            access_token, lambda token: OAuth2Token.query.filter_by(access_token=token).first())
 
         try:
             is_expired = access_token_in_db.is_access_token_expired()
@@ -114,12 +126,73 @@ class ValidateOAuth2TokenResource(Resource):
             # Token is not valid, if it does not exist.
             is_valid = False
         else:
-            # Token is not valid, if the token is expired (and vice versa).
-            is_valid = not is_expired
+            # Token is not valid, if the token is expired or revoked (and vice versa).
+            is_valid = not is_expired and not access_token_in_db.revoked
 
         return self.response_handler.custom_response(status="OK", code=200, messages={"valid": is_valid})
 
 
+class ValidateOAuth2TokenBatchResource(Resource):
+    """
+    This resource determines the validity of several OAuth2Tokens in one call.
+
+    Like introspection, it reveals the scope and client of each token, so the caller must authenticate
+    as a client. Tokens that are not cached are looked up with a single query.
+    """
+
+    CLIENT_AUTH_METHODS = ['client_secret_basic', 'client_secret_json']
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
+        self.response_handler = ResponseBody()
+
+    def post(self):
+        oauth_request = authorization.create_oauth2_request(request)
+        try:
+            authorization.authenticate_client(oauth_request, self.CLIENT_AUTH_METHODS)
+        except OAuth2Error as error:
+            return authorization.handle_error_response(oauth_request, error)
+
+        req_json = request.get_json(force=True, silent=True) or {}
+        access_tokens = req_json.get('tokens')
+        max_tokens = self.config.validate_batch_max_tokens
+
+        if not isinstance(access_tokens, list) or not all(isinstance(token, str) for token in access_tokens):
+            return self.response_handler.custom_response(
+                code=422, messages={'tokens': ['Please provide a list of tokens.']})
+        if len(access_tokens) > max_tokens:
+            return self.response_handler.custom_response(
+                code=422, messages={'tokens': [f'At most {max_tokens} tokens can be validated at once.']})
+
+        stateless = {token for token in access_tokens if is_stateless_token(token)}
+        tokens = get_token_cache().get_many(
+            [token for token in access_tokens if token not in stateless], _load_tokens)
+        for access_token in stateless:
+            tokens[access_token] = get_stateless_tokens().verify(access_token)
+
+        results = []
+        for access_token in access_tokens:
+            token = tokens[access_token]
+            if token is None:
+                results.append({'token': access_token, 'valid': False})
+                continue
+            results.append({
+                'token': access_token,
+                'valid': not token.revoked and not token.is_access_token_expired(),
+                'expires_at': token.get_expires_at(),
+                'scope': token.scope,
+                'client_id': token.client_id
+            })
+
+        return self.response_handler.custom_response(status="OK", code=200, messages={"tokens": results})
+
+
+def _load_tokens(access_tokens: list) -> dict:
+    tokens = OAuth2Token.query.filter(OAuth2Token.access_token.in_(access_tokens)).all()
+    return {token.access_token: token for token in tokens}
+
+
 class CreateOAuth2TokenResource(Resource):
     def post(self):
         return authorization.create_token_response()
@@ -130,7 +203,38 @@ class RevokeOAuth2TokenResource(Resource):
         return authorization.create_endpoint_response('revocation')
 
 
+class IntrospectOAuth2TokenResource(Resource):
+    def post(self):
+        return authorization.create_endpoint_response('introspection')
+
+
+class RevocationFeedResource(Resource):
+    """
+    The revocations logged after the `since` cursor, for resource servers that cache tokens or JWTs.
+    """
+
+    @require_oauth()
+    def get(self):
+        since = request.args.get('since', 0, type=int)
+        limit = request.args.get('limit', None, type=int)
+        return get_revocation_log().changes(since, limit), 200
+
+
+class RevocationFilterResource(Resource):
+    """
+    A Bloom filter of every unexpired revocation and the feed cursor it is current to.
+    """
+
+    @require_oauth()
+    def get(self):
+        return get_revocation_log().snapshot(), 200
+
+
 oauth2_api = Api(oauth2_bp)
 oauth2_api.add_resource(ValidateOAuth2TokenResource, '/validate')
+oauth2_api.add_resource(ValidateOAuth2TokenBatchResource, '/validate/batch')
 oauth2_api.add_resource(CreateOAuth2TokenResource, '/token')
 oauth2_api.add_resource(RevokeOAuth2TokenResource, '/revoke')
+oauth2_api.add_resource(IntrospectOAuth2TokenResource, '/introspect')
+oauth2_api.add_resource(RevocationFeedResource, '/revocations')
+oauth2_api.add_resource(RevocationFilterResource, '/revocations/filter')
@@ -7,6 +7,8 @@ from authserver.db import db, User, PasswordRecovery
 from authserver.config import AbstractConfiguration
 from authserver.db.graph_database import AbstractGraphDatabase
 from authserver.utilities.mail_service import AbstractMailService
+from authserver.utilities.passwords import PasswordHasherBusy
+from authserver.utilities.responses import EXCEPTION_TYPES
 
 password_recovery_bp = Blueprint('password_recovery_ep', __name__, static_folder='static',
                                  template_folder='templates', url_prefix='/')
@@ -90,6 +92,9 @@ def reset_password(config: AbstractConfiguration, graph_db: AbstractGraphDatabas
                         pass
 
                     return render_template('success.html', default_app_url=config.default_app_url, heading='Update Successful!', body='Please log in with your new credentials.')
+                except PasswordHasherBusy:
+                    db.session.rollback()
+                    return render_template('reset.html', form=form, errors=EXCEPTION_TYPES['PasswordHasherBusy']), 503
                 except Exception:
                     db.session.rollback()
                     abort(404)
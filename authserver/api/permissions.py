@@ -0,0 +1,35 @@
+"""Permissions Cache API
+
+An API that lets the permissions service evict cached permissions when they change.
+
+"""
+
+from flask import Blueprint
+from flask_restful import Api, Resource
+
+from authserver.oauth2 import get_permissions_cache
+from authserver.utilities import ResponseBody, require_oauth
+
+
+class PermissionsCacheResource(Resource):
+    """Cached permissions of a person.
+
+    `DELETE /permissions/cache/<person_id>` evicts one person; `DELETE /permissions/cache` evicts everyone.
+    The eviction applies to the worker that serves the request; other workers pick up the change once
+    their entry reaches `PERMISSIONS_CACHE_TTL`.
+
+    """
+
+    def __init__(self):
+        self.response_handler = ResponseBody()
+
+    @require_oauth()
+    def delete(self, person_id: str = None):
+        cached = get_permissions_cache().invalidate(person_id)
+        return self.response_handler.custom_response(
+            status='OK', code=200, messages={'person_id': person_id, 'invalidated': cached})
+
+
+permissions_bp = Blueprint('permissions_ep', __name__)
+permissions_api = Api(permissions_bp)
+permissions_api.add_resource(PermissionsCacheResource, '/permissions/cache', '/permissions/cache/<string:person_id>')
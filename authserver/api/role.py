@@ -8,9 +8,12 @@ from uuid import uuid4
 from datetime import datetime
 from flask import Blueprint
 from flask_restful import Resource, Api, request
+from injector import inject
+from sqlalchemy.orm import joinedload, noload
 from werkzeug.security import gen_salt
+from authserver.config import AbstractConfiguration
 from authserver.db import db, Role, RoleSchema, AuthorizedScope, AuthorizedScopeSchema
-from authserver.utilities import ResponseBody, require_oauth
+from authserver.utilities import ResponseBody, paginate, query_budget, require_oauth
 import logging
 
 class RoleResource(Resource):
@@ -20,17 +23,20 @@ class RoleResource(Resource):
 
     """
 
-    def __init__(self):
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
         self.role_schema = RoleSchema()
         self.roles_schema = RoleSchema(many=True)
         self.response_handler = ResponseBody()
 
+    @query_budget(2)
     @require_oauth()
     def get(self, id: str = None):
         if not id:
-            roles = Role.query.all()
-            roles_obj = self.roles_schema.dump(roles)
-            return self.response_handler.get_all_response(roles_obj)
+            page = paginate(Role.query, Role.id, self.config.page_size_default, self.config.page_size_max)
+            roles_obj = self.roles_schema.dump(page.items)
+            return self.response_handler.get_page_response(roles_obj, page.next)
         else:
             role = Role.query.filter_by(id=id).first()
             if role:
@@ -142,11 +148,14 @@ class AuthorizedScopeResource(Resource):
 
         self.response_handler = ResponseBody()
 
+    @query_budget(2)
     @require_oauth()
     def get(self, id: str = None, sid: str = None):
         if sid is None:
             try:
-                authorized_scopes = AuthorizedScope.query.all()
+                # The role is the one in the URL and is dropped from the response.
+                authorized_scopes = AuthorizedScope.query.options(
+                    noload(AuthorizedScope.role), joinedload(AuthorizedScope.scope)).all()
                 scopes_obj = self.authorized_scopes_schema.dump(authorized_scopes)
                 scopes_obj_clean = [{k: v for k, v in authorized_scope.items() if k != 'scope_id' and k != 'role_id' and k != 'role'} for authorized_scope in scopes_obj]
                 return self.response_handler.get_all_response(scopes_obj_clean)
@@ -154,7 +163,8 @@ class AuthorizedScopeResource(Resource):
                 return self.response_handler.exception_response('Unknown')
         else:
             try:
-                authorized_scope = AuthorizedScope.query.filter(
+                authorized_scope = AuthorizedScope.query.options(
+                    joinedload(AuthorizedScope.role), joinedload(AuthorizedScope.scope)).filter(
                     AuthorizedScope.role_id == id, AuthorizedScope.scope_id == sid).first()
                 scope_obj = self.authorized_scope_schema.dump(authorized_scope)
                 if scope_obj:
@@ -8,9 +8,11 @@ from uuid import uuid4
 from datetime import datetime
 from flask import Blueprint
 from flask_restful import Resource, Api, request
+from injector import inject
 from werkzeug.security import gen_salt
+from authserver.config import AbstractConfiguration
 from authserver.db import db, Scope, ScopeSchema
-from authserver.utilities import ResponseBody, require_oauth
+from authserver.utilities import ResponseBody, paginate, query_budget, require_oauth
 
 
 class ScopeResource(Resource):
@@ -20,17 +22,20 @@ class ScopeResource(Resource):
 
     """
 
-    def __init__(self):
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
         self.scope_schema = ScopeSchema()
         self.scopes_schema = ScopeSchema(many=True)
         self.response_handler = ResponseBody()
 
+    @query_budget(2)
     @require_oauth()
     def get(self, id: str = None):
         if not id:
-            scopes = Scope.query.all()
-            scopes_obj = self.scopes_schema.dump(scopes)
-            return self.response_handler.get_all_response(scopes_obj)
+            page = paginate(Scope.query, Scope.id, self.config.page_size_default, self.config.page_size_max)
+            scopes_obj = self.scopes_schema.dump(page.items)
+            return self.response_handler.get_page_response(scopes_obj, page.next)
         else:
             scope = Scope.query.filter_by(id=id).first()
             if scope:
@@ -9,11 +9,17 @@ from datetime import datetime
 
 from flask import Blueprint, session
 from flask_restful import Api, Resource, request
+from injector import inject
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.security import gen_salt
 
+from authserver.config import AbstractConfiguration
 from authserver.db import User, UserSchema, db, OAuth2Client, OAuth2Token, UserSchema
-from authserver.utilities import ResponseBody, require_oauth
+from authserver.oauth2 import get_revocation_log, get_token_cache
+from authserver.utilities import ResponseBody, paginate, query_budget, require_oauth
 from authserver.utilities.errors import RecordNotFoundError
+from authserver.utilities.passwords import PasswordHasherBusy
+from authserver.utilities.user_import import UserImporter, parse_csv, parse_ndjson
 
 
 class UserDetailResource(Resource):
@@ -23,6 +29,7 @@ class UserDetailResource(Resource):
         self.response_handler = ResponseBody()
         self.user_schema = UserSchema()
 
+    @query_budget(3)
     @require_oauth()
     def get(self):
         try:
@@ -39,7 +46,7 @@ class UserDetailResource(Resource):
                     if not user_id:
                         if 'id' in session:
                             user_id = session['id']
-                    user = User.query.filter_by(id=user_id).first()
+                    user = User.query.options(joinedload(User.role)).filter_by(id=user_id).first()
                     user_obj = self.user_schema.dump(user)
                     user_obj.pop('role_id', None)
                     if not user_obj['can_login']:
@@ -57,21 +64,24 @@ class UserResource(Resource):
 
     """
 
-    def __init__(self):
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
         self.user_schema = UserSchema()
         self.users_schema = UserSchema(many=True)
         self.response_handler = ResponseBody()
 
+    @query_budget(3)
     @require_oauth()
     def get(self, id: str = None):
         if not id:
-            users = User.query.all()
-            users_obj = self.users_schema.dump(users)
+            page = paginate(User.query.options(selectinload(User.role)), User.id, self.config.page_size_default, self.config.page_size_max)
+            users_obj = self.users_schema.dump(page.items)
             users_obj_clean = [{k: v for k, v in user.items() if k != 'role_id'}
                                for user in users_obj]
-            return self.response_handler.get_all_response(users_obj_clean)
+            return self.response_handler.get_page_response(users_obj_clean, page.next)
         else:
-            user = User.query.filter_by(id=id).first()
+            user = User.query.options(joinedload(User.role)).filter_by(id=id).first()
             if user:
                 user_obj = self.user_schema.dump(user)
                 user_obj.pop('role_id')
@@ -122,6 +132,8 @@ class UserResource(Resource):
                 active=request_data['active'] if 'active' in request_data.keys() else False)
             db.session.add(user)
             db.session.commit()
+        except PasswordHasherBusy:
+            return self.response_handler.exception_response('PasswordHasherBusy', code=503)
         except Exception as e:
             db.session.rollback()
             exception_name = type(e).__name__
@@ -145,11 +157,13 @@ class UserResource(Resource):
     def delete(self, id: str = None):
         if id is None:
             return self.response_handler.method_not_allowed_response()
-        user = User.query.filter_by(id=id).first()
+        user = User.query.options(joinedload(User.role)).filter_by(id=id).first()
         if user:
             user_obj = self.user_schema.dump(user)
             db.session.delete(user)
+            get_revocation_log().user_revoked(id)
             db.session.commit()
+            get_token_cache().invalidate_user(id)
             return self.response_handler.successful_delete_response('User', id, user_obj)
         else:
             return self.response_handler.not_found_response(id)
@@ -174,11 +188,15 @@ class UserResource(Resource):
         if errors:
             return self.response_handler.custom_response(code=422, messages=errors)
 
-        for k, v in request_data.items():
-            if hasattr(user, k) and k != 'password_hash':
-                setattr(user, k, v)
-            if k == 'password':
-                user.password = v
+        try:
+            for k, v in request_data.items():
+                if hasattr(user, k) and k != 'password_hash':
+                    setattr(user, k, v)
+                if k == 'password':
+                    user.password = v
+        except PasswordHasherBusy:
+            db.session.rollback()
+            return self.response_handler.exception_response('PasswordHasherBusy', code=503)
         try:
             user.date_last_updated = datetime.utcnow()
             db.session.commit()
@@ -189,39 +207,20 @@ class UserResource(Resource):
             return self.response_handler.exception_response(exception_name, request=request_data)
 
     def _deactivate(self, user_id: str):
-        user = User.query.filter_by(id=user_id).first()
-        if not user:
+        if not deactivate_users([user_id]):
             return self.response_handler.not_found_response(user_id)
 
-        user.active = False
-        user.can_login = False
-        user.date_last_updated = datetime.utcnow()
-
-        tokens = OAuth2Token.query.filter_by(user_id=user.id).all()
-        for token in tokens:
-            token.revoked = True
-            token.expires_in = 0
-
-        clients = OAuth2Client.query.filter_by(user_id=user_id).all()
-        for client in clients:
-            client.client_secret = None
-
-        self._db_commit()
-
         return self.response_handler.successful_update_response('User', user_id)
 
     def _activate(self, user_id: str):
-        user = User.query.filter_by(id=user_id).first()
-        if not user:
+        updated = User.query.filter_by(id=user_id).update(
+            {'active': True, 'can_login': True, 'date_last_updated': datetime.utcnow()}, synchronize_session=False)
+        if not updated:
             raise RecordNotFoundError(record_id=user_id)
 
-        user.active = True
-        user.can_login = True
-        user.date_last_updated = datetime.utcnow()
-
-        clients = OAuth2Client.query.filter_by(user_id=user_id).all()
-        for client in clients:
-            client.client_secret = gen_salt(48)
+        client_ids = [client_id for client_id, in db.session.query(OAuth2Client.id).filter_by(user_id=user_id)]
+        db.session.bulk_update_mappings(
+            OAuth2Client, [{'id': client_id, 'client_secret': gen_salt(48)} for client_id in client_ids])
 
         self._db_commit()
 
@@ -236,7 +235,106 @@ class UserResource(Resource):
             return self.response_handler.exception_response(exception_name)
 
 
+class UserDeactivationResource(Resource):
+    """Deactivates several users in one call.
+
+    `POST /users/deactivate` with `{"ids": [...]}` revokes the tokens and client secrets of every listed
+    user in a single transaction.
+
+    """
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
+        self.response_handler = ResponseBody()
+
+    @require_oauth()
+    def post(self):
+        request_data = request.get_json(force=True, silent=True) or {}
+        user_ids = request_data.get('ids')
+        max_users = self.config.user_bulk_max
+
+        if not isinstance(user_ids, list) or not user_ids or not all(isinstance(i, str) for i in user_ids):
+            return self.response_handler.custom_response(code=422, messages={'ids': ['Please provide a list of user IDs.']})
+        if len(user_ids) > max_users:
+            return self.response_handler.custom_response(
+                code=422, messages={'ids': [f'At most {max_users} users can be deactivated at once.']})
+
+        deactivated = deactivate_users(user_ids)
+        return self.response_handler.custom_response(status='OK', code=200, messages={
+            'deactivated': deactivated,
+            'not_found': [user_id for user_id in user_ids if user_id not in set(deactivated)]
+        })
+
+
+class UserImportResource(Resource):
+    """Creates many users in one call.
+
+    `POST /users/import` takes NDJSON, or CSV with a header row when the content type is `text/csv`,
+    with one user per line in the same shape as `POST /users`. The whole import runs within the request,
+    so the number of rows is capped to keep it well inside the worker timeout and the hashing to a few
+    processes; larger files are imported with `manager.py import_users`.
+
+    """
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
+        self.response_handler = ResponseBody()
+
+    @require_oauth()
+    def post(self):
+        lines = request.get_data(as_text=True).splitlines()
+        max_rows = self.config.user_import_max_rows
+        if not any(line.strip() for line in lines):
+            return self.response_handler.empty_request_body_response()
+
+        is_csv = request.mimetype == 'text/csv'
+        if sum(1 for line in lines if line.strip()) - int(is_csv) > max_rows:
+            return self.response_handler.custom_response(
+                code=422, messages={'users': [f'At most {max_rows} users can be imported at once.']})
+
+        importer = UserImporter(
+            self.config.user_import_batch_size, self.config.user_import_workers, self.config.bcrypt_rounds)
+        result = importer.run(parse_csv(lines) if is_csv else parse_ndjson(lines))
+        return self.response_handler.custom_response(status='OK', code=200, messages=result)
+
+
+def deactivate_users(user_ids: list) -> list:
+    """Deactivate users, revoke their tokens and clear their client secrets with one statement per table.
+
+    Args:
+        user_ids (list): The IDs of the users to deactivate.
+
+    Returns:
+        list: The IDs of the users that exist and were deactivated.
+
+    """
+    user_ids = [user_id for user_id, in db.session.query(User.id).filter(User.id.in_(set(user_ids)))]
+    if not user_ids:
+        return []
+
+    User.query.filter(User.id.in_(user_ids)).update(
+        {'active': False, 'can_login': False, 'date_last_updated': datetime.utcnow()}, synchronize_session=False)
+    get_revocation_log().users_revoked(user_ids)
+    OAuth2Token.query.filter(OAuth2Token.user_id.in_(user_ids)).update(
+        {'revoked': True, 'expires_in': 0}, synchronize_session=False)
+    OAuth2Client.query.filter(OAuth2Client.user_id.in_(user_ids)).update(
+        {'client_secret': None}, synchronize_session=False)
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    get_token_cache().invalidate_users(user_ids)
+    return user_ids
+
+
 user_bp = Blueprint('user_ep', __name__)
 user_api = Api(user_bp)
 user_api.add_resource(UserResource, '/users', '/users/<string:id>')
 user_api.add_resource(UserDetailResource, '/user')
+user_api.add_resource(UserDeactivationResource, '/users/deactivate')
+user_api.add_resource(UserImportResource, '/users/import')
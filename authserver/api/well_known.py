@@ -0,0 +1,70 @@
+"""Well-Known API
+
+Publishes the public JWT signing keys and an OpenID-style discovery document, so that resource servers
+can verify Brighthive JWTs locally instead of calling back to `/oauth/validate`.
+
+Both documents are generated from the loaded signing keys and served with an ETag and a public
+`Cache-Control` lifetime of `WELL_KNOWN_MAX_AGE` seconds; conditional requests are answered with 304.
+
+"""
+
+import hashlib
+import json
+
+from flask import Blueprint, Response, request, url_for
+from flask_restful import Api, Resource
+from injector import inject
+
+from authserver.config import AbstractConfiguration
+from authserver.oauth2 import get_signing_key_manager
+from authserver.oauth2.rfc6749.stateless_tokens import ISSUER
+
+
+def _cacheable_json(document: dict, max_age: int) -> Response:
+    body = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha256(body.encode('utf-8')).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+class JWKSResource(Resource):
+    """The public keys that verify Brighthive JWTs and stateless access tokens."""
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
+
+    def get(self):
+        return _cacheable_json(get_signing_key_manager().jwks(), self.config.well_known_max_age)
+
+
+class DiscoveryResource(Resource):
+    """Authorization server metadata (RFC 8414) in the shape of an OpenID discovery document."""
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        self.config = config
+
+    def get(self):
+        document = {
+            'issuer': ISSUER,
+            'authorization_endpoint': url_for('oauth2_ep.authorize', _external=True),
+            'token_endpoint': url_for('oauth2_ep.createoauth2tokenresource', _external=True),
+            'revocation_endpoint': url_for('oauth2_ep.revokeoauth2tokenresource', _external=True),
+            'introspection_endpoint': url_for('oauth2_ep.introspectoauth2tokenresource', _external=True),
+            'jwks_uri': url_for('well_known_ep.jwksresource', _external=True),
+            'response_types_supported': ['code'],
+            'grant_types_supported': ['authorization_code', 'client_credentials'],
+            'token_endpoint_auth_methods_supported': ['client_secret_basic', 'client_secret_post',
+                                                      'client_secret_json'],
+            'code_challenge_methods_supported': ['plain', 'S256']
+        }
+        return _cacheable_json(document, self.config.well_known_max_age)
+
+
+well_known_bp = Blueprint('well_known_ep', __name__, url_prefix='/.well-known')
+well_known_api = Api(well_known_bp)
+well_known_api.add_resource(JWKSResource, '/jwks.json')
+well_known_api.add_resource(DiscoveryResource, '/openid-configuration', '/oauth-authorization-server')
@@ -14,16 +14,21 @@ from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
 from flask_injector import FlaskInjector
 from marshmallow.exceptions import ValidationError
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from authserver.api import (client_bp, health_api_bp, oauth2_bp,
                             role_bp, user_bp, home_bp,
-                            scope_bp, password_recovery_bp)
+                            scope_bp, password_recovery_bp, permissions_bp, well_known_bp, export_bp)
 from authserver.modules import (
-    ConfigurationModule, GraphDatabaseModule, MailServiceModule)
+    ConfigurationModule, GraphDatabaseModule, MailServiceModule, PermissionsServiceModule)
 from authserver.config import ConfigurationFactory
 from authserver.db import db
 from authserver.utilities import config_oauth, ResponseBody
 from authserver.utilities.errors import RecordNotFoundError
+from authserver.utilities.login_throttle import LoginThrottled
+from authserver.utilities.passwords import PasswordHasherBusy
+from authserver.utilities.purge import PurgeScheduler, create_purger
+from authserver.utilities.query_budgets import QueryBudget
 
 
 def teardown_appcontext(_):
@@ -43,9 +48,12 @@ def create_app(environment: str = None):
 
     app = Flask(__name__)
     if environment is None:
-        app.config.from_object(ConfigurationFactory.from_env())
+        configuration = ConfigurationFactory.from_env()
     else:
-        app.config.from_object(ConfigurationFactory.get_config(environment))
+        configuration = ConfigurationFactory.get_config(environment)
+    app.config.from_object(configuration)
+    # Keep the resolved configuration for code that runs against this app, e.g. the manager commands.
+    app.configuration = configuration
     app.config.update(
         SQLALCHEMY_DATABASE_URI=ConfigurationFactory.get_config(
             environment).sqlalchemy_database_uri,
@@ -58,6 +66,10 @@ def create_app(environment: str = None):
         SECRET_KEY=ConfigurationFactory.generate_secret_key()
     )
 
+    if configuration.trusted_proxy_hops:
+        # Take the client address from X-Forwarded-For, as set by this many proxies in front of the app.
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=configuration.trusted_proxy_hops)
+
     is_testing = environment == 'TESTING'
     logging.basicConfig(format='%(message)s', level=logging.INFO)
 
@@ -108,6 +120,8 @@ def create_app(environment: str = None):
             apm = ElasticAPM(app)
 
     db.init_app(app)
+    with app.app_context():
+        QueryBudget(configuration.query_budget_default, configuration.query_budget_strict).init_app(app, db.engine)
     config_oauth(app)
     CORS(app)
     migrate = Migrate(app, db)
@@ -119,12 +133,33 @@ def create_app(environment: str = None):
     app.register_blueprint(role_bp)
     app.register_blueprint(scope_bp)
     app.register_blueprint(password_recovery_bp)
+    app.register_blueprint(permissions_bp)
+    app.register_blueprint(well_known_bp)
+    app.register_blueprint(export_bp)
+
+    def handle_password_hasher_busy(e):
+        response, code = ResponseBody().exception_response('PasswordHasherBusy', code=503)
+        return response, code, {'Retry-After': '1'}
+
+    def handle_login_throttled(e):
+        response, code = ResponseBody().exception_response('LoginThrottled', code=429)
+        return response, code, {'Retry-After': str(e.retry_after)}
 
     app.register_error_handler(Exception, handle_errors)
+    app.register_error_handler(PasswordHasherBusy, handle_password_hasher_busy)
+    app.register_error_handler(LoginThrottled, handle_login_throttled)
 
     app.teardown_appcontext(teardown_appcontext)
 
-    FlaskInjector(app=app, modules=[
-                  ConfigurationModule, GraphDatabaseModule, MailServiceModule])
+    flask_injector = FlaskInjector(app=app, modules=[
+                  ConfigurationModule, GraphDatabaseModule, MailServiceModule, PermissionsServiceModule])
+    # Keep a handle on the injector for code that runs outside of injected views (e.g. the token endpoint).
+    app.injector = flask_injector.injector
+
+    if configuration.purge_interval and not is_testing:
+        with app.app_context():
+            app.purge_scheduler = PurgeScheduler(
+                app, create_purger(db.engine, configuration), configuration.purge_interval)
+        app.purge_scheduler.start()
 
     return app
@@ -67,7 +67,66 @@ class AbstractConfiguration(ABC):
         self.permission_service_url = os.getenv('BH_PERMISSIONS_SERVICE_URI', '')
         if self.permission_service_url == '':
             logging.warn("No permissions service URI was provided!!! JWTs will not populate with permissions.")
+        self.service_jwt_claims = json.loads(os.getenv('SERVICE_JWT_CLAIMS', '{"brighthive-super-admin": true}'))
+        self.service_jwt_refresh_margin = float(os.getenv('SERVICE_JWT_REFRESH_MARGIN', '300'))
+        self.token_cache_max_size = int(os.getenv('TOKEN_CACHE_MAX_SIZE', '10000'))
+        self.token_cache_negative_ttl = float(os.getenv('TOKEN_CACHE_NEGATIVE_TTL', '5'))
+        self.token_cache_shared_path = os.getenv('TOKEN_CACHE_SHARED_PATH', '')
+        # Per-worker caches only hear of revocations made by their own worker, so bound their entries by default.
+        self.token_cache_max_ttl = float(os.getenv('TOKEN_CACHE_MAX_TTL', '0' if self.token_cache_shared_path else '5'))
+        self.token_cache_shared_slots = int(os.getenv('TOKEN_CACHE_SHARED_SLOTS', '32768'))
+        self.validate_batch_max_tokens = int(os.getenv('VALIDATE_BATCH_MAX_TOKENS', '100'))
+        self.introspection_max_age = int(os.getenv('INTROSPECTION_MAX_AGE', '300'))
+        self.well_known_max_age = int(os.getenv('WELL_KNOWN_MAX_AGE', '3600'))
+        self.revocation_log_min_ttl = int(os.getenv('REVOCATION_LOG_MIN_TTL', '86400'))
+        self.revocation_feed_page_size = int(os.getenv('REVOCATION_FEED_PAGE_SIZE', '1000'))
+        self.revocation_feed_settle = float(os.getenv('REVOCATION_FEED_SETTLE', '1'))
+        self.revocation_filter_false_positive_rate = float(os.getenv('REVOCATION_FILTER_FALSE_POSITIVE_RATE', '0.001'))
+        self.purge_interval = float(os.getenv('PURGE_INTERVAL', '0'))
+        self.purge_batch_size = int(os.getenv('PURGE_BATCH_SIZE', '1000'))
+        self.purge_grace_period = float(os.getenv('PURGE_GRACE_PERIOD', '3600'))
+        self.purge_batch_pause = float(os.getenv('PURGE_BATCH_PAUSE', '0'))
+        self.token_partition_interval = os.getenv('TOKEN_PARTITION_INTERVAL', 'week')
+        self.token_partition_premake = int(os.getenv('TOKEN_PARTITION_PREMAKE', '4'))
+        self.user_bulk_max = int(os.getenv('USER_BULK_MAX', '1000'))
+        self.page_size_default = int(os.getenv('PAGE_SIZE_DEFAULT', '100'))
+        self.page_size_max = int(os.getenv('PAGE_SIZE_MAX', '1000'))
+        self.export_batch_size = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+        self.user_import_batch_size = int(os.getenv('USER_IMPORT_BATCH_SIZE', '500'))
+        self.user_import_max_rows = int(os.getenv('USER_IMPORT_MAX_ROWS', '100'))
+        self.user_import_workers = int(os.getenv('USER_IMPORT_WORKERS', '2'))
+        self.password_hash_workers = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+        self.password_hash_max_queue = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '32'))
+        self.bcrypt_rounds = int(os.getenv('BCRYPT_ROUNDS', '12'))
+        self.login_throttle_ip_limit = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', '100'))
+        self.login_throttle_username_limit = int(os.getenv('LOGIN_THROTTLE_USERNAME_LIMIT', '10'))
+        self.login_throttle_window = float(os.getenv('LOGIN_THROTTLE_WINDOW', '300'))
+        self.login_throttle_delay_after = int(os.getenv('LOGIN_THROTTLE_DELAY_AFTER', '3'))
+        self.login_throttle_delay_max = float(os.getenv('LOGIN_THROTTLE_DELAY_MAX', '2'))
+        self.login_throttle_shared_path = os.getenv('LOGIN_THROTTLE_SHARED_PATH', '')
+        self.login_throttle_slots = int(os.getenv('LOGIN_THROTTLE_SLOTS', '65536'))
+        self.trusted_proxy_hops = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+        self.query_budget_default = int(os.getenv('QUERY_BUDGET_DEFAULT', '0'))
+        self.query_budget_strict = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+        self.permissions_cache_ttl = float(os.getenv('PERMISSIONS_CACHE_TTL', '60'))
+        self.permissions_cache_stale_ttl = float(os.getenv('PERMISSIONS_CACHE_STALE_TTL', '300'))
+        self.permissions_cache_max_size = int(os.getenv('PERMISSIONS_CACHE_MAX_SIZE', '10000'))
+        self.permissions_service_connect_timeout = float(os.getenv('PERMISSIONS_SERVICE_CONNECT_TIMEOUT', '2'))
+        self.permissions_service_read_timeout = float(os.getenv('PERMISSIONS_SERVICE_READ_TIMEOUT', '5'))
+        self.permissions_service_retries = int(os.getenv('PERMISSIONS_SERVICE_RETRIES', '2'))
+        self.permissions_service_backoff = float(os.getenv('PERMISSIONS_SERVICE_BACKOFF', '0.1'))
+        self.permissions_service_pool_size = int(os.getenv('PERMISSIONS_SERVICE_POOL_SIZE', '10'))
+        self.permissions_service_breaker_threshold = float(os.getenv('PERMISSIONS_SERVICE_BREAKER_THRESHOLD', '0.5'))
+        self.permissions_service_breaker_min_calls = int(os.getenv('PERMISSIONS_SERVICE_BREAKER_MIN_CALLS', '10'))
+        self.permissions_service_breaker_window = int(os.getenv('PERMISSIONS_SERVICE_BREAKER_WINDOW', '20'))
+        self.permissions_service_breaker_reset_timeout = float(os.getenv('PERMISSIONS_SERVICE_BREAKER_RESET_TIMEOUT', '30'))
         signature_private_path = os.getenv('SIGNATURE_PRIVATE_PATH', None)
+        self.signature_private_path = signature_private_path
+        self.signature_additional_key_paths = [
+            p.strip() for p in os.getenv('SIGNATURE_ADDITIONAL_KEY_PATHS', '').split(',') if p.strip()]
+        self.signature_key_reload_interval = float(os.getenv('SIGNATURE_KEY_RELOAD_INTERVAL', '5'))
+        self.jwt_signing_algorithm = os.getenv('JWT_SIGNING_ALGORITHM', None)
+        self.jwt_audience_algorithms = json.loads(os.getenv('JWT_AUDIENCE_ALGORITHMS', '{}'))
 
         if signature_private_path is None:
             logging.warn("Private key for JWT signature not defined.")
@@ -127,6 +186,7 @@ class TestingConfiguration(AbstractConfiguration):
         os.environ['FLASK_ENV'] = 'testing'
         os.environ['AUTHLIB_INSECURE_TRANSPORT'] = '1'
         self.configuration_name = 'TESTING'
+        self.query_budget_strict = os.getenv('QUERY_BUDGET_STRICT', 'true').lower() == 'true'
         self.postgres_user = 'test_user'
         self.postgres_password = 'test_password'
         self.postgres_hostname = 'localhost'
@@ -160,6 +220,7 @@ class JenkinsConfiguration(AbstractConfiguration):
         os.environ['FLASK_ENV'] = 'testing'
         os.environ['AUTHLIB_INSECURE_TRANSPORT'] = '1'
         self.configuration_name = 'TESTING'
+        self.query_budget_strict = os.getenv('QUERY_BUDGET_STRICT', 'true').lower() == 'true'
         self.postgres_user = 'test_user'
         self.postgres_password = 'test_password'
         self.postgres_hostname = os.getenv('DB_PORT_5432_TCP_ADDR', '0.0.0.0')
@@ -1,4 +1,4 @@
 from authserver.db.models import db, User, UserSchema,\
     OAuth2Client, OAuth2ClientSchema, OAuth2AuthorizationCode, OAuth2Token, Role,\
     RoleSchema, AuthorizedClient, Scope, ScopeSchema,\
-    AuthorizedScope, AuthorizedScopeSchema, PasswordRecovery
+    AuthorizedScope, AuthorizedScopeSchema, PasswordRecovery, RevocationLogEntry
@@ -1,3 +1,4 @@
 from authserver.db.models.models import db, User, UserSchema, OAuth2Client, OAuth2ClientSchema,\
     OAuth2AuthorizationCode, OAuth2Token, Role, RoleSchema, AuthorizedClient,\
-    Scope, ScopeSchema, AuthorizedScope, AuthorizedScopeSchema, PasswordRecovery
+    Scope, ScopeSchema, AuthorizedScope, AuthorizedScopeSchema, PasswordRecovery,\
+    RevocationLogEntry
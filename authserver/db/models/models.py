@@ -5,10 +5,10 @@ import time
 from datetime import datetime, timedelta
 from uuid import uuid4
 
-import bcrypt
 from authlib.integrations.sqla_oauth2 import (OAuth2AuthorizationCodeMixin,
                                               OAuth2ClientMixin,
                                               OAuth2TokenMixin)
+from flask import current_app
 from flask_marshmallow import Marshmallow
 from flask_sqlalchemy import SQLAlchemy
 from marshmallow import Schema, fields, pre_load, validate
@@ -29,7 +29,10 @@ roles = db.Table('roles',
 class User(db.Model):
     """Data Trust User."""
     __tablename__ = 'users'
-    __table_args__ = (db.UniqueConstraint('username'), )
+    __table_args__ = (
+        db.UniqueConstraint('username'),
+        db.Index('ix_users_person_id', 'person_id', postgresql_where=db.text('person_id IS NOT NULL')),
+    )
 
     id = db.Column(db.String, primary_key=True)
     person_id = db.Column(db.String)
@@ -38,7 +41,7 @@ class User(db.Model):
     can_login = db.Column(db.Boolean, nullable=True, default=False)
     role_id = db.Column(db.String, db.ForeignKey(
         'oauth2_roles.id'), nullable=True)
-    role = db.relationship('Role', backref='users', lazy='subquery')
+    role = db.relationship('Role', backref='users')
     password_hash = db.Column(db.String(128), nullable=False)
     date_created = db.Column(db.TIMESTAMP)
     date_last_updated = db.Column(db.TIMESTAMP)
@@ -49,15 +52,40 @@ class User(db.Model):
 
     @password.setter
     def password(self, password: str):
-        self.password_hash = bcrypt.hashpw(password.encode(
-            'utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # Imported here because authserver.utilities imports the models.
+        from authserver.utilities.passwords import get_password_hasher
+        self.password_hash = get_password_hasher().hash(password)
 
     def verify_password(self, password: str):
-        try:
-            return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
-        except Exception as e:
+        from authserver.utilities.passwords import get_password_hasher
+        return get_password_hasher().verify(password, self.password_hash or '')
+
+    def rehash_password_later(self, password: str) -> bool:
+        """Replace a hash made at another bcrypt cost, in the background, after a successful login.
+
+        The new hash is only stored if the old one is still in place, so a password changed meanwhile is kept.
+
+        Returns:
+            bool: True if a rehash was started.
+
+        """
+        from authserver.utilities.passwords import get_password_hasher
+        hasher = get_password_hasher()
+        if not hasher.needs_rehash(self.password_hash):
             return False
 
+        app = current_app._get_current_object()
+        user_id, old_hash = self.id, self.password_hash
+
+        def store(new_hash):
+            with app.app_context():
+                User.query.filter_by(id=user_id, password_hash=old_hash).update(
+                    {'password_hash': new_hash}, synchronize_session=False)
+                db.session.commit()
+
+        hasher.rehash_later(password, store)
+        return True
+
     def get_user_id(self):
         return self.id
 
@@ -167,14 +195,16 @@ class OAuth2Client(db.Model, OAuth2ClientMixin):
     """OAuth 2.0 Client"""
 
     __tablename__ = 'oauth2_clients'
+    __table_args__ = (db.Index('ix_oauth2_clients_user_id', 'user_id'), )
 
     id = db.Column(db.String, primary_key=True)
     user_id = db.Column(
         db.String, db.ForeignKey('users.id', ondelete='CASCADE'))
     user = db.relationship('User')
     grant_super_admin = db.Column(db.Boolean)
-    roles = db.relationship('Role', secondary=roles, lazy='subquery',
-                            backref=db.backref('clients', lazy=True))
+    stateless_tokens = db.Column(db.Boolean)
+    token_reuse_min_remaining = db.Column(db.Integer)
+    roles = db.relationship('Role', secondary=roles, backref=db.backref('clients', lazy=True))
 
 
 class OAuth2ClientSchema(ma.SQLAlchemySchema):
@@ -196,6 +226,8 @@ class OAuth2ClientSchema(ma.SQLAlchemySchema):
     response_type = fields.String()
     scope = fields.String()
     roles = fields.List(fields.String)
+    stateless_tokens = fields.Boolean()
+    token_reuse_min_remaining = fields.Integer(allow_none=True)
     client_name = fields.String(required=True)
     client_uri = fields.String()
     logo_uri = fields.String()
@@ -216,6 +248,10 @@ class OAuth2AuthorizationCode(db.Model, OAuth2AuthorizationCodeMixin):
     """OAuth 2.0 Authorization Code"""
 
     __tablename__ = 'oauth2_authorization_codes'
+    __table_args__ = (
+        db.Index('ix_oauth2_authorization_codes_user_id', 'user_id'),
+        db.Index('ix_oauth2_authorization_codes_auth_time', 'auth_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(
@@ -229,6 +265,16 @@ class OAuth2Token(db.Model, OAuth2TokenMixin):
     """OAuth 2.0 Token"""
 
     __tablename__ = 'oauth2_tokens'
+    __table_args__ = (
+        # Finds the newest reusable client_credentials token of a client and scope.
+        db.Index('ix_oauth2_tokens_client_reuse', 'client_id', 'scope', db.text('issued_at DESC'),
+                 postgresql_where=db.text('revoked = false AND user_id IS NULL')),
+        db.Index('ix_oauth2_tokens_client_id', 'client_id'),
+        # Client credentials tokens have no user; leave them out of the per-user index.
+        db.Index('ix_oauth2_tokens_user_id', 'user_id', postgresql_where=db.text('user_id IS NOT NULL')),
+        # Finds tokens past their refresh expiry for the purge.
+        db.Index('ix_oauth2_tokens_refresh_expires_at', db.text('(issued_at + expires_in * 2)')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(
@@ -323,10 +369,8 @@ class AuthorizedScope(db.Model):
         'oauth2_roles.id'), nullable=False, primary_key=True)
     scope_id = db.Column(db.String, db.ForeignKey(
         'oauth2_scopes.id'), nullable=False, primary_key=True)
-    role = db.relationship(
-        'Role', backref='authorized_scopes', lazy='subquery')
-    scope = db.relationship(
-        'Scope', backref='authorized_scopes', lazy='subquery')
+    role = db.relationship('Role', backref='authorized_scopes')
+    scope = db.relationship('Scope', backref='authorized_scopes')
     date_created = db.Column(db.TIMESTAMP)
     date_last_updated = db.Column(db.TIMESTAMP)
 
@@ -362,6 +406,10 @@ class PasswordRecovery(db.Model):
     """Password recovery nonce."""
 
     __tablename__ = 'password_recovery'
+    __table_args__ = (
+        db.Index('ix_password_recovery_user_id', 'user_id'),
+        db.Index('ix_password_recovery_expiration_date', 'expiration_date'),
+    )
     nonce = db.Column(db.String, unique=True, nullable=False, primary_key=True)
     user_id = db.Column(db.String, db.ForeignKey('users.id'), primary_key=True)
     date_created = db.Column(db.TIMESTAMP)
@@ -377,3 +425,20 @@ class PasswordRecovery(db.Model):
     @property
     def is_expired(self):
         return datetime.utcnow() > self.expiration_date
+
+
+class RevocationLogEntry(db.Model):
+    """A revoked token, stateless token or user, published to resource servers through the revocation feed.
+
+    The `id` is the feed cursor. `value` is the SHA-256 digest of a revoked access token, the `jti` of a
+    revoked stateless token or the ID of a deactivated user, depending on `kind`.
+
+    """
+
+    __tablename__ = 'oauth2_revocations'
+    __table_args__ = (db.Index('ix_oauth2_revocations_expires_at', 'expires_at'), )
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(8), nullable=False)
+    value = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.Integer, nullable=False)
+    date_created = db.Column(db.TIMESTAMP, default=datetime.utcnow)
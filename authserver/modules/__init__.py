@@ -1,3 +1,4 @@
 from authserver.modules.configuration_module import ConfigurationModule
 from authserver.modules.graph_database_module import GraphDatabaseModule
 from authserver.modules.mail_service_module import MailServiceModule
+from authserver.modules.permissions_service_module import PermissionsServiceModule
@@ -0,0 +1,7 @@
+from injector import singleton, Module
+from authserver.utilities.permissions_service import AbstractPermissionsService, RequestsPermissionsService
+
+
+class PermissionsServiceModule(Module):
+    def configure(self, binder):
+        binder.bind(AbstractPermissionsService, to=RequestsPermissionsService, scope=singleton)
@@ -1 +1,8 @@
 from authserver.oauth2.rfc6749 import BrighthiveAuthorizationServer, authenticate_client_secret_json
+from authserver.oauth2.rfc6749 import PermissionsCache, get_permissions_cache
+from authserver.oauth2.rfc6749 import ServiceCredential, get_service_credential
+from authserver.oauth2.rfc6749 import RevocationLog, get_revocation_log
+from authserver.oauth2.rfc6749 import SharedTokenCache, TokenCache, get_token_cache
+from authserver.oauth2.rfc6749 import StatelessTokens, get_stateless_tokens, is_stateless_token
+from authserver.oauth2.rfc6749 import (SigningKey, SigningKeyError, SigningKeyManager,
+                                       get_signing_key_manager, set_signing_key_manager)
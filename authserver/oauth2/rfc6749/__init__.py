@@ -1,2 +1,10 @@
 from authserver.oauth2.rfc6749.authenticate_client import authenticate_client_secret_json
 from authserver.oauth2.rfc6749.authorization_server import BrighthiveAuthorizationServer
+from authserver.oauth2.rfc6749.permissions import PermissionsCache, get_permissions_cache
+from authserver.oauth2.rfc6749.service_credential import ServiceCredential, get_service_credential
+from authserver.oauth2.rfc6749.revocation_log import RevocationLog, get_revocation_log
+from authserver.oauth2.rfc6749.shared_token_cache import SharedTokenCache
+from authserver.oauth2.rfc6749.token_cache import TokenCache, get_token_cache
+from authserver.oauth2.rfc6749.stateless_tokens import StatelessTokens, get_stateless_tokens, is_stateless_token
+from authserver.oauth2.rfc6749.signing_keys import (SigningKey, SigningKeyError, SigningKeyManager,
+                                                    get_signing_key_manager, set_signing_key_manager)
@@ -3,25 +3,30 @@
 """
 
 from authlib.integrations.flask_oauth2 import AuthorizationServer
-from flask import request as flask_req
+from flask import current_app, request as flask_req
 from authlib.oauth2 import OAuth2Request
 from authlib.common.encoding import to_unicode
 from authlib.oauth2.rfc6749 import InvalidGrantError, OAuth2Error
-
-import jwt
+from sqlalchemy.orm import joinedload
 
 from authserver.config import ConfigurationFactory
 from datetime import datetime, timedelta
 from authserver.db import OAuth2Token
+from authserver.oauth2.rfc6749.permissions import get_permissions_cache
+from authserver.oauth2.rfc6749.service_credential import get_service_credential
+from authserver.oauth2.rfc6749.signing_keys import get_signing_key_manager
+from authserver.utilities.cache import TTLCache
+from authserver.utilities.circuit_breaker import CircuitOpenError
+from authserver.utilities.metrics import register_metrics
+from authserver.utilities.permissions_service import AbstractPermissionsService
 
-import requests
-from requests.structures import CaseInsensitiveDict
 import os
 import logging
+from functools import partial
 
 class BrighthiveJWT(object):
     def __init__(self):
-        self.private_key = ConfigurationFactory.from_env().signature_key
+        self.key_manager = get_signing_key_manager()
 
     def generated_claims(self) -> object:
         return {
@@ -38,41 +43,52 @@ class BrighthiveJWT(object):
             "exp": datetime.utcnow() + timedelta(hours=24) # timedelta(minutes=15)
         }
 
-    def make_jwt(self, json_claims: object) -> object:
+    def make_jwt(self, json_claims: object, audience: str = None) -> object:
         claims = self.generated_claims()
         claims.update(json_claims)
 
-        jwt_token = jwt.encode(claims, self.private_key, algorithm='RS256')
+        # A JWT minted for a single audience is signed with the algorithm that audience verifies.
+        algorithm = None
+        if audience in claims['aud']:
+            claims['aud'] = [audience]
+            algorithm = self.key_manager.algorithm_for_audience(audience)
+
+        jwt_token = self.key_manager.sign(claims, algorithm=algorithm)
 
         return jwt_token
 
 def get_perms_for_user(person_id: str):
-    # Get user perms
-    permissions_api = ConfigurationFactory.from_env().permission_service_url
+    """Get the permission claims of a person, from cache when possible."""
+    # Resolved here because cache refreshes may run outside of the application context.
+    permissions_service = current_app.injector.get(AbstractPermissionsService)
+    return get_permissions_cache().get(person_id, partial(_request_perms_for_user, permissions_service))
 
-    get_user_perms_by_id = f'{permissions_api}/people/{person_id}/permissions'
 
-    # Generate a token for Perms API
-    super_admin_jwt = generate_jwt("none", {"brighthive-super-admin": True})
+def get_service_jwt() -> str:
+    """Get the JWT authserver uses to authenticate with other Brighthive services."""
+    return get_service_credential().get(_mint_service_jwt)
 
-    # Make perms api call
-    perm_headers = CaseInsensitiveDict()
-    perm_headers["Accept"] = "application/json"
-    perm_headers["Authorization"] = f"Bearer {super_admin_jwt}"
 
-    logging.info('Authserver -> PermsAPI: Contacting...')
+def _mint_service_jwt() -> str:
+    claims = dict(ConfigurationFactory.from_env().service_jwt_claims)
+    claims.update({"brighthive-access-token": "none"})
+    return BrighthiveJWT().make_jwt(claims)
 
-    perms_response = {}
+
+def _request_perms_for_user(permissions_service: AbstractPermissionsService, person_id: str):
+    # Reuse the service token for Perms API
+    super_admin_jwt = get_service_jwt()
+
+    logging.info('Authserver -> PermsAPI: Contacting...')
 
     try:
-        perms_response = requests.get(
-            get_user_perms_by_id,
-            headers=perm_headers)
-        perms_response.raise_for_status()
-    except requests.exceptions.HTTPError as http_err:
-        logging.exception(f'Authserver -> PermsAPI: HTTP Error: {http_err}')
+        perms_for_user = permissions_service.get_permissions(person_id, super_admin_jwt)
+    except CircuitOpenError:
+        logging.warning('Authserver -> PermsAPI: Circuit breaker is open; skipping call.')
+        raise
     except Exception as err:
-        logging.exception(f'Authserver -> PermsAPI: Uncaught error: {err}')
+        logging.exception(f'Authserver -> PermsAPI: {err}')
+        raise
     else:
         logging.info('Authserver -> PermsAPI: Perms API call succeeded!')
 
@@ -83,17 +99,18 @@ def get_perms_for_user(person_id: str):
     # expired credentials
     # no user found
 
-    # Extract user perms
-    return perms_response.json()['response'] if perms_response else {}
+    return perms_for_user
 
-def generate_jwt(access_token: str, claims: dict = {}):
+def generate_jwt(access_token: str, claims: dict = {}, audience: str = None):
     if type(claims) is not dict:
         logging.warn('While trying to generate a JWT, the claims given were not a dict.')
 
     try:
+        # Copy so that cached permission claims are never mutated.
+        claims = dict(claims)
         claims.update({"brighthive-access-token": access_token})
 
-        a_jwt = BrighthiveJWT().make_jwt(claims)
+        a_jwt = BrighthiveJWT().make_jwt(claims, audience=audience)
     except Exception:
         logging.exception('Uncaught exception when generating JWT.')
         return 'none'
@@ -101,21 +118,31 @@ def generate_jwt(access_token: str, claims: dict = {}):
     return a_jwt
 
 
-def generate_jwt_based_on_token(token: OAuth2Token) -> {}:
+def generate_jwt_based_on_token(token: OAuth2Token, audience: str = None) -> {}:
     """Checks if token was generated for a client with grant_super_admin and if not then gets the permissions for the associated user."""
     # Machine to machine cred! Bypass permissions and give super admin
     if token.client.grant_super_admin:
-        return generate_jwt(token.access_token, {"brighthive-super-admin": True})
+        return generate_jwt(token.access_token, {"brighthive-super-admin": True}, audience=audience)
 
     # Regular user; get their perms from permission service
     user = token.user
+    perms_for_user = {}
+
+    if user is None or not user.person_id:
+        logging.warning(f"No person_id for the user of a token issued to client {token.client_id}!")
+        return generate_jwt(token.access_token, perms_for_user, audience=audience)
 
     try:
         perms_for_user = get_perms_for_user(user.person_id)
     except Exception as e:
-        logging.exception(f"person_id not found on user {user.username}!")
+        logging.exception(f"Failed to get permissions for user {user.username}!")
+
+    return generate_jwt(token.access_token, perms_for_user, audience=audience)
+
+# Brighthive JWTs of reusable access tokens, handed out again along with the token.
+reused_token_jwts = TTLCache(max_size=10000)
+register_metrics('reused_token_jwts', reused_token_jwts.stats)
 
-    return generate_jwt(token.access_token, perms_for_user)
 
 class BrighthiveAuthorizationServer(AuthorizationServer):
     """Brighthive Authorization Server.
@@ -187,15 +214,22 @@ class BrighthiveAuthorizationServer(AuthorizationServer):
             # body: WARNING:root:{'token_type': 'Bearer', 'access_token': 'aaaaaaaa', 'expires_in': 300}
             # headers: WARNING:root:[('Content-Type', 'application/json'), ('Cache-Control', 'no-store'), ('Pragma', 'no-cache')]
 
-            perms_for_user = {}
-
             if os.getenv('APP_ENV') == 'PRODUCTION':
-                access_token = body['access_token']
-
-                db_token = OAuth2Token.query.filter_by(access_token=access_token).first()
+                # The token saved by the grant; only tokens saved some other way are read back.
+                db_token = getattr(grant.request, 'saved_token', None)
+                if db_token is None:
+                    db_token = OAuth2Token.query.options(
+                        joinedload(OAuth2Token.client), joinedload(OAuth2Token.user)).filter_by(
+                        access_token=body['access_token']).first()
+
+                audience = request.data.get('audience')
+                cache_key = (db_token.access_token, audience)
+                bh_jwt = reused_token_jwts.get(cache_key)
+                if bh_jwt is None:
+                    bh_jwt = generate_jwt_based_on_token(db_token, audience=audience)
+                    if db_token.client.token_reuse_min_remaining and bh_jwt != 'none':
+                        reused_token_jwts.set(cache_key, bh_jwt, expires_at=db_token.get_expires_at())
 
-                bh_jwt = generate_jwt_based_on_token(db_token)
-                
                 body['jwt'] = bh_jwt
 
             # del body['access_token']
@@ -0,0 +1,190 @@
+"""Permissions Service Cache.
+
+The permissions service is consulted for every user JWT. This module keeps a bounded,
+per-person cache of its answers so that bursts of tokens for the same person cost one
+outbound call:
+
+- fresh entries are served directly;
+- stale entries (younger than `stale_ttl`) are served while a background refresh runs;
+- concurrent misses for the same person share a single outbound call;
+- if the permissions service fails, the last known permissions are served instead.
+
+"""
+
+import logging
+import time
+from threading import Event, Lock, Thread
+
+from authserver.config import ConfigurationFactory
+from authserver.utilities.cache import TTLCache
+from authserver.utilities.metrics import register_metrics
+
+
+class _Flight(object):
+    """An outbound lookup that concurrent callers wait on."""
+
+    def __init__(self):
+        self.event = Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+
+class PermissionsCache(object):
+    """A TTL cache of permission claims keyed by person ID.
+
+    Args:
+        ttl (float): Seconds an entry is served without contacting the permissions service.
+        stale_ttl (float): Seconds past `ttl` during which an entry is served while it is refreshed in the background.
+        max_size (int): The maximum number of people cached.
+        wait_timeout (float): Seconds a caller waits for a lookup started by another caller.
+
+    """
+
+    def __init__(self, ttl: float = 60, stale_ttl: float = 300, max_size: int = 10000, wait_timeout: float = 10):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.wait_timeout = wait_timeout
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._inflight = {}
+        self._lock = Lock()
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.coalesced = 0
+        self.served_stale_on_error = 0
+        self.invalidations = 0
+
+    def get(self, person_id: str, fetch) -> dict:
+        """Retrieve the permissions of a person.
+
+        Args:
+            person_id (str): The person to look up.
+            fetch (func): Called with `person_id` to fetch permissions from the permissions service. Raises on failure.
+
+        Returns:
+            dict: The permission claims, or an empty dict if they cannot be determined.
+
+        """
+        entry = self._cache.get_entry(person_id)
+        now = time.time()
+        if entry is not None:
+            if entry.is_fresh(now):
+                return entry.value
+            if now < entry.expires_at + self.stale_ttl:
+                self._refresh_in_background(person_id, fetch)
+                return entry.value
+
+        try:
+            return self._fetch(person_id, fetch)
+        except Exception:
+            if entry is not None:
+                self.served_stale_on_error += 1
+                logging.warning(f'Serving stale permissions for person {person_id}.')
+                return entry.value
+            return {}
+
+    def invalidate(self, person_id: str = None) -> bool:
+        """Evict a person's permissions, or every person's when `person_id` is None.
+
+        Args:
+            person_id (str): The person whose permissions changed.
+
+        Returns:
+            bool: True if anything was cached for the person.
+
+        """
+        with self._lock:
+            self.invalidations += 1
+            if person_id is None:
+                for flight in self._inflight.values():
+                    flight.invalidated = True
+                self._cache.clear()
+                return True
+            flight = self._inflight.get(person_id)
+            if flight is not None:
+                flight.invalidated = True
+            return self._cache.delete(person_id)
+
+    def stats(self) -> dict:
+        """Cache statistics for the metrics endpoint."""
+        stats = self._cache.stats()
+        stats.update({
+            'fetches': self.fetches,
+            'fetch_errors': self.fetch_errors,
+            'coalesced': self.coalesced,
+            'served_stale_on_error': self.served_stale_on_error,
+            'invalidations': self.invalidations,
+            'inflight': len(self._inflight)
+        })
+        return stats
+
+    def _fetch(self, person_id: str, fetch):
+        with self._lock:
+            flight = self._inflight.get(person_id)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[person_id] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.event.wait(self.wait_timeout):
+                raise TimeoutError(f'Timed out waiting for permissions of person {person_id}.')
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            self.fetches += 1
+            flight.value = fetch(person_id)
+        except Exception as e:
+            self.fetch_errors += 1
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(person_id) is flight:
+                    del self._inflight[person_id]
+                # An invalidation that arrived mid-flight may describe a change the response predates.
+                if flight.error is None and not flight.invalidated:
+                    self._cache.set(person_id, flight.value)
+            flight.event.set()
+        return flight.value
+
+    def _refresh_in_background(self, person_id: str, fetch):
+        with self._lock:
+            if person_id in self._inflight:
+                return
+
+        def refresh():
+            try:
+                self._fetch(person_id, fetch)
+            except Exception:
+                logging.exception(f'Background refresh of permissions for person {person_id} failed.')
+
+        Thread(target=refresh, daemon=True).start()
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_permissions_cache() -> PermissionsCache:
+    """Retrieve the process-wide permissions cache, creating it on first use.
+
+    Returns:
+        obj: The shared `PermissionsCache`.
+
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = ConfigurationFactory.from_env()
+                _cache = PermissionsCache(
+                    ttl=config.permissions_cache_ttl,
+                    stale_ttl=config.permissions_cache_stale_ttl,
+                    max_size=config.permissions_cache_max_size)
+                register_metrics('permissions_cache', _cache.stats)
+    return _cache
@@ -0,0 +1,182 @@
+"""Revocation Log.
+
+Resource servers that cache token lookups, or verify Brighthive JWTs and stateless tokens locally, learn
+about revocations from this log instead of asking the authorization server about every token. Each
+revocation adds a row to `oauth2_revocations` in the same transaction that revokes the token:
+
+- `token`: the SHA-256 hex digest of a revoked access token. A Brighthive JWT is revoked with the
+  access token in its `brighthive-access-token` claim.
+- `jti`: the `jti` of a revoked stateless access token.
+- `user`: the ID of a deactivated or deleted user, i.e. the `sub` of every token issued to them.
+
+Rows are kept until the tokens they revoke expire, and at least `REVOCATION_LOG_MIN_TTL` seconds so that
+they outlive the Brighthive JWTs issued with the tokens.
+
+Clients start from a Bloom filter snapshot of every unexpired revocation and then follow the change
+feed from the snapshot's cursor. The feed only returns rows that are `REVOCATION_FEED_SETTLE` seconds
+old, so that a row whose transaction committed after a later one is not skipped by a client's cursor.
+
+"""
+
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+
+from sqlalchemy import func, literal
+
+from authserver.config import ConfigurationFactory
+from authserver.db import OAuth2Token, RevocationLogEntry, db
+from authserver.oauth2.rfc6749.token_cache import token_digest
+from authserver.utilities.bloom import BloomFilter
+from authserver.utilities.metrics import register_metrics
+
+TOKEN = 'token'
+JTI = 'jti'
+USER = 'user'
+
+
+class RevocationLog(object):
+    """Writes revocations and serves them to resource servers.
+
+    Args:
+        min_ttl (int): The fewest seconds a revocation is published for.
+        page_size (int): The most revocations returned by one call to `changes`.
+        settle_seconds (float): How old a revocation must be before the change feed returns it.
+        false_positive_rate (float): The false positive rate of the snapshot filter.
+        snapshot_ttl (float): The most seconds a snapshot is reused while no revocation is added.
+
+    """
+
+    def __init__(self, min_ttl: int = 86400, page_size: int = 1000, settle_seconds: float = 1,
+                 false_positive_rate: float = 0.001, snapshot_ttl: float = 60):
+        self.min_ttl = min_ttl
+        self.page_size = page_size
+        self.settle_seconds = settle_seconds
+        self.false_positive_rate = false_positive_rate
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot = None
+        self._snapshot_key = None
+        self._snapshot_built_at = 0
+        self._lock = Lock()
+        self.logged = 0
+        self.snapshots = 0
+
+    def token_revoked(self, token: OAuth2Token):
+        """Log the revocation of an access token. The caller commits the session."""
+        self._add(TOKEN, token_digest(token.access_token), token.get_expires_at())
+
+    def jti_revoked(self, jti: str, expires_at: int):
+        """Log the revocation of a stateless access token. The caller commits the session."""
+        self._add(JTI, jti, expires_at)
+
+    def user_revoked(self, user_id: str):
+        """Log that every token of a user is revoked. The caller commits the session."""
+        self._add(USER, user_id, 0)
+
+    def users_revoked(self, user_ids: list):
+        """Log that every token of several users is revoked, with one row per unexpired access token.
+
+        The access token rows are written by a single `INSERT ... SELECT`. The caller commits the session.
+
+        """
+        now = int(time.time())
+        for user_id in user_ids:
+            self._add(USER, user_id, 0)
+        digest = func.encode(func.sha256(func.convert_to(OAuth2Token.access_token, 'UTF8')), 'hex')
+        expires_at = OAuth2Token.issued_at + OAuth2Token.expires_in
+        tokens = db.session.query(
+            literal(TOKEN), digest, func.greatest(expires_at, now + self.min_ttl), literal(datetime.utcnow())
+        ).filter(OAuth2Token.user_id.in_(user_ids), OAuth2Token.revoked == False, expires_at >= now)  # noqa: E712
+        result = db.session.execute(RevocationLogEntry.__table__.insert().from_select(
+            ['kind', 'value', 'expires_at', 'date_created'], tokens))
+        self.logged += result.rowcount
+
+    def changes(self, since: int = 0, limit: int = None) -> dict:
+        """Unexpired revocations logged after a cursor.
+
+        Args:
+            since (int): The cursor returned by the previous call, or 0 to start from the oldest revocation.
+            limit (int): The most revocations to return; defaults to and is capped at `page_size`.
+
+        Returns:
+            dict: The revocations as `[kind, value, expires_at]`, the cursor to continue from and
+                whether more revocations are waiting.
+
+        """
+        limit = min(limit or self.page_size, self.page_size)
+        settled = datetime.utcnow() - timedelta(seconds=self.settle_seconds)
+        rows = db.session.query(
+            RevocationLogEntry.id, RevocationLogEntry.kind, RevocationLogEntry.value, RevocationLogEntry.expires_at
+        ).filter(
+            RevocationLogEntry.id > since,
+            RevocationLogEntry.expires_at > int(time.time()),
+            RevocationLogEntry.date_created <= settled
+        ).order_by(RevocationLogEntry.id).limit(limit + 1).all()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'cursor': rows[-1].id if rows else since,
+            'more': more,
+            'revocations': [[row.kind, row.value, row.expires_at] for row in rows]
+        }
+
+    def snapshot(self) -> dict:
+        """A Bloom filter of every unexpired revocation and the cursor to follow the change feed from."""
+        cursor = db.session.query(func.max(RevocationLogEntry.id)).scalar() or 0
+        snapshot = self._snapshot
+        if snapshot is not None and self._snapshot_key == cursor and \
+                time.monotonic() - self._snapshot_built_at < self.snapshot_ttl:
+            return snapshot
+
+        with self._lock:
+            now = int(time.time())
+            values = [value for value, in db.session.query(RevocationLogEntry.value).filter(
+                RevocationLogEntry.id <= cursor, RevocationLogEntry.expires_at > now)]
+            bloom = BloomFilter(len(values), self.false_positive_rate)
+            for value in values:
+                bloom.add(value)
+
+            snapshot = {'cursor': cursor, 'generated_at': now, 'filter': bloom.to_dict()}
+            self._snapshot, self._snapshot_key, self._snapshot_built_at = snapshot, cursor, time.monotonic()
+            self.snapshots += 1
+        return snapshot
+
+    def stats(self) -> dict:
+        """Revocation log statistics for the metrics endpoint."""
+        return {
+            'logged': self.logged,
+            'snapshots': self.snapshots,
+            'snapshot_cursor': self._snapshot_key,
+            'snapshot_members': self._snapshot['filter']['count'] if self._snapshot else 0
+        }
+
+    def _add(self, kind: str, value: str, expires_at: float):
+        expires_at = max(int(expires_at), int(time.time()) + self.min_ttl)
+        db.session.add(RevocationLogEntry(kind=kind, value=value, expires_at=expires_at))
+        self.logged += 1
+
+
+_revocation_log = None
+_revocation_log_lock = Lock()
+
+
+def get_revocation_log() -> RevocationLog:
+    """Retrieve the process-wide revocation log, creating it on first use.
+
+    Returns:
+        obj: The shared `RevocationLog`.
+
+    """
+    global _revocation_log
+    if _revocation_log is None:
+        with _revocation_log_lock:
+            if _revocation_log is None:
+                config = ConfigurationFactory.from_env()
+                _revocation_log = RevocationLog(
+                    min_ttl=config.revocation_log_min_ttl,
+                    page_size=config.revocation_feed_page_size,
+                    settle_seconds=config.revocation_feed_settle,
+                    false_positive_rate=config.revocation_filter_false_positive_rate)
+                register_metrics('revocation_log', _revocation_log.stats)
+    return _revocation_log
@@ -0,0 +1,120 @@
+"""Service Credential.
+
+Authserver authenticates to other Brighthive services (e.g. the permissions service) with a JWT
+it signs for itself. This module keeps that JWT per worker and reuses it until shortly before it
+expires, refreshing it in the background so that callers never wait on a signature.
+
+"""
+
+import logging
+import time
+from threading import Lock, Thread
+
+import jwt
+
+from authserver.config import ConfigurationFactory
+from authserver.utilities.metrics import register_metrics
+
+
+class ServiceCredential(object):
+    """A self-signed service JWT that is minted once and reused.
+
+    Args:
+        refresh_margin (float): Seconds before `exp` at which the JWT is refreshed in the background.
+        min_remaining (float): Seconds before `exp` after which the JWT is no longer handed out and is minted again inline.
+
+    """
+
+    def __init__(self, refresh_margin: float = 300, min_remaining: float = 30):
+        self.refresh_margin = refresh_margin
+        self.min_remaining = min_remaining
+        self._token = None
+        self._expires_at = 0
+        self._lock = Lock()
+        self._refreshing = False
+        self.mints = 0
+        self.reuses = 0
+
+    def get(self, mint) -> str:
+        """Retrieve the service JWT.
+
+        Args:
+            mint (func): Called without arguments to sign a new JWT. Raises on failure.
+
+        Returns:
+            str: A JWT with at least `min_remaining` seconds left.
+
+        """
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+        if token and now < expires_at - self.min_remaining:
+            self.reuses += 1
+            if now >= expires_at - self.refresh_margin:
+                self._refresh_in_background(mint)
+            return token
+
+        with self._lock:
+            # Another caller may have minted while we waited on the lock.
+            if self._token and time.time() < self._expires_at - self.min_remaining:
+                self.reuses += 1
+                return self._token
+            return self._mint(mint)
+
+    def clear(self):
+        """Forget the cached JWT, e.g. after the signing key or the claims change."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
+
+    def stats(self) -> dict:
+        """Credential statistics for the metrics endpoint."""
+        return {
+            'mints': self.mints,
+            'reuses': self.reuses,
+            'expires_in': max(0, int(self._expires_at - time.time())) if self._token else 0
+        }
+
+    def _mint(self, mint) -> str:
+        token = mint()
+        claims = jwt.decode(token, options={'verify_signature': False})
+        self._token, self._expires_at = token, claims['exp']
+        self.mints += 1
+        return token
+
+    def _refresh_in_background(self, mint):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                with self._lock:
+                    self._mint(mint)
+            except Exception:
+                logging.exception('Failed to refresh the service JWT.')
+            finally:
+                self._refreshing = False
+
+        Thread(target=refresh, daemon=True).start()
+
+
+_credential = None
+_credential_lock = Lock()
+
+
+def get_service_credential() -> ServiceCredential:
+    """Retrieve the process-wide service credential, creating it on first use.
+
+    Returns:
+        obj: The shared `ServiceCredential`.
+
+    """
+    global _credential
+    if _credential is None:
+        with _credential_lock:
+            if _credential is None:
+                config = ConfigurationFactory.from_env()
+                _credential = ServiceCredential(refresh_margin=config.service_jwt_refresh_margin)
+                register_metrics('service_jwt', _credential.stats)
+    return _credential
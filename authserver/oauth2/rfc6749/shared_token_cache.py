@@ -0,0 +1,376 @@
+"""Shared Token Cache.
+
+A fixed-size hash table of bearer token lookups kept in a memory-mapped file (by default under
+`/dev/shm`), so that every worker on a host shares one warm cache instead of each keeping its own.
+
+Each slot holds the SHA-256 digest of a token and the columns needed to validate it: the client, the
+user, the scope, whether it is revoked and when it expires. Slots are found by open addressing over
+a short probe window. Reads take no lock: every slot carries a sequence number that writers make odd
+while they write, and a reader retries whenever the number was odd or changed during its copy.
+Writers serialise per stripe of slots with a thread lock and an `fcntl` byte-range lock on the file.
+
+Invalidating a token writes a marker into its slot rather than clearing it, even if the token is not
+cached, so that a worker that read the token from the database before the invalidation cannot store
+the stale result afterwards. Invalidating every token of a user or client likewise records when it
+happened in a small table of owners, which a worker checks before storing a token it loaded earlier.
+
+The file is named after its layout (see `shared_tables`), so workers configured with a different
+number of slots, e.g. during a rolling deploy, use a separate table rather than resizing this one.
+
+"""
+
+import fcntl
+import hashlib
+import struct
+import time
+from threading import Lock
+
+from authserver.db import OAuth2Token
+from authserver.utilities.shared_tables import open_shared_table, table_path
+
+MAGIC = b'BHTC'
+VERSION = 2
+HEADER = struct.Struct('<4sII')
+HEADER_SIZE = 64
+
+# seq, digest, state, revoked, id, issued_at, expires_in, entry expiry, client_id, user_id, scope
+SLOT = struct.Struct('<I32sBB2xqqqd48s64s256s8x')
+SEQ = struct.Struct('<I')
+
+# owner digest, invalidation time in microseconds
+OWNER = struct.Struct('<16sq')
+OWNER_SLOTS = 4096
+
+EMPTY = 0
+FOUND = 1
+NOT_FOUND = 2
+INVALIDATED = 3
+
+_MISS = object()
+
+PROBES = 8
+STRIPES = 64
+READ_RETRIES = 8
+
+
+def _encode(value, size: int):
+    data = (value or '').encode('utf-8')
+    return data if len(data) <= size else None
+
+
+def _decode(data: bytes) -> str:
+    return data.rstrip(b'\0').decode('utf-8')
+
+
+class SharedTokenCache(object):
+    """A token lookup cache shared by every process that maps the same file.
+
+    It has the same interface as `TokenCache` and is used in its place when `TOKEN_CACHE_SHARED_PATH`
+    is set.
+
+    Args:
+        path (str): The file backing the table, e.g. `/dev/shm/authserver-token-cache`, suffixed with its layout.
+        slots (int): The number of slots. Each slot takes 448 bytes.
+        negative_ttl (float): Seconds an unknown token is remembered as unknown.
+        max_ttl (float): If set, the most seconds a token is cached for, even if it expires later.
+
+    """
+
+    def __init__(self, path: str, slots: int = 32768, negative_ttl: float = 5, max_ttl: float = None):
+        self.slots = slots
+        self.path = table_path(path, VERSION, slots)
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl or None
+        self._owners_offset = HEADER_SIZE + slots * SLOT.size
+        self._size = self._owners_offset + OWNER_SLOTS * OWNER.size
+        self._locks = [Lock() for _ in range(STRIPES)]
+        self._owners_lock = Lock()
+        self._fd, self._map = open_shared_table(self.path, HEADER.pack(MAGIC, VERSION, self.slots), self._size)
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.invalidations = 0
+
+    def get(self, token_string: str, load) -> OAuth2Token:
+        """Look up a bearer token.
+
+        Args:
+            token_string (str): The bearer token.
+            load (func): Called with the token string on a miss; returns the `OAuth2Token` or None.
+
+        Returns:
+            obj: A transient copy of the token, or None if it does not exist.
+
+        """
+        digest = hashlib.sha256(token_string.encode('utf-8')).digest()
+        now = time.time()
+        token = self._cached(token_string, digest, now)
+        if token is not _MISS:
+            return token
+        return self._load(token_string, digest, now, load(token_string))
+
+    def get_many(self, token_strings: list, load_many) -> dict:
+        """Look up several bearer tokens, loading all of the uncached ones at once.
+
+        Args:
+            token_strings (list): The bearer tokens.
+            load_many (func): Called with the list of uncached token strings; returns a dict mapping
+                each token string that exists to its `OAuth2Token`.
+
+        Returns:
+            dict: Each token string mapped to a transient copy of its token, or None if it does not exist.
+
+        """
+        now = time.time()
+        tokens, missing = {}, {}
+        for token_string in token_strings:
+            digest = hashlib.sha256(token_string.encode('utf-8')).digest()
+            token = self._cached(token_string, digest, now)
+            if token is _MISS:
+                missing[token_string] = digest
+            else:
+                tokens[token_string] = token
+
+        if missing:
+            loaded = load_many(list(missing))
+            for token_string, digest in missing.items():
+                tokens[token_string] = self._load(token_string, digest, now, loaded.get(token_string))
+        return tokens
+
+    def invalidate(self, token_string: str) -> bool:
+        """Forget a token in every worker, e.g. after it was revoked."""
+        self.invalidations += 1
+        digest = hashlib.sha256(token_string.encode('utf-8')).digest()
+        index, fields = self._find(digest)
+        # Mark the token even if it is not cached, in case a worker is loading it right now.
+        self._invalidate_slot(self._choose_slot(digest) if index is None else index, digest, replace=True)
+        return fields is not None and fields[2] == FOUND
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Forget every token issued to a user."""
+        return self.invalidate_users([user_id])
+
+    def invalidate_users(self, user_ids: list) -> int:
+        """Forget every token issued to any of several users, in a single pass over the table."""
+        self._mark_owners('user', user_ids)
+        return self._invalidate_where(9, [_encode(user_id, 64) for user_id in user_ids])
+
+    def invalidate_client(self, client_id: str) -> int:
+        """Forget every token issued to a client."""
+        self._mark_owners('client', [client_id])
+        return self._invalidate_where(8, [_encode(client_id, 48)])
+
+    def clear(self):
+        empty = (bytes(32), EMPTY, False, 0, 0, 0, 0.0, b'', b'', b'')
+        for stripe in range(STRIPES):
+            with self._stripe_lock(stripe):
+                for index in range(stripe, self.slots, STRIPES):
+                    self._write(index, empty)
+
+    def stats(self) -> dict:
+        """Cache statistics of this worker for the metrics endpoint."""
+        return {
+            'shared_path': self.path,
+            'slots': self.slots,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'invalidations': self.invalidations
+        }
+
+    def _cached(self, token_string: str, digest: bytes, now: float):
+        _, fields = self._find(digest)
+        if fields is not None and fields[7] > now:
+            if fields[2] == FOUND:
+                self.hits += 1
+                return self._to_token(token_string, fields)
+            if fields[2] == NOT_FOUND:
+                self.negative_hits += 1
+                return None
+        self.misses += 1
+        return _MISS
+
+    def _load(self, token_string: str, digest: bytes, loaded_at: float, token: OAuth2Token) -> OAuth2Token:
+        if token is None:
+            self._store(digest, loaded_at, NOT_FOUND, expires_at=loaded_at + self.negative_ttl)
+            return None
+
+        expires_at = token.get_expires_at()
+        if self.max_ttl:
+            expires_at = min(expires_at, loaded_at + self.max_ttl)
+        self._store(digest, loaded_at, FOUND, token, expires_at)
+        return OAuth2Token(
+            id=token.id, user_id=token.user_id, client_id=token.client_id, token_type=token.token_type,
+            access_token=token_string, scope=token.scope, revoked=token.revoked, issued_at=token.issued_at,
+            expires_in=token.expires_in)
+
+    def _offset(self, index: int) -> int:
+        return HEADER_SIZE + index * SLOT.size
+
+    def _read(self, index: int):
+        offset = self._offset(index)
+        for _ in range(READ_RETRIES):
+            seq = SEQ.unpack_from(self._map, offset)[0]
+            if seq & 1:
+                continue
+            fields = SLOT.unpack_from(self._map, offset)
+            if fields[0] == seq and SEQ.unpack_from(self._map, offset)[0] == seq:
+                return fields
+        # A writer kept the slot busy; treat it as a miss.
+        return None
+
+    def _find(self, digest: bytes):
+        home = int.from_bytes(digest[:8], 'little') % self.slots
+        for probe in range(PROBES):
+            index = (home + probe) % self.slots
+            fields = self._read(index)
+            if fields is None:
+                continue
+            if fields[2] == EMPTY:
+                break
+            if fields[1] == digest:
+                return index, fields
+        return None, None
+
+    def _choose_slot(self, digest: bytes) -> int:
+        home = int.from_bytes(digest[:8], 'little') % self.slots
+        victim, victim_expiry = home, None
+        for probe in range(PROBES):
+            index = (home + probe) % self.slots
+            fields = self._read(index)
+            if fields is None:
+                continue
+            if fields[2] == EMPTY or fields[1] == digest:
+                return index
+            if victim_expiry is None or fields[7] < victim_expiry:
+                victim, victim_expiry = index, fields[7]
+        return victim
+
+    def _stripe_lock(self, stripe: int):
+        return _StripeLock(self._locks[stripe], self._fd, self._size + stripe)
+
+    def _write(self, index: int, values: tuple):
+        offset = self._offset(index)
+        seq = SEQ.unpack_from(self._map, offset)[0]
+        SEQ.pack_into(self._map, offset, seq + 1)
+        SLOT.pack_into(self._map, offset, seq + 1, *values)
+        SEQ.pack_into(self._map, offset, seq + 2)
+
+    def _store(self, digest: bytes, loaded_at: float, state: int, token: OAuth2Token = None, expires_at: float = 0):
+        if token is not None:
+            client_id, user_id, scope = _encode(token.client_id, 48), _encode(token.user_id, 64), _encode(token.scope, 256)
+            if client_id is None or user_id is None or scope is None:
+                return
+            values = (digest, state, bool(token.revoked), token.id or 0, token.issued_at, token.expires_in,
+                      expires_at, client_id, user_id, scope)
+        else:
+            values = (digest, state, False, 0, 0, 0, expires_at, b'', b'', b'')
+
+        index = self._choose_slot(digest)
+        with self._stripe_lock(index % STRIPES):
+            current = SLOT.unpack_from(self._map, self._offset(index))
+            if current[1] == digest and current[2] == INVALIDATED and current[5] >= int(loaded_at * 1000000):
+                # Invalidated after this worker read the token; the loaded value may be stale.
+                return
+            if token is not None and self._owner_invalidated_since(loaded_at, token.user_id, token.client_id):
+                # Every token of its user or client was invalidated after this worker read it.
+                return
+            self._write(index, values)
+        self.writes += 1
+
+    def _invalidate_slot(self, index: int, digest: bytes, replace: bool = False):
+        now = time.time()
+        with self._stripe_lock(index % STRIPES):
+            current = SLOT.unpack_from(self._map, self._offset(index))
+            if current[1] != digest and not replace:
+                return
+            # Keep the marker for as long as a concurrent load could still be in flight.
+            # The invalidation time, in microseconds, is kept in the issued_at field.
+            self._write(index, (digest, INVALIDATED, True, 0, int(now * 1000000), 0, now + max(self.negative_ttl, 1),
+                                b'', b'', b''))
+
+    def _invalidate_where(self, field: int, values: list) -> int:
+        self.invalidations += 1
+        values = {value for value in values if value}
+        if not values:
+            return 0
+        invalidated = 0
+        for index in range(self.slots):
+            fields = self._read(index)
+            if fields is not None and fields[2] == FOUND and fields[field].rstrip(b'\0') in values:
+                self._invalidate_slot(index, fields[1])
+                invalidated += 1
+        return invalidated
+
+    def _owner_digest(self, kind: str, owner_id: str) -> bytes:
+        return hashlib.sha256(f'{kind}:{owner_id}'.encode('utf-8')).digest()[:16]
+
+    def _owners_lock_range(self):
+        return _StripeLock(self._owners_lock, self._fd, self._size + STRIPES)
+
+    def _find_owner(self, digest: bytes, claim: bool = False):
+        """The offset of an owner and when it was invalidated, or with `claim` the oldest entry to replace."""
+        home = int.from_bytes(digest[:8], 'little') % OWNER_SLOTS
+        victim, victim_time = home, None
+        for probe in range(PROBES):
+            index = (home + probe) % OWNER_SLOTS
+            offset = self._owners_offset + index * OWNER.size
+            owner, invalidated_at = OWNER.unpack_from(self._map, offset)
+            if owner == digest:
+                return offset, invalidated_at
+            if victim_time is None or invalidated_at < victim_time:
+                # Old entries only matter while a load from before them is in flight.
+                victim, victim_time = offset, invalidated_at
+        return (victim, None) if claim else (None, None)
+
+    def _mark_owners(self, kind: str, owner_ids: list):
+        # Recorded before the slots are scanned, so a load that stores after the scan is refused.
+        now = int(time.time() * 1000000)
+        with self._owners_lock_range():
+            for owner_id in owner_ids:
+                if owner_id:
+                    digest = self._owner_digest(kind, owner_id)
+                    offset, _ = self._find_owner(digest, claim=True)
+                    OWNER.pack_into(self._map, offset, digest, now)
+
+    def _owner_invalidated_since(self, loaded_at: float, user_id: str, client_id: str) -> bool:
+        loaded_at = int(loaded_at * 1000000)
+        with self._owners_lock_range():
+            for kind, owner_id in (('user', user_id), ('client', client_id)):
+                if owner_id:
+                    _, invalidated_at = self._find_owner(self._owner_digest(kind, owner_id))
+                    if invalidated_at is not None and invalidated_at >= loaded_at:
+                        return True
+        return False
+
+    def _to_token(self, token_string: str, fields: tuple) -> OAuth2Token:
+        return OAuth2Token(
+            id=fields[4] or None, user_id=_decode(fields[9]) or None, client_id=_decode(fields[8]) or None,
+            token_type='Bearer', access_token=token_string, scope=_decode(fields[10]), revoked=bool(fields[3]),
+            issued_at=fields[5], expires_in=fields[6])
+
+
+class _StripeLock(object):
+    """Serialises writers to a stripe of slots within this process and across processes."""
+
+    def __init__(self, lock: Lock, fd: int, offset: int):
+        self.lock = lock
+        self.fd = fd
+        self.offset = offset
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+        except Exception:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+        finally:
+            self.lock.release()
@@ -0,0 +1,392 @@
+"""JWT Signing Keys.
+
+This module provides a process-wide manager for the private keys used to sign Brighthive JWTs.
+Keys are parsed once, identified by a `kid` (their RFC 7638 thumbprint) and re-read only when
+the files backing them change on disk, so a key can be rotated without restarting the workers.
+
+RSA (RS256), elliptic curve (ES256/ES384) and Ed25519 (EdDSA) keys are supported. The algorithm
+follows from the key type; EC and Ed25519 signatures are far cheaper to produce than RSA ones.
+
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from threading import Lock
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from authserver.config import ConfigurationFactory
+from authserver.utilities.metrics import register_metrics
+
+
+class SigningKeyError(Exception):
+    pass
+
+
+EC_CURVES = {
+    'secp256r1': ('P-256', 'ES256', 32),
+    'secp384r1': ('P-384', 'ES384', 48)
+}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64_uint(value: int, length: int = None) -> str:
+    return _b64(value.to_bytes(length or (value.bit_length() + 7) // 8 or 1, 'big'))
+
+
+def public_jwk(private_key) -> dict:
+    """Build the public JSON Web Key for a private key.
+
+    Args:
+        private_key (obj): A `cryptography` private key.
+
+    Returns:
+        dict: The JWK members required by RFC 7517 for the public half of the key.
+
+    Raises:
+        SigningKeyError: If the key type is not supported.
+
+    """
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        numbers = private_key.public_key().public_numbers()
+        return {'kty': 'RSA', 'e': _b64_uint(numbers.e), 'n': _b64_uint(numbers.n)}
+    if isinstance(private_key, ec.EllipticCurvePrivateKey) and private_key.curve.name in EC_CURVES:
+        crv, _, size = EC_CURVES[private_key.curve.name]
+        numbers = private_key.public_key().public_numbers()
+        return {'kty': 'EC', 'crv': crv, 'x': _b64_uint(numbers.x, size), 'y': _b64_uint(numbers.y, size)}
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        raw = private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        return {'kty': 'OKP', 'crv': 'Ed25519', 'x': _b64(raw)}
+    raise SigningKeyError(f'Unsupported signing key type {type(private_key).__name__}.')
+
+
+def jwk_thumbprint(jwk: dict) -> str:
+    """Compute the RFC 7638 thumbprint of a public JWK.
+
+    Args:
+        jwk (dict): The public JWK.
+
+    Returns:
+        str: The base64url encoded SHA-256 thumbprint.
+
+    """
+    required = {'RSA': ('e', 'kty', 'n'), 'EC': ('crv', 'kty', 'x', 'y'), 'OKP': ('crv', 'kty', 'x')}
+    members = {k: jwk[k] for k in required[jwk['kty']]}
+    digest = hashlib.sha256(json.dumps(members, sort_keys=True, separators=(',', ':')).encode('utf-8')).digest()
+    return _b64(digest)
+
+
+def _algorithm_for_key(private_key) -> str:
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return 'RS256'
+    if isinstance(private_key, ec.EllipticCurvePrivateKey) and private_key.curve.name in EC_CURVES:
+        return EC_CURVES[private_key.curve.name][1]
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return 'EdDSA'
+    raise SigningKeyError(f'Unsupported signing key type {type(private_key).__name__}.')
+
+
+class SigningKey(object):
+    """A parsed private key and the metadata needed to sign with it.
+
+    Attributes:
+        kid (str): The key identifier placed in the JWT header.
+        private_key (obj): The parsed `cryptography` private key.
+        algorithm (str): The JWS algorithm used with this key.
+        path (str): The file the key was loaded from, if any.
+        mtime (float): The modification time of `path` when the key was loaded.
+
+    """
+
+    def __init__(self, private_key, path: str = None, mtime: float = None):
+        self.private_key = private_key
+        self.algorithm = _algorithm_for_key(private_key)
+        self.public_jwk = public_jwk(private_key)
+        self.kid = jwk_thumbprint(self.public_jwk)
+        self.path = path
+        self.mtime = mtime
+
+    def to_jwk(self) -> dict:
+        """The public JWK of this key, as published in a JWKS document."""
+        jwk = dict(self.public_jwk)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+    @classmethod
+    def from_pem(cls, pem: bytes, path: str = None, mtime: float = None):
+        private_key = load_pem_private_key(pem, password=None, backend=default_backend())
+        return cls(private_key, path=path, mtime=mtime)
+
+    @classmethod
+    def from_file(cls, path: str):
+        mtime = os.stat(path).st_mtime
+        with open(path, 'rb') as key_file:
+            return cls.from_pem(key_file.read(), path=path, mtime=mtime)
+
+
+class SigningKeyManager(object):
+    """Process-wide holder of JWT signing keys.
+
+    The key at `private_key_path` is the active key and signs new JWTs by default. Keys listed in
+    `additional_key_paths` are published too, so that tokens they signed can still be verified while
+    a rotation is in progress, and sign only when a caller asks for their algorithm. Setting
+    `algorithm` makes the first loaded key of that algorithm the default signer instead, which lets a
+    deployment move from RS256 to ES256 or EdDSA by loading both keys and flipping one setting.
+    Every `reload_interval` seconds the key files are checked with a single `stat` each and
+    re-parsed only if their modification time changed. An entry of `audience_algorithms` whose
+    algorithm no loaded key uses is logged when the keys are loaded and ignored until such a key is.
+
+    Args:
+        private_key_path (str): Path to the PEM encoded active private key.
+        additional_key_paths (list): Paths to PEM encoded keys that are published alongside the active key.
+        reload_interval (float): Minimum number of seconds between checks of the key files.
+        algorithm (str): The algorithm new JWTs are signed with by default, e.g. RS256, ES256 or EdDSA.
+        audience_algorithms (dict): The algorithm JWTs for a single audience are signed with, by audience.
+
+    """
+
+    def __init__(self, private_key_path: str = None, additional_key_paths: list = None, reload_interval: float = 5,
+                 algorithm: str = None, audience_algorithms: dict = None):
+        self.private_key_path = private_key_path
+        self.additional_key_paths = [p for p in (additional_key_paths or []) if p]
+        self.reload_interval = reload_interval
+        self.algorithm = algorithm
+        self.audience_algorithms = audience_algorithms or {}
+        self._lock = Lock()
+        self._keys = {}
+        self._active = None
+        self._last_checked = 0
+        self._sign_count = 0
+        self._sign_total = 0.0
+        self._sign_max = 0.0
+        self._sign_last = 0.0
+        self._reloads = 0
+        self._unsigned_audiences = set()
+        self.reload(force=True)
+
+    @property
+    def active_key(self) -> SigningKey:
+        """The key used to sign new JWTs."""
+        self._maybe_reload()
+        if self._active is None:
+            raise SigningKeyError('No JWT signing key is loaded.')
+        return self._active
+
+    def keys(self) -> list:
+        """Every loaded key, active key first."""
+        self._maybe_reload()
+        keys = [self._active] if self._active else []
+        keys.extend(k for k in self._keys.values() if k is not self._active)
+        return keys
+
+    def key_for_algorithm(self, algorithm: str = None) -> SigningKey:
+        """The key that signs JWTs for an algorithm.
+
+        Args:
+            algorithm (str): The requested algorithm. Defaults to the deployment's configured algorithm.
+
+        Returns:
+            obj: The active key if it matches, otherwise the first loaded key of that algorithm.
+
+        Raises:
+            SigningKeyError: If no loaded key uses the algorithm.
+
+        """
+        active = self.active_key
+        algorithm = algorithm or self.algorithm
+        if algorithm is None or active.algorithm == algorithm:
+            return active
+        for key in self.keys():
+            if key.algorithm == algorithm:
+                return key
+        raise SigningKeyError(f'No loaded JWT signing key uses {algorithm}.')
+
+    def algorithm_for_audience(self, audience: str) -> str:
+        """The algorithm JWTs for a single audience are signed with, or None for the default algorithm.
+
+        Args:
+            audience (str): The audience of the JWT.
+
+        Returns:
+            str: The configured algorithm of the audience, if a loaded key uses it.
+
+        """
+        self._maybe_reload()
+        if audience in self._unsigned_audiences:
+            return None
+        return self.audience_algorithms.get(audience)
+
+    def jwks(self) -> dict:
+        """The JWKS document advertising every loaded key."""
+        return {'keys': [key.to_jwk() for key in self.keys()]}
+
+    def get_key(self, kid: str) -> SigningKey:
+        """Retrieve a loaded key by its identifier, or None."""
+        self._maybe_reload()
+        return self._keys.get(kid)
+
+    def add_key(self, key: SigningKey, active: bool = False):
+        """Load a key that is not backed by the configured paths.
+
+        Args:
+            key (obj): The key to add.
+            active (bool): Whether the key should become the signing key.
+
+        """
+        with self._lock:
+            self._keys[key.kid] = key
+            if active or self._active is None:
+                self._active = key
+
+    def sign(self, claims: dict, headers: dict = None, algorithm: str = None) -> str:
+        """Sign a set of claims.
+
+        Args:
+            claims (dict): The JWT claims.
+            headers (dict): Extra JWT header fields.
+            algorithm (str): Sign with a key of this algorithm rather than the default one.
+
+        Returns:
+            str: The encoded JWT.
+
+        """
+        key = self.key_for_algorithm(algorithm)
+        jwt_headers = {'kid': key.kid}
+        if headers:
+            jwt_headers.update(headers)
+
+        started = time.perf_counter()
+        token = jwt.encode(claims, key.private_key, algorithm=key.algorithm, headers=jwt_headers)
+        elapsed = time.perf_counter() - started
+
+        self._sign_count += 1
+        self._sign_total += elapsed
+        self._sign_last = elapsed
+        if elapsed > self._sign_max:
+            self._sign_max = elapsed
+        return token
+
+    def reload(self, force: bool = False):
+        """Re-read any key file whose modification time changed.
+
+        Args:
+            force (bool): Re-read every key file regardless of its modification time.
+
+        """
+        with self._lock:
+            self._last_checked = time.monotonic()
+            keys = {kid: key for kid, key in self._keys.items() if key.path is None}
+            active = None
+            changed = force
+            for path in [self.private_key_path] + self.additional_key_paths:
+                if not path:
+                    continue
+                key = self._load(path, force)
+                if key is None:
+                    continue
+                changed = changed or key is not self._find_by_path(path)
+                keys[key.kid] = key
+                if path == self.private_key_path:
+                    active = key
+            if active is None and self._active is not None and self._active.path is None:
+                active = self._active
+            if changed:
+                self._reloads += 1
+                logging.info(f'Loaded {len(keys)} JWT signing key(s); active kid: {active.kid if active else None}.')
+            self._keys = keys
+            self._active = active
+            self._check_audience_algorithms()
+
+    def stats(self) -> dict:
+        """Signing statistics for the metrics endpoint."""
+        return {
+            'active_kid': self._active.kid if self._active else None,
+            'algorithm': self.algorithm or (self._active.algorithm if self._active else None),
+            'keys': len(self._keys),
+            'reloads': self._reloads,
+            'sign_count': self._sign_count,
+            'sign_avg_ms': round(self._sign_total / self._sign_count * 1000, 3) if self._sign_count else 0,
+            'sign_max_ms': round(self._sign_max * 1000, 3),
+            'sign_last_ms': round(self._sign_last * 1000, 3)
+        }
+
+    def _check_audience_algorithms(self):
+        algorithms = {key.algorithm for key in self._keys.values()}
+        unsigned = {audience for audience, algorithm in self.audience_algorithms.items() if algorithm not in algorithms}
+        for audience in sorted(unsigned - self._unsigned_audiences):
+            logging.error(f'No loaded JWT signing key uses {self.audience_algorithms[audience]}, the algorithm of '
+                          f'audience {audience}; its JWTs are signed with the default algorithm instead.')
+        self._unsigned_audiences = unsigned
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._last_checked >= self.reload_interval:
+            self.reload()
+
+    def _find_by_path(self, path: str):
+        for key in self._keys.values():
+            if key.path == path:
+                return key
+        return None
+
+    def _load(self, path: str, force: bool):
+        current = self._find_by_path(path)
+        try:
+            mtime = os.stat(path).st_mtime
+            if current is not None and not force and current.mtime == mtime:
+                return current
+            return SigningKey.from_file(path)
+        except Exception:
+            logging.exception(f'Failed to load JWT signing key from {path}.')
+            # Keep signing with the previous key rather than failing every token while a file is being replaced.
+            return current
+
+
+_manager = None
+_manager_lock = Lock()
+
+
+def get_signing_key_manager() -> SigningKeyManager:
+    """Retrieve the process-wide signing key manager, creating it on first use.
+
+    Returns:
+        obj: The shared `SigningKeyManager`.
+
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                config = ConfigurationFactory.from_env()
+                _manager = SigningKeyManager(
+                    private_key_path=config.signature_private_path,
+                    additional_key_paths=config.signature_additional_key_paths,
+                    reload_interval=config.signature_key_reload_interval,
+                    algorithm=config.jwt_signing_algorithm,
+                    audience_algorithms=config.jwt_audience_algorithms)
+                register_metrics('jwt_signing', _manager.stats)
+    return _manager
+
+
+def set_signing_key_manager(manager: SigningKeyManager):
+    """Replace the process-wide signing key manager.
+
+    Args:
+        manager (obj): The manager to use, or None to rebuild it from configuration on next use.
+
+    """
+    global _manager
+    with _manager_lock:
+        _manager = manager
+        if manager is not None:
+            register_metrics('jwt_signing', manager.stats)
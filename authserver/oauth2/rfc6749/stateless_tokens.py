@@ -0,0 +1,187 @@
+"""Stateless Access Tokens.
+
+Clients with `stateless_tokens` enabled receive access tokens that are JWTs signed by the JWT signing
+keys instead of random strings stored in `oauth2_tokens`. Such a token carries everything needed to
+validate it (client, scope, expiry and a unique `jti`), so issuing it writes nothing to the database
+and validating it only checks the signature and a small in-memory set of revoked `jti`s.
+
+The revocation set lives in each worker. A revoked stateless token is rejected by the worker that
+handled the revocation immediately and by the others once it expires, so stateless tokens should be
+kept short-lived (`OAUTH2_TOKEN_EXPIRES_IN`).
+
+"""
+
+import time
+import uuid
+from threading import Lock
+
+import jwt
+
+from authserver.db import OAuth2Token
+from authserver.oauth2.rfc6749.signing_keys import get_signing_key_manager
+from authserver.utilities.metrics import register_metrics
+
+TOKEN_TYPE = 'at+jwt'
+ISSUER = 'brighthive-authserver'
+
+
+def is_stateless_token(token_string: str) -> bool:
+    """Determine whether a token string is a stateless access token rather than an opaque one."""
+    return bool(token_string) and token_string.count('.') == 2
+
+
+class RevocationSet(object):
+    """The `jti`s of revoked stateless tokens, kept only until the tokens expire."""
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = Lock()
+
+    def add(self, jti: str, expires_at: float):
+        with self._lock:
+            self._purge()
+            self._revoked[jti] = expires_at
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def _purge(self):
+        now = time.time()
+        for jti in [jti for jti, expires_at in self._revoked.items() if expires_at < now]:
+            del self._revoked[jti]
+
+
+class StatelessTokens(object):
+    """Issues and verifies self-contained access tokens.
+
+    Args:
+        key_manager (obj): The `SigningKeyManager` used to sign and verify tokens.
+
+    """
+
+    def __init__(self, key_manager=None):
+        self.key_manager = key_manager or get_signing_key_manager()
+        self.revoked = RevocationSet()
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def issue(self, client, scope: str, expires_in: int) -> str:
+        """Sign a new access token.
+
+        Args:
+            client (obj): The `OAuth2Client` the token is issued to.
+            scope (str): The granted scope.
+            expires_in (int): Lifetime of the token in seconds.
+
+        Returns:
+            str: The encoded access token.
+
+        """
+        issued_at = int(time.time())
+        claims = {
+            'iss': ISSUER,
+            'sub': client.client_id,
+            'client_id': client.client_id,
+            'scope': scope or '',
+            'iat': issued_at,
+            'exp': issued_at + expires_in,
+            'jti': uuid.uuid4().hex
+        }
+        self.issued += 1
+        return self.key_manager.sign(claims, headers={'typ': TOKEN_TYPE})
+
+    def verify(self, token_string: str) -> OAuth2Token:
+        """Verify an access token.
+
+        Expiry and revocation are reflected on the returned token rather than rejected here, so that
+        callers report them the same way as for tokens stored in the database.
+
+        Args:
+            token_string (str): The encoded access token.
+
+        Returns:
+            obj: A transient `OAuth2Token` describing the token, or None if it is not a valid stateless token.
+
+        """
+        claims = self._decode(token_string)
+        if claims is None:
+            self.rejected += 1
+            return None
+
+        self.verified += 1
+        return OAuth2Token(
+            client_id=claims['client_id'],
+            token_type='Bearer',
+            access_token=token_string,
+            scope=claims.get('scope', ''),
+            revoked=claims['jti'] in self.revoked,
+            issued_at=claims['iat'],
+            expires_in=claims['exp'] - claims['iat'])
+
+    def claims(self, token_string: str) -> dict:
+        """The verified claims of a stateless access token, or None if it is not one."""
+        return self._decode(token_string)
+
+    def revoke(self, token: OAuth2Token) -> bool:
+        """Revoke a stateless access token for the lifetime of its remaining validity.
+
+        Args:
+            token (obj): A token returned by `verify`.
+
+        Returns:
+            bool: True if the token was revoked, False if it is not a valid stateless token.
+
+        """
+        claims = self._decode(token.access_token)
+        if claims is None:
+            return False
+        self.revoked.add(claims['jti'], claims['exp'])
+        token.revoked = True
+        return True
+
+    def stats(self) -> dict:
+        """Stateless token statistics for the metrics endpoint."""
+        return {
+            'issued': self.issued,
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'revoked': len(self.revoked)
+        }
+
+    def _decode(self, token_string: str):
+        try:
+            header = jwt.get_unverified_header(token_string)
+            if header.get('typ') != TOKEN_TYPE:
+                return None
+            key = self.key_manager.get_key(header.get('kid'))
+            if key is None:
+                return None
+            return jwt.decode(
+                token_string, key.private_key.public_key(), algorithms=[key.algorithm], issuer=ISSUER,
+                options={'verify_exp': False, 'require': ['exp', 'iat', 'jti', 'client_id']})
+        except jwt.InvalidTokenError:
+            return None
+
+
+_stateless_tokens = None
+_stateless_tokens_lock = Lock()
+
+
+def get_stateless_tokens() -> StatelessTokens:
+    """Retrieve the process-wide stateless token issuer, creating it on first use.
+
+    Returns:
+        obj: The shared `StatelessTokens`.
+
+    """
+    global _stateless_tokens
+    if _stateless_tokens is None:
+        with _stateless_tokens_lock:
+            if _stateless_tokens is None:
+                _stateless_tokens = StatelessTokens()
+                register_metrics('stateless_tokens', _stateless_tokens.stats)
+    return _stateless_tokens
@@ -0,0 +1,192 @@
+"""Validated Token Cache.
+
+Every protected request and every `/oauth/validate` call looks up its bearer token. This module keeps
+the result of those lookups per worker, keyed by a digest of the token, so that repeated calls with
+the same token are answered from memory. A token found in the database is cached until it expires;
+a token that is not found is remembered for a few seconds so that unknown tokens do not reach the
+database on every retry.
+
+Revoking a token through the revocation endpoint, deactivating a user or deleting a user or client
+invalidates the affected entries in the worker that handled the change. Other workers keep serving an
+entry for at most `TOKEN_CACHE_MAX_TTL` seconds, which defaults to a few seconds for this reason. Set
+`TOKEN_CACHE_SHARED_PATH` to share one cache between all workers on a host instead (see
+`shared_token_cache`), which makes every invalidation visible to all of them at once.
+
+"""
+
+import hashlib
+import time
+from threading import Lock
+
+from authserver.config import ConfigurationFactory
+from authserver.db import OAuth2Token
+from authserver.oauth2.rfc6749.shared_token_cache import SharedTokenCache
+from authserver.utilities.cache import TTLCache
+from authserver.utilities.metrics import register_metrics
+
+_NOT_FOUND = object()
+_MISS = object()
+
+
+def token_digest(token_string: str) -> str:
+    return hashlib.sha256(token_string.encode('utf-8')).hexdigest()
+
+
+def snapshot_token(token: OAuth2Token) -> OAuth2Token:
+    """Copy the columns of a token into a transient `OAuth2Token` that is safe to share between requests."""
+    return OAuth2Token(
+        id=token.id,
+        user_id=token.user_id,
+        client_id=token.client_id,
+        token_type=token.token_type,
+        access_token=token.access_token,
+        refresh_token=token.refresh_token,
+        scope=token.scope,
+        revoked=token.revoked,
+        issued_at=token.issued_at,
+        expires_in=token.expires_in)
+
+
+class TokenCache(object):
+    """An LRU cache of bearer token lookups.
+
+    Args:
+        max_size (int): The maximum number of cached tokens.
+        negative_ttl (float): Seconds an unknown token is remembered as unknown.
+        max_ttl (float): If set, the most seconds a token is cached for, even if it expires later.
+
+    """
+
+    def __init__(self, max_size: int = 10000, negative_ttl: float = 5, max_ttl: float = None):
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl or None
+        self._cache = TTLCache(max_size=max_size, ttl=negative_ttl)
+        self.negative_hits = 0
+        self.invalidations = 0
+
+    def get(self, token_string: str, load) -> OAuth2Token:
+        """Look up a bearer token.
+
+        Args:
+            token_string (str): The bearer token.
+            load (func): Called with the token string on a miss; returns the `OAuth2Token` or None.
+
+        Returns:
+            obj: A transient copy of the token, or None if it does not exist.
+
+        """
+        key = token_digest(token_string)
+        token = self._cached(key)
+        if token is not _MISS:
+            return token
+        return self._store(key, load(token_string))
+
+    def get_many(self, token_strings: list, load_many) -> dict:
+        """Look up several bearer tokens, loading all of the uncached ones at once.
+
+        Args:
+            token_strings (list): The bearer tokens.
+            load_many (func): Called with the list of uncached token strings; returns a dict mapping
+                each token string that exists to its `OAuth2Token`.
+
+        Returns:
+            dict: Each token string mapped to a transient copy of its token, or None if it does not exist.
+
+        """
+        tokens, missing = {}, {}
+        for token_string in token_strings:
+            key = token_digest(token_string)
+            token = self._cached(key)
+            if token is _MISS:
+                missing[token_string] = key
+            else:
+                tokens[token_string] = token
+
+        if missing:
+            loaded = load_many(list(missing))
+            for token_string, key in missing.items():
+                tokens[token_string] = self._store(key, loaded.get(token_string))
+        return tokens
+
+    def invalidate(self, token_string: str) -> bool:
+        """Forget a token, e.g. after it was revoked."""
+        self.invalidations += 1
+        return self._cache.delete(token_digest(token_string))
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Forget every token issued to a user."""
+        self.invalidations += 1
+        return self._cache.delete_where(lambda _, token: token is not _NOT_FOUND and token.user_id == user_id)
+
+    def invalidate_users(self, user_ids: list) -> int:
+        """Forget every token issued to any of several users, in a single pass over the cache."""
+        self.invalidations += 1
+        user_ids = set(user_ids)
+        return self._cache.delete_where(lambda _, token: token is not _NOT_FOUND and token.user_id in user_ids)
+
+    def invalidate_client(self, client_id: str) -> int:
+        """Forget every token issued to a client."""
+        self.invalidations += 1
+        return self._cache.delete_where(lambda _, token: token is not _NOT_FOUND and token.client_id == client_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    def _cached(self, key: str):
+        entry = self._cache.get_entry(key)
+        if entry is None or not entry.is_fresh():
+            return _MISS
+        if entry.value is _NOT_FOUND:
+            self.negative_hits += 1
+            return None
+        return entry.value
+
+    def _store(self, key: str, token: OAuth2Token) -> OAuth2Token:
+        if token is None:
+            self._cache.set(key, _NOT_FOUND, ttl=self.negative_ttl)
+            return None
+
+        token = snapshot_token(token)
+        expires_at = token.get_expires_at()
+        if self.max_ttl:
+            expires_at = min(expires_at, time.time() + self.max_ttl)
+        self._cache.set(key, token, expires_at=expires_at)
+        return token
+
+    def stats(self) -> dict:
+        """Cache statistics for the metrics endpoint."""
+        stats = self._cache.stats()
+        stats['negative_hits'] = self.negative_hits
+        stats['invalidations'] = self.invalidations
+        return stats
+
+
+_token_cache = None
+_token_cache_lock = Lock()
+
+
+def get_token_cache() -> TokenCache:
+    """Retrieve the process-wide token cache, creating it on first use.
+
+    Returns:
+        obj: The shared `TokenCache`, or a `SharedTokenCache` if one is configured.
+
+    """
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                config = ConfigurationFactory.from_env()
+                if config.token_cache_shared_path:
+                    _token_cache = SharedTokenCache(
+                        config.token_cache_shared_path,
+                        slots=config.token_cache_shared_slots,
+                        negative_ttl=config.token_cache_negative_ttl,
+                        max_ttl=config.token_cache_max_ttl)
+                else:
+                    _token_cache = TokenCache(
+                        max_size=config.token_cache_max_size,
+                        negative_ttl=config.token_cache_negative_ttl,
+                        max_ttl=config.token_cache_max_ttl)
+                register_metrics('token_cache', _token_cache.stats)
+    return _token_cache
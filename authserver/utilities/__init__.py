@@ -1,3 +1,5 @@
 from authserver.utilities.postgres import PostgreSQLContainer
 from authserver.utilities.responses import ResponseBody
+from authserver.utilities.pagination import paginate
+from authserver.utilities.query_budgets import query_budget
 from authserver.utilities.oauth2 import config_oauth, require_oauth
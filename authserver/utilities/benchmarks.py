@@ -0,0 +1,156 @@
+"""Benchmarks.
+
+Micro-benchmarks for the hot steps of the token path, run with `python manager.py benchmark_jwt` and
+`python manager.py benchmark_token_cache`, and the bcrypt calibration behind
+`python manager.py calibrate_bcrypt`.
+
+"""
+
+import os
+import secrets
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from authserver.db import OAuth2Client, OAuth2Token, db
+from authserver.oauth2.rfc6749.shared_token_cache import SharedTokenCache
+from authserver.oauth2.rfc6749.signing_keys import SigningKey
+from authserver.oauth2.rfc6749.token_cache import TokenCache
+from authserver.utilities.passwords import hash_password
+
+
+def _generate_keys() -> list:
+    return [
+        rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend()),
+        ec.generate_private_key(ec.SECP256R1(), backend=default_backend()),
+        ed25519.Ed25519PrivateKey.generate()
+    ]
+
+
+def benchmark_jwt_signing(iterations: int = 500) -> OrderedDict:
+    """Measure the per-token cost of signing and verifying a Brighthive sized JWT with each algorithm.
+
+    Args:
+        iterations (int): Number of tokens signed and verified per algorithm.
+
+    Returns:
+        OrderedDict: Per algorithm, the mean sign and verify time in milliseconds and the encoded token size.
+
+    """
+    claims = {
+        'iss': 'brighthive-authserver',
+        'aud': ['brighthive-permissions-service', 'brighthive-authserver'],
+        'iat': int(time.time()),
+        'exp': int(time.time()) + 3600,
+        'brighthive-access-token': 'x' * 42,
+        'brighthive-super-admin': True
+    }
+    results = OrderedDict()
+    for private_key in _generate_keys():
+        key = SigningKey(private_key)
+        headers = {'kid': key.kid}
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            token = jwt.encode(claims, key.private_key, algorithm=key.algorithm, headers=headers)
+        sign_seconds = time.perf_counter() - started
+
+        public_key = key.private_key.public_key()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            jwt.decode(token, public_key, algorithms=[key.algorithm], options={'verify_aud': False})
+        verify_seconds = time.perf_counter() - started
+
+        results[key.algorithm] = {
+            'sign_ms': round(sign_seconds / iterations * 1000, 4),
+            'verify_ms': round(verify_seconds / iterations * 1000, 4),
+            'token_bytes': len(token)
+        }
+    return results
+
+
+def _mean_ms(lookup, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        lookup()
+    return round((time.perf_counter() - started) / iterations * 1000, 4)
+
+
+def benchmark_token_lookup(iterations: int = 2000) -> OrderedDict:
+    """Measure the per-request cost of looking up a bearer token in Postgres and in each token cache.
+
+    A temporary token is inserted for an existing client and removed again afterwards, so this must run
+    in an application context against a database with at least one client.
+
+    Args:
+        iterations (int): Number of lookups per strategy.
+
+    Returns:
+        OrderedDict: The mean lookup time in milliseconds of each strategy.
+
+    """
+    client = OAuth2Client.query.first()
+    if client is None:
+        raise RuntimeError('The token lookup benchmark needs at least one OAuth2 client in the database.')
+
+    access_token = secrets.token_urlsafe(32)
+    token = OAuth2Token(client_id=client.client_id, token_type='Bearer', access_token=access_token, scope='',
+                        revoked=False, issued_at=int(time.time()), expires_in=3600)
+    db.session.add(token)
+    db.session.commit()
+
+    def load(token_string):
+        return OAuth2Token.query.filter_by(access_token=token_string).first()
+
+    shared_dir = tempfile.mkdtemp()
+    try:
+        process_cache = TokenCache()
+        shared_cache = SharedTokenCache(os.path.join(shared_dir, 'token-cache'), slots=1024)
+        process_cache.get(access_token, load)
+        shared_cache.get(access_token, load)
+
+        results = OrderedDict()
+        results['postgres'] = _mean_ms(lambda: load(access_token), iterations)
+        results['shared cache'] = _mean_ms(lambda: shared_cache.get(access_token, load), iterations)
+        results['worker cache'] = _mean_ms(lambda: process_cache.get(access_token, load), iterations)
+        return results
+    finally:
+        shutil.rmtree(shared_dir)
+        db.session.delete(token)
+        db.session.commit()
+
+
+def calibrate_bcrypt_rounds(target_ms: float = 250, min_rounds: int = 8, max_rounds: int = 16,
+                            iterations: int = 3) -> tuple:
+    """Measure bcrypt on this machine and suggest the highest cost that hashes within a target time.
+
+    Each extra round doubles the work, so measuring stops at the first cost over the target.
+
+    Args:
+        target_ms (float): The longest a single hash should take, in milliseconds.
+        min_rounds (int): The lowest cost measured, and the suggestion if even it is over the target.
+        max_rounds (int): The highest cost measured.
+        iterations (int): Number of hashes per cost; the fastest one counts.
+
+    Returns:
+        tuple: An OrderedDict of the milliseconds per hash at each measured cost, and the suggested cost.
+
+    """
+    results = OrderedDict()
+    suggested = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            hash_password('calibration-password', rounds)
+            timings.append(time.perf_counter() - started)
+        results[rounds] = round(min(timings) * 1000, 1)
+        if results[rounds] > target_ms:
+            break
+        suggested = rounds
+    return results, suggested
@@ -0,0 +1,51 @@
+"""Bloom Filter.
+
+A compact, serialisable set membership filter. Clients can rebuild the lookup from the published
+parameters: for a member `value`, let `d = sha256(value.encode('utf-8'))`, `h1` and `h2` the first and
+second big-endian 64-bit words of `d`; the member sets bits `(h1 + i * h2) % size` for `i` in
+`range(hashes)`, bit `n` being `bits[n // 8] & (1 << (n % 8))`.
+
+"""
+
+import base64
+import hashlib
+import math
+
+
+class BloomFilter(object):
+    """A Bloom filter sized for an expected number of members and false positive rate.
+
+    Args:
+        capacity (int): The expected number of members.
+        false_positive_rate (float): The acceptable probability that a non-member is reported as a member.
+
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.sha256(value.encode('utf-8')).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:16], 'big')
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def to_dict(self) -> dict:
+        """The filter parameters and its bits, base64 encoded, as published to clients."""
+        return {
+            'size': self.size,
+            'hashes': self.hashes,
+            'count': self.count,
+            'bits': base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
@@ -0,0 +1,159 @@
+"""In-Process Caches.
+
+A bounded least-recently-used cache whose entries expire after a time-to-live. Entries
+that have expired are kept until they are evicted so that callers may still serve them
+while a fresh value is being fetched.
+
+"""
+
+import time
+from collections import OrderedDict
+from threading import RLock
+
+
+class CacheEntry(object):
+    """A cached value and the time it stops being fresh.
+
+    Attributes:
+        value (any): The cached value.
+        expires_at (float): The `time.time()` after which the value is stale.
+        stored_at (float): The `time.time()` the value was stored.
+
+    """
+
+    __slots__ = ('value', 'expires_at', 'stored_at')
+
+    def __init__(self, value, expires_at: float, stored_at: float):
+        self.value = value
+        self.expires_at = expires_at
+        self.stored_at = stored_at
+
+    def is_fresh(self, now: float = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+
+class TTLCache(object):
+    """A thread-safe LRU cache with per-entry expiry.
+
+    Args:
+        max_size (int): The maximum number of entries. The least recently used entry is evicted beyond this.
+        ttl (float): The default number of seconds an entry stays fresh.
+
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry.is_fresh()
+
+    def get(self, key, default=None):
+        """Retrieve a fresh value.
+
+        Args:
+            key (any): The cache key.
+            default (any): The value returned when there is no fresh entry.
+
+        Returns:
+            any: The cached value or `default`.
+
+        """
+        entry = self.get_entry(key)
+        if entry is None or not entry.is_fresh():
+            return default
+        return entry.value
+
+    def get_entry(self, key):
+        """Retrieve the entry for a key whether or not it is still fresh.
+
+        Args:
+            key (any): The cache key.
+
+        Returns:
+            obj: The `CacheEntry` or None if the key is not cached.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.is_fresh():
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry
+
+    def set(self, key, value, ttl: float = None, expires_at: float = None):
+        """Store a value.
+
+        Args:
+            key (any): The cache key.
+            value (any): The value to store.
+            ttl (float): Seconds the value stays fresh. Defaults to the cache TTL.
+            expires_at (float): An absolute `time.time()` expiry. Takes precedence over `ttl`.
+
+        """
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = CacheEntry(value, expires_at, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> bool:
+        """Remove a key.
+
+        Returns:
+            bool: True if the key was cached.
+
+        """
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def delete_where(self, predicate) -> int:
+        """Remove every entry whose key and value match a predicate.
+
+        Args:
+            predicate (func): Called with the key and the value of each entry.
+
+        Returns:
+            int: The number of entries removed.
+
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(key, entry.value)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Cache statistics for the metrics endpoint."""
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,112 @@
+"""Circuit Breaker.
+
+Tracks the outcome of recent calls to a remote service and stops calling it for a while
+once too many of them fail, so that callers fail fast instead of waiting on timeouts.
+
+"""
+
+import time
+from collections import deque
+from threading import Lock
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """A rolling-window circuit breaker.
+
+    The breaker is `closed` while calls succeed. Once at least `min_calls` of the last `window_size`
+    calls were recorded and the share of failures reaches `error_threshold`, it becomes `open` and
+    `allow()` returns False for `reset_timeout` seconds. It then becomes `half_open` and lets a single
+    trial call through: success closes it, failure opens it again.
+
+    Args:
+        error_threshold (float): Failure ratio (0 to 1) at which the breaker opens.
+        min_calls (int): Minimum number of recorded calls before the ratio is considered.
+        window_size (int): Number of most recent calls the ratio is computed over.
+        reset_timeout (float): Seconds the breaker stays open before allowing a trial call.
+
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_threshold: float = 0.5, min_calls: int = 10, window_size: int = 20, reset_timeout: float = 30):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._outcomes = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0
+        self._trial_in_progress = False
+        self._lock = Lock()
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Determine whether a call may be attempted.
+
+        Returns:
+            bool: False if the breaker is open, or half open with a trial call already in progress.
+
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._outcomes.append(True)
+            if self._state != self.CLOSED:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            self._trial_in_progress = False
+            if self._state != self.CLOSED:
+                self._open()
+                return
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_threshold:
+                self._open()
+
+    def stats(self) -> dict:
+        """Breaker statistics for the metrics endpoint."""
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            return {
+                'state': self._current_state(),
+                'window_calls': calls,
+                'window_failures': failures,
+                'error_rate': round(failures / calls, 3) if calls else 0,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
@@ -0,0 +1,269 @@
+"""Login Throttling.
+
+Every login attempt that reaches bcrypt costs a few hundred milliseconds of CPU, whatever username it
+names. `LoginThrottle` counts attempts per client IP and per username over a sliding window and turns
+an attempt away before any bcrypt work once either count reaches its limit. Below the limit, attempts
+for a username beyond the first few are delayed progressively, which costs a gevent worker nothing.
+A successful login clears the count of its username and is taken off the count of its IP, so only
+failures add up; many users logging in from one address, or through one proxy, are not slowed down.
+
+The sliding window is approximated from two fixed windows: the count of the current window plus the
+count of the previous one, weighted by how much of it still overlaps the sliding window.
+
+Counts live in a fixed-size table of slots. By default the table is private to the worker; with
+`LOGIN_THROTTLE_SHARED_PATH` set it is a memory-mapped file (e.g. under `/dev/shm`, see
+`shared_tables`) that every worker on the host shares, guarded by a thread lock and an `fcntl` lock
+on the file.
+
+"""
+
+import fcntl
+import hashlib
+import math
+import mmap
+import struct
+import time
+from threading import Lock
+
+from authserver.config import ConfigurationFactory
+from authserver.utilities.metrics import register_metrics
+from authserver.utilities.shared_tables import open_shared_table, table_path
+
+MAGIC = b'BHLT'
+VERSION = 1
+HEADER = struct.Struct('<4sIId')
+HEADER_SIZE = 64
+
+# digest, window, previous window count, current window count
+SLOT = struct.Struct('<16sqII')
+EMPTY = bytes(16)
+
+PROBES = 8
+
+
+class LoginThrottled(Exception):
+    """Too many recent login attempts from an IP or for a username.
+
+    Attributes:
+        retry_after (int): Seconds after which an attempt may succeed.
+
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LoginThrottle(object):
+    """Sliding-window counts of login attempts per IP and per username.
+
+    Args:
+        ip_limit (int): Attempts per window from one IP before further attempts are refused; 0 for no limit.
+        username_limit (int): Attempts per window for one username before further attempts are refused;
+            0 for no limit.
+        window (float): The length of the sliding window in seconds.
+        delay_after (int): Attempts per window for one username that are not delayed.
+        delay_max (float): The longest delay in seconds. Each attempt after `delay_after` doubles the delay,
+            starting from an eighth of this.
+        path (str): If set, the file backing a table shared between workers, suffixed with its layout.
+        slots (int): The number of slots in the table. Each slot takes 32 bytes.
+
+    """
+
+    def __init__(self, ip_limit: int = 100, username_limit: int = 10, window: float = 300, delay_after: int = 3,
+                 delay_max: float = 2, path: str = None, slots: int = 65536):
+        self.ip_limit = ip_limit
+        self.username_limit = username_limit
+        self.window = window
+        self.delay_after = delay_after
+        self.delay_max = delay_max
+        self.slots = slots
+        self.path = table_path(path, VERSION, slots) if path else None
+        self._size = HEADER_SIZE + slots * SLOT.size
+        self._lock = Lock()
+        self._fd, self._map = self._open()
+        self.attempts = 0
+        self.delayed = 0
+        self.throttled_ip = 0
+        self.throttled_username = 0
+
+    def attempt(self, ip: str, username: str) -> float:
+        """Record a login attempt, or refuse it.
+
+        Refused attempts are not counted, so the counts fall again while a client keeps being refused.
+        Only the count of the username decides the delay.
+
+        Args:
+            ip (str): The client IP.
+            username (str): The submitted username.
+
+        Returns:
+            float: Seconds to wait before checking the password.
+
+        Raises:
+            LoginThrottled: If the IP or the username is over its limit.
+
+        """
+        keys = [(self._digest('ip', ip), self.ip_limit), (self._digest('username', username), self.username_limit)]
+        now = time.time()
+        window = int(now // self.window)
+        overlap = 1 - (now % self.window) / self.window
+
+        with self._locked():
+            slots = [self._find(digest, window) for digest, _ in keys]
+            counts = [self._estimate(fields, window, overlap) for _, fields in slots]
+            for kind, ((_, limit), count) in zip(('ip', 'username'), zip(keys, counts)):
+                if limit and count >= limit:
+                    if kind == 'ip':
+                        self.throttled_ip += 1
+                    else:
+                        self.throttled_username += 1
+                    retry_after = max(1, math.ceil(self.window - now % self.window))
+                    raise LoginThrottled(f'Too many login attempts for this {kind}.', retry_after)
+
+            for digest, _ in keys:
+                # Found again, in case both keys were given the same free slot.
+                self._increment(*self._find(digest, window), digest, window)
+
+        self.attempts += 1
+        excess = int(counts[1]) + 1 - self.delay_after
+        if excess <= 0 or not self.delay_max:
+            return 0
+        self.delayed += 1
+        return min(self.delay_max, self.delay_max / 8 * 2 ** (excess - 1))
+
+    def succeeded(self, ip: str, username: str):
+        """Clear the count of a username and take the attempt off the count of its IP after a successful login."""
+        window = int(time.time() // self.window)
+        with self._locked():
+            index, fields = self._find(self._digest('username', username), window)
+            if fields is not None:
+                SLOT.pack_into(self._map, self._offset(index), EMPTY, 0, 0, 0)
+
+            index, fields = self._find(self._digest('ip', ip), window)
+            if fields is not None:
+                digest, slot_window, previous, current = fields
+                if current:
+                    current -= 1
+                elif slot_window == window and previous:
+                    # The window rolled over while the password was checked.
+                    previous -= 1
+                SLOT.pack_into(self._map, self._offset(index), digest, slot_window, previous, current)
+
+    def clear(self):
+        with self._locked():
+            self._map[HEADER_SIZE:self._size] = bytes(self._size - HEADER_SIZE)
+
+    def stats(self) -> dict:
+        """Throttling statistics of this worker for the metrics endpoint."""
+        return {
+            'shared_path': self.path,
+            'slots': self.slots,
+            'attempts': self.attempts,
+            'delayed': self.delayed,
+            'throttled_ip': self.throttled_ip,
+            'throttled_username': self.throttled_username
+        }
+
+    def _digest(self, kind: str, value: str) -> bytes:
+        return hashlib.sha256(f'{kind}:{(value or "").lower()}'.encode('utf-8')).digest()[:16]
+
+    def _open(self):
+        if self.path is None:
+            return None, mmap.mmap(-1, self._size)
+        return open_shared_table(self.path, HEADER.pack(MAGIC, VERSION, self.slots, self.window), self._size)
+
+    def _locked(self):
+        return _TableLock(self._lock, self._fd)
+
+    def _offset(self, index: int) -> int:
+        return HEADER_SIZE + index * SLOT.size
+
+    def _find(self, digest: bytes, window: int):
+        """The slot of a key and its fields, or a free slot to claim and None."""
+        home = int.from_bytes(digest[:8], 'little') % self.slots
+        free, victim, victim_window = None, home, None
+        for probe in range(PROBES):
+            index = (home + probe) % self.slots
+            fields = SLOT.unpack_from(self._map, self._offset(index))
+            if fields[0] == digest:
+                return index, fields
+            if fields[0] == EMPTY or fields[1] < window - 1:
+                # Empty, or holding a key with no attempts in the sliding window.
+                free = index if free is None else free
+            elif victim_window is None or fields[1] < victim_window:
+                victim, victim_window = index, fields[1]
+        return (victim if free is None else free), None
+
+    def _estimate(self, fields: tuple, window: int, overlap: float) -> float:
+        if fields is None:
+            return 0
+        _, slot_window, previous, current = fields
+        if slot_window == window:
+            return current + previous * overlap
+        if slot_window == window - 1:
+            return current * overlap
+        return 0
+
+    def _increment(self, index: int, fields: tuple, digest: bytes, window: int):
+        previous, current = 0, 0
+        if fields is not None:
+            _, slot_window, previous, current = fields
+            if slot_window == window - 1:
+                previous, current = current, 0
+            elif slot_window != window:
+                previous, current = 0, 0
+        SLOT.pack_into(self._map, self._offset(index), digest, window, previous, current + 1)
+
+
+class _TableLock(object):
+    """Serialises access to the table within this process and, if it is shared, across processes."""
+
+    def __init__(self, lock: Lock, fd: int):
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.fd is not None:
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, HEADER_SIZE - 1)
+            except Exception:
+                self.lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self.fd is not None:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, HEADER_SIZE - 1)
+        finally:
+            self.lock.release()
+
+
+_login_throttle = None
+_login_throttle_lock = Lock()
+
+
+def get_login_throttle() -> LoginThrottle:
+    """Retrieve the process-wide login throttle, creating it on first use.
+
+    Returns:
+        obj: The shared `LoginThrottle`.
+
+    """
+    global _login_throttle
+    if _login_throttle is None:
+        with _login_throttle_lock:
+            if _login_throttle is None:
+                config = ConfigurationFactory.from_env()
+                _login_throttle = LoginThrottle(
+                    ip_limit=config.login_throttle_ip_limit,
+                    username_limit=config.login_throttle_username_limit,
+                    window=config.login_throttle_window,
+                    delay_after=config.login_throttle_delay_after,
+                    delay_max=config.login_throttle_delay_max,
+                    path=config.login_throttle_shared_path,
+                    slots=config.login_throttle_slots)
+                register_metrics('login_throttle', _login_throttle.stats)
+    return _login_throttle
@@ -0,0 +1,57 @@
+"""Runtime Metrics.
+
+A small registry of in-process statistics. Components that keep counters or
+timings (signing keys, caches, HTTP clients) register a provider function here
+and the health API reports them all in one document.
+
+"""
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+_providers = OrderedDict()
+_providers_lock = Lock()
+
+
+def register_metrics(name: str, provider):
+    """Register a statistics provider.
+
+    Args:
+        name (str): The name the statistics are reported under.
+        provider (func): A callable that takes no arguments and returns a JSON serializable dict.
+
+    """
+    with _providers_lock:
+        _providers[name] = provider
+
+
+def unregister_metrics(name: str):
+    """Remove a statistics provider if it is registered.
+
+    Args:
+        name (str): The name the statistics are reported under.
+
+    """
+    with _providers_lock:
+        _providers.pop(name, None)
+
+
+def collect_metrics():
+    """Collect the statistics of every registered provider.
+
+    Returns:
+        dict: The statistics keyed by provider name.
+
+    """
+    with _providers_lock:
+        providers = list(_providers.items())
+
+    metrics = OrderedDict()
+    for name, provider in providers:
+        try:
+            metrics[name] = provider()
+        except Exception:
+            logging.exception(f'Failed to collect metrics for {name}.')
+            metrics[name] = {}
+    return metrics
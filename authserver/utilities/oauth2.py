@@ -4,10 +4,11 @@ This module makes use of Authlib to implement core services of AuthServer.
 
 """
 
+import time
+
 from authlib.integrations.flask_oauth2 import ResourceProtector
 from authlib.integrations.sqla_oauth2 import (
     create_query_client_func,
-    create_save_token_func,
     create_revocation_endpoint,
     create_bearer_token_validator
 )
@@ -19,11 +20,20 @@ from authlib.oauth2.rfc6749.errors import (
     AccessDeniedError,
 )
 
+from authlib.consts import default_json_headers
 from authlib.oauth2.rfc6749 import grants
 from authlib.oauth2.rfc7636 import CodeChallenge
+from authlib.oauth2.rfc7662 import IntrospectionEndpoint as _IntrospectionEndpoint
 from authlib.integrations.flask_oauth2 import AuthorizationServer
+from flask import request as flask_request
+from sqlalchemy.orm.attributes import set_committed_value
+from authserver.config import ConfigurationFactory
+from authserver.utilities.login_throttle import get_login_throttle
+from authserver.utilities.metrics import register_metrics
 from werkzeug.security import gen_salt
-from authserver.oauth2 import BrighthiveAuthorizationServer, authenticate_client_secret_json
+from authserver.oauth2 import (BrighthiveAuthorizationServer, authenticate_client_secret_json,
+                               get_revocation_log, get_stateless_tokens, get_token_cache, is_stateless_token)
+from authserver.oauth2.rfc6749.stateless_tokens import ISSUER
 from authserver.db import db, User, OAuth2Client, OAuth2AuthorizationCode, OAuth2Token
 
 
@@ -64,8 +74,16 @@ class AuthorizationCodeGrant(grants.AuthorizationCodeGrant):
 
 class PasswordGrant(grants.ResourceOwnerPasswordCredentialsGrant):
     def authenticate_user(self, username, password):
+        # Raises LoginThrottled, answered with a 429, before any bcrypt work.
+        throttle = get_login_throttle()
+        delay = throttle.attempt(flask_request.remote_addr, username)
+        if delay:
+            time.sleep(delay)
+
         user = User.query.filter_by(username=username).first()
-        if user.check_password(password):
+        if user is not None and user.verify_password(password):
+            throttle.succeeded(flask_request.remote_addr, username)
+            user.rehash_password_later(password)
             return user
 
 
@@ -85,9 +103,187 @@ class ClientCredentialsGrant(grants.ClientCredentialsGrant):
         'client_secret_json'
     ]
 
+    def create_token_response(self):
+        client = self.request.client
+        if client.token_reuse_min_remaining and not client.stateless_tokens:
+            item = find_reusable_token(client, self.request.scope, client.token_reuse_min_remaining)
+            if item is not None:
+                token = {
+                    'token_type': item.token_type,
+                    'access_token': item.access_token,
+                    'expires_in': int(item.get_expires_at() - time.time())
+                }
+                if item.scope:
+                    token['scope'] = item.scope
+                token_reuse_stats['reused'] += 1
+                self.request.saved_token = item
+                self.request.reused_token = True
+                return 200, token, self.TOKEN_RESPONSE_HEADER
+            token_reuse_stats['issued'] += 1
+        return super().create_token_response()
+
+    def generate_token(self, *args, **kwargs):
+        token = super().generate_token(*args, **kwargs)
+        client = self.request.client
+        if client.stateless_tokens:
+            token['access_token'] = get_stateless_tokens().issue(client, token.get('scope'), token['expires_in'])
+        return token
+
+    def save_token(self, token):
+        if not self.request.client.stateless_tokens:
+            return super().save_token(token)
+        # Stateless tokens validate themselves; keep a transient row for the token endpoint only.
+        self.request.saved_token = OAuth2Token(
+            client=self.request.client, issued_at=int(time.time()), revoked=False, **token)
+
+
+token_reuse_stats = {'reused': 0, 'issued': 0}
+
+
+def find_reusable_token(client, scope, min_remaining: int):
+    """Find a client_credentials token of a client that can be handed out again.
+
+    Args:
+        client (obj): The authenticated `OAuth2Client`.
+        scope (str): The requested scope.
+        min_remaining (int): The number of seconds the token must still be valid for.
+
+    Returns:
+        obj: The newest non-revoked `OAuth2Token` for the client and the scope it would be granted, or None.
+
+    """
+    if scope is not None:
+        scope = client.get_allowed_scope(scope)
+    # Served by the partial index ix_oauth2_tokens_client_reuse.
+    item = OAuth2Token.query.filter(
+        OAuth2Token.client_id == client.client_id,
+        OAuth2Token.scope == (scope or ''),
+        OAuth2Token.revoked == False,  # noqa: E712
+        OAuth2Token.user_id == None  # noqa: E711
+    ).order_by(OAuth2Token.issued_at.desc()).first()
+    if item is None or item.get_expires_at() - time.time() < min_remaining:
+        return None
+    set_committed_value(item, 'client', client)
+    return item
+
+
+def save_token(token, request):
+    """Persist an issued token and keep it on the request.
+
+    The saved `OAuth2Token` is stored as `request.saved_token` so that the token endpoint can build the
+    Brighthive JWT from it without reading the row back. Its client and user relationships are set from
+    the already authenticated request, and the commit does not expire them, so no further queries are
+    needed to use the token afterwards.
+
+    """
+    item = OAuth2Token(client=request.client, user=request.user, **token)
+    db.session.add(item)
+    session = db.session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = expire_on_commit
+    request.saved_token = item
+
+
+class RevocationEndpoint(create_revocation_endpoint(db.session, OAuth2Token)):
+    CLIENT_AUTH_METHODS = ['client_secret_basic', 'client_secret_json']
+
+    def authenticate_endpoint_credential(self, request, client):
+        _read_json_form(request)
+        return super().authenticate_endpoint_credential(request, client)
+
+    def query_token(self, token, token_type_hint, client):
+        if is_stateless_token(token):
+            item = get_stateless_tokens().verify(token)
+            if item and item.client_id == client.client_id:
+                return item
+            return None
+        return super().query_token(token, token_type_hint, client)
+
+    def revoke_token(self, token):
+        if is_stateless_token(token.access_token):
+            claims = get_stateless_tokens().claims(token.access_token)
+            if get_stateless_tokens().revoke(token):
+                get_revocation_log().jti_revoked(claims['jti'], claims['exp'])
+                db.session.commit()
+        else:
+            token.revoked = True
+            db.session.add(token)
+            get_revocation_log().token_revoked(token)
+            db.session.commit()
+            get_token_cache().invalidate(token.access_token)
+
+
+class IntrospectionEndpoint(_IntrospectionEndpoint):
+    """RFC 7662 token introspection for resource servers.
+
+    Any authenticated client may introspect access and refresh tokens. Responses for active tokens may
+    be cached for `INTROSPECTION_MAX_AGE` seconds, but never beyond the expiry of the token.
+
+    """
+
+    CLIENT_AUTH_METHODS = ['client_secret_basic', 'client_secret_json']
+
+    def __init__(self, server):
+        super().__init__(server)
+        self.max_age = ConfigurationFactory.from_env().introspection_max_age
+
+    def authenticate_endpoint_credential(self, request, client):
+        _read_json_form(request)
+        return super().authenticate_endpoint_credential(request, client)
+
+    def create_endpoint_response(self, request):
+        client = self.authenticate_endpoint_client(request)
+        token = self.authenticate_endpoint_credential(request, client)
+        body = self.create_introspection_payload(token)
+
+        if not body['active']:
+            return 200, body, default_json_headers
+        # Replace the no-store headers Authlib sends by default.
+        max_age = max(0, min(self.max_age, int(token.get_expires_at() - time.time())))
+        headers = [(name, value) for name, value in default_json_headers if name not in ('Cache-Control', 'Pragma')]
+        headers.append(('Cache-Control', f'max-age={max_age}'))
+        return 200, body, headers
+
+    def query_token(self, token, token_type_hint, client):
+        if is_stateless_token(token):
+            return get_stateless_tokens().verify(token)
+        if token_type_hint != 'refresh_token':
+            item = get_token_cache().get(token, lambda t: OAuth2Token.query.filter_by(access_token=t).first())
+            if item is not None or token_type_hint == 'access_token':
+                return item
+        return OAuth2Token.query.filter_by(refresh_token=token).first()
+
+    def introspect_token(self, token):
+        return {
+            'active': True,
+            'client_id': token.client_id,
+            'token_type': token.token_type,
+            'scope': token.get_scope(),
+            'sub': token.user_id or token.client_id,
+            'iss': ISSUER,
+            'exp': token.get_expires_at(),
+            'iat': token.issued_at
+        }
+
+
+def _read_json_form(request):
+    # Clients authenticating with client_secret_json send the token in the JSON body as well.
+    if 'token' not in request.form and flask_request.is_json:
+        request.form = flask_request.get_json()
+
+
+class BearerTokenValidator(create_bearer_token_validator(db.session, OAuth2Token)):
+    def authenticate_token(self, token_string):
+        if is_stateless_token(token_string):
+            return get_stateless_tokens().verify(token_string)
+        return get_token_cache().get(token_string, super().authenticate_token)
+
 
 query_client = create_query_client_func(db.session, OAuth2Client)
-save_token = create_save_token_func(db.session, OAuth2Token)
 authorization = BrighthiveAuthorizationServer(
     query_client=query_client,
     save_token=save_token,
@@ -104,10 +300,11 @@ def config_oauth(app):
     authorization.register_grant(AuthorizationCodeGrant, [
                                  CodeChallenge(required=False)])
 
-    # support revocation
-    revocation_cls = create_revocation_endpoint(db.session, OAuth2Token)
-    authorization.register_endpoint(revocation_cls)
+    # support revocation and introspection
+    authorization.register_endpoint(RevocationEndpoint)
+    authorization.register_endpoint(IntrospectionEndpoint)
 
     # protect resource
-    bearer_cls = create_bearer_token_validator(db.session, OAuth2Token)
-    require_oauth.register_token_validator(bearer_cls())
+    require_oauth.register_token_validator(BearerTokenValidator())
+
+    register_metrics('token_reuse', lambda: dict(token_reuse_stats))
@@ -0,0 +1,47 @@
+"""Keyset Pagination.
+
+Collection endpoints return one page at a time, ordered by the primary key. The page after a cursor
+is found with `WHERE id > :after ORDER BY id LIMIT :limit`, which the primary key index serves
+directly, so every page costs the same however far into the collection it is. The cursor is the
+key of the last row of the previous page.
+
+Query arguments:
+    limit: The page size, capped at `PAGE_SIZE_MAX`. Defaults to `PAGE_SIZE_DEFAULT`.
+    after: The `next` cursor of the previous page.
+    all: `true` returns the whole collection in one response, as before pagination was added.
+
+"""
+
+from collections import namedtuple
+
+from flask import request
+
+Page = namedtuple('Page', ['items', 'next'])
+
+
+def paginate(query, key, default_size: int, max_size: int) -> Page:
+    """Fetch the page of a query that the current request asks for.
+
+    Args:
+        query (obj): The query to page through.
+        key (obj): A unique, indexed column to order and page by.
+        default_size (int): The page size when the request does not give one.
+        max_size (int): The largest page size a request may ask for.
+
+    Returns:
+        obj: A `Page` with the rows and the cursor of the next page, which is None on the last page.
+
+    """
+    if request.args.get('all', '').lower() == 'true':
+        return Page(query.order_by(key).all(), None)
+
+    limit = min(max(request.args.get('limit', default_size, type=int), 1), max_size)
+    after = request.args.get('after')
+    if after:
+        query = query.filter(key > after)
+
+    # One extra row tells whether there is a next page without a count query.
+    rows = query.order_by(key).limit(limit + 1).all()
+    if len(rows) > limit:
+        return Page(rows[:limit], getattr(rows[limit - 1], key.key))
+    return Page(rows, None)
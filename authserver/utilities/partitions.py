@@ -0,0 +1,184 @@
+"""Time-Partitioned Tokens.
+
+`oauth2_tokens` can optionally be converted into a table range-partitioned on `issued_at`, with one
+partition per day or week. Retention then becomes a matter of detaching and dropping partitions whose
+tokens have all expired, instead of deleting their rows one by one.
+
+The conversion (`python manager.py partition_tokens`) renames the existing table to
+`oauth2_tokens_legacy` and attaches it as the partition of everything issued up to the end of the
+current period, so no rows are copied. A `DEFAULT` partition catches tokens issued beyond the
+partitions created so far. Postgres requires unique constraints of a partitioned table to include the
+partition key, so the primary key and the `access_token` constraint gain `issued_at`; lookups by
+`access_token` or `id` probe the index of each partition and keep working unchanged, as do the model,
+Authlib's revocation endpoint and bearer token validator.
+
+Once converted, every purge run (see `purge`) also creates the partitions for the next
+`TOKEN_PARTITION_PREMAKE` periods and drops the partitions whose tokens are past their refresh expiry.
+
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+TABLE = 'oauth2_tokens'
+LEGACY = 'oauth2_tokens_legacy'
+DEFAULT = 'oauth2_tokens_default'
+INTERVALS = {'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+BOUND = re.compile(r"FOR VALUES FROM \((MINVALUE|-?\d+)\) TO \((MAXVALUE|-?\d+)\)")
+
+
+class TokenPartitions(object):
+    """Creates and drops the partitions of `oauth2_tokens`.
+
+    Args:
+        interval (str): The span of one partition, `day` or `week`.
+        premake (int): The number of partitions kept ready beyond the current one.
+        grace_period (float): Seconds a token is kept after its refresh expiry.
+
+    """
+
+    def __init__(self, interval: str = 'week', premake: int = 4, grace_period: float = 3600):
+        if interval not in INTERVALS:
+            raise ValueError(f'The token partition interval must be one of {", ".join(INTERVALS)}.')
+        self.interval = interval
+        self.premake = premake
+        self.grace_period = grace_period
+
+    def is_partitioned(self, connection) -> bool:
+        return connection.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"), {'table': TABLE}).scalar() or False
+
+    def period_start(self, timestamp: float) -> int:
+        """The `issued_at` at which the partition containing a timestamp starts."""
+        day = datetime.fromtimestamp(timestamp, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.interval == 'week':
+            day -= timedelta(days=day.weekday())
+        return int(day.timestamp())
+
+    def partitions(self, connection) -> list:
+        """Every partition as `(name, lower, upper)`; bounds are None for MINVALUE and for the default partition."""
+        rows = connection.execute(text(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname'),
+            {'table': TABLE})
+        partitions = []
+        for name, bound in rows:
+            match = BOUND.match(bound)
+            if match is None:
+                partitions.append((name, None, None))
+                continue
+            lower, upper = match.groups()
+            partitions.append((name, None if lower == 'MINVALUE' else int(lower), None if upper == 'MAXVALUE' else int(upper)))
+        return partitions
+
+    def convert(self, connection, now: float) -> dict:
+        """Convert `oauth2_tokens` into a partitioned table in one transaction.
+
+        The table is locked for the duration, which is dominated by building the (id, issued_at) and
+        (access_token, issued_at) indexes of the existing rows. Purge expired rows first to keep it short.
+
+        """
+        boundary = self.period_start(now) + int(INTERVALS[self.interval].total_seconds())
+        with connection.begin():
+            connection.execute(text(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE'))
+            indexes = connection.execute(text(
+                'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid '
+                'WHERE x.indrelid = to_regclass(:table) AND NOT EXISTS '
+                '(SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)'), {'table': TABLE}).fetchall()
+            constraints = connection.execute(text(
+                "SELECT conname, contype, pg_get_constraintdef(oid), conindid::regclass::text FROM pg_constraint "
+                "WHERE conrelid = to_regclass(:table) AND contype IN ('p', 'u', 'f')"), {'table': TABLE}).fetchall()
+            sequence = connection.execute(
+                text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': TABLE}).scalar()
+
+            # Keep the index names free for the partitioned table.
+            connection.execute(text(f'ALTER TABLE {TABLE} RENAME TO {LEGACY}'))
+            for name, _ in indexes:
+                connection.execute(text(f'ALTER INDEX {name} RENAME TO {_legacy_name(name)}'))
+            for name, contype, definition, index in constraints:
+                if contype == 'p':
+                    # A partition cannot keep a primary key other than the one of the partitioned table.
+                    connection.execute(text(
+                        f'ALTER TABLE {LEGACY} DROP CONSTRAINT {name}, ADD {_with_partition_key(definition)}'))
+                elif contype == 'u':
+                    connection.execute(text(f'ALTER INDEX {index} RENAME TO {_legacy_name(index)}'))
+
+            connection.execute(text(
+                f'CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE (issued_at)'))
+            if sequence:
+                connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id'))
+            for name, contype, definition, _ in constraints:
+                if contype in ('p', 'u'):
+                    definition = _with_partition_key(definition)
+                connection.execute(text(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}'))
+            for _, definition in indexes:
+                connection.execute(text(definition))
+
+            # Let the attach skip its validation scan.
+            connection.execute(text(
+                f'ALTER TABLE {LEGACY} ADD CONSTRAINT {LEGACY}_range CHECK (issued_at < {boundary})'))
+            connection.execute(text(
+                f'ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO ({boundary})'))
+            connection.execute(text(f'ALTER TABLE {LEGACY} DROP CONSTRAINT {LEGACY}_range'))
+            connection.execute(text(f'CREATE TABLE {DEFAULT} PARTITION OF {TABLE} DEFAULT'))
+        return self.maintain(connection, now)
+
+    def maintain(self, connection, now: float) -> dict:
+        """Create the upcoming partitions and drop the expired ones."""
+        return {'created': self.create_partitions(connection, now), 'dropped': self.drop_expired(connection, now)}
+
+    def create_partitions(self, connection, now: float) -> list:
+        step = int(INTERVALS[self.interval].total_seconds())
+        covered = max([upper for _, _, upper in self.partitions(connection) if upper is not None], default=None)
+        created = []
+        for period in range(self.premake + 1):
+            lower = self.period_start(now) + period * step
+            if covered is not None and lower < covered:
+                continue
+            name = f'{TABLE}_p{datetime.fromtimestamp(lower, timezone.utc):%Y%m%d}'
+            bounds = {'lower': lower, 'upper': lower + step}
+            with connection.begin():
+                # Tokens issued while no partition covered them sit in the default partition; move them along.
+                stranded = connection.execute(text(
+                    f'SELECT 1 FROM {DEFAULT} WHERE issued_at >= :lower AND issued_at < :upper LIMIT 1'), bounds).scalar()
+                if stranded:
+                    connection.execute(text(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)'))
+                    connection.execute(text(
+                        f'WITH moved AS (DELETE FROM {DEFAULT} WHERE issued_at >= :lower AND issued_at < :upper '
+                        f'RETURNING *) INSERT INTO {name} SELECT * FROM moved'), bounds)
+                    connection.execute(text(
+                        f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({lower + step})'))
+                else:
+                    connection.execute(text(
+                        f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ({lower}) TO ({lower + step})'))
+            created.append(name)
+        return created
+
+    def drop_expired(self, connection, now: float) -> list:
+        cutoff = int(now - self.grace_period)
+        dropped = []
+        for name, _, upper in self.partitions(connection):
+            if upper is None or upper > cutoff:
+                continue
+            with connection.begin():
+                live = connection.execute(text(
+                    f'SELECT 1 FROM {name} WHERE issued_at + expires_in * 2 >= :cutoff LIMIT 1'), {'cutoff': cutoff}).scalar()
+                if live:
+                    continue
+                connection.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION {name}'))
+                connection.execute(text(f'DROP TABLE {name}'))
+            dropped.append(name)
+        return dropped
+
+
+def _with_partition_key(definition: str) -> str:
+    # PRIMARY KEY (id) -> PRIMARY KEY (id, issued_at)
+    return re.sub(r'\)$', ', issued_at)', definition)
+
+
+def _legacy_name(name: str) -> str:
+    return f'{name[:56]}_legacy'
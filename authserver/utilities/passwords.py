@@ -0,0 +1,231 @@
+"""Password Hashing.
+
+bcrypt is deliberately slow: a single hash or check takes 100 ms or more. Run on a gevent worker's
+hub, it would stall every other request on that worker for as long.
+
+`PasswordHasher` runs each hash and check on a bounded pool of native threads instead. bcrypt
+releases the GIL while it works, so the hub keeps serving other requests, and a request waiting for
+its result yields cooperatively. At most `PASSWORD_HASH_WORKERS` operations run at once and at most
+`PASSWORD_HASH_MAX_QUEUE` more wait for a thread. Beyond that, `PasswordHasherBusy` is raised straight
+away, so a burst of logins is turned away rather than queueing up behind itself.
+
+New hashes use `BCRYPT_ROUNDS` as their cost. A hash made at another cost still verifies; after a
+successful login it is replaced in the background (`needs_rehash` and `rehash_later`), so raising or
+lowering the cost takes effect as users log in.
+
+`hash_passwords` hashes a whole batch, e.g. for a bulk import, across a pool of processes. The pool
+uses the `spawn` start method, so the children do not inherit the gevent hub of a web worker.
+
+"""
+
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from threading import Lock, Thread
+
+import bcrypt
+
+from authserver.config import ConfigurationFactory
+from authserver.utilities.metrics import register_metrics
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+DEFAULT_ROUNDS = 12
+
+
+def hash_password(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    """Hash a password with a new bcrypt salt of the given cost."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def hash_rounds(password_hash: str) -> int:
+    """The cost a bcrypt hash was made with, e.g. 12 for `$2b$12$...`, or None if it is not a bcrypt hash."""
+    parts = (password_hash or '').split('$')
+    if len(parts) != 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a bcrypt hash."""
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except Exception:
+        return False
+
+
+def hash_passwords(passwords: list, workers: int = None, rounds: int = DEFAULT_ROUNDS) -> list:
+    """Hash several passwords in parallel.
+
+    Args:
+        passwords (list): The plain text passwords.
+        workers (int): The number of processes. Defaults to the number of CPUs; 1 hashes in this process.
+        rounds (int): The bcrypt cost.
+
+    Returns:
+        list: The bcrypt hashes, in the order of `passwords`.
+
+    """
+    workers = min(workers or multiprocessing.cpu_count(), len(passwords))
+    if workers <= 1:
+        return [hash_password(password, rounds) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(partial(hash_password, rounds=rounds), passwords,
+                             chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _thread_pool(workers: int):
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            # Native threads whose results are waited for without blocking the hub.
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor(max_workers=workers)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+
+def _timed(func, *args):
+    # Runs on a pool thread, so it touches no shared state.
+    started = time.perf_counter()
+    result = func(*args)
+    return result, started, time.perf_counter()
+
+
+class PasswordHasher(object):
+    """Hashes and checks passwords on a bounded thread pool.
+
+    Args:
+        workers (int): The number of threads running bcrypt.
+        max_queue (int): The number of operations that may wait for a thread before new ones are refused.
+        rounds (int): The bcrypt cost of new hashes.
+
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 32, rounds: int = DEFAULT_ROUNDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._pool = _thread_pool(workers)
+        self._lock = Lock()
+        self._pending = 0
+        self._max_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._rehashed = 0
+
+    def hash(self, password: str) -> str:
+        """Hash a password.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full.
+
+        """
+        return self._run(hash_password, password, self.rounds)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """Check a password against a bcrypt hash.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full.
+
+        """
+        return self._run(check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a bcrypt hash was made at a cost other than the configured one."""
+        rounds = hash_rounds(password_hash)
+        return rounds is not None and rounds != self.rounds
+
+    def rehash_later(self, password: str, store):
+        """Hash a password again at the configured cost without waiting for it.
+
+        Args:
+            password (str): The password, just verified against its old hash.
+            store (func): Called on a background thread with the new hash.
+
+        """
+        def rehash():
+            try:
+                store(self.hash(password))
+                with self._lock:
+                    self._rehashed += 1
+            except PasswordHasherBusy:
+                # The next login tries again.
+                pass
+            except Exception:
+                logging.exception('Failed to rehash a password.')
+
+        Thread(target=rehash, daemon=True).start()
+
+    def stats(self) -> dict:
+        """Pool statistics for the metrics endpoint."""
+        completed = self._completed
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'rounds': self.rounds,
+            'rehashed': self._rehashed,
+            'pending': self._pending,
+            'max_pending': self._max_pending,
+            'completed': completed,
+            'rejected': self._rejected,
+            'wait_avg_ms': round(self._wait_total / completed * 1000, 3) if completed else 0,
+            'wait_max_ms': round(self._wait_max * 1000, 3),
+            'run_avg_ms': round(self._run_total / completed * 1000, 3) if completed else 0
+        }
+
+    def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise PasswordHasherBusy(f'{self._pending} password operations are already pending.')
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+
+        submitted = time.perf_counter()
+        try:
+            result, started, finished = self._pool.submit(_timed, func, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        with self._lock:
+            self._completed += 1
+            self._wait_total += started - submitted
+            self._wait_max = max(self._wait_max, started - submitted)
+            self._run_total += finished - started
+        return result
+
+
+_password_hasher = None
+_password_hasher_lock = Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Retrieve the process-wide password hasher, creating it on first use.
+
+    Returns:
+        obj: The shared `PasswordHasher`.
+
+    """
+    global _password_hasher
+    if _password_hasher is None:
+        with _password_hasher_lock:
+            if _password_hasher is None:
+                config = ConfigurationFactory.from_env()
+                _password_hasher = PasswordHasher(
+                    workers=config.password_hash_workers, max_queue=config.password_hash_max_queue,
+                    rounds=config.bcrypt_rounds)
+                register_metrics('password_hasher', _password_hasher.stats)
+    return _password_hasher
@@ -0,0 +1,173 @@
+"""Permissions Service Client.
+
+Retrieves the permission claims of a person from the permissions service when a token is issued.
+Only failures of the service itself, i.e. connection errors, timeouts and 5xx/429 responses, count
+towards its circuit breaker; a 4xx answer to one request says nothing about the health of the service.
+
+"""
+
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from threading import Lock
+
+import requests
+from injector import inject
+from requests.adapters import HTTPAdapter
+
+from authserver.config import AbstractConfiguration
+from authserver.utilities.circuit_breaker import CircuitBreaker, CircuitOpenError
+from authserver.utilities.metrics import register_metrics
+
+
+class PermissionsServiceError(Exception):
+    pass
+
+
+class AbstractPermissionsService(ABC):
+    def __init__(self):
+        pass
+
+    @abstractmethod
+    def get_permissions(self, person_id: str, access_token: str) -> dict:
+        """Retrieve the permissions of a person.
+
+        Args:
+            person_id (str): The person to look up.
+            access_token (str): The bearer token used to authenticate with the permissions service.
+
+        Returns:
+            dict: The permission claims.
+
+        Raises:
+            PermissionsServiceError: If the permissions cannot be retrieved.
+
+        """
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Client statistics for the metrics endpoint."""
+        pass
+
+
+class RequestsPermissionsService(AbstractPermissionsService):
+    """Permissions service client backed by a pooled `requests.Session`.
+
+    Connections are kept alive and reused across token requests. Every call is bounded by a connect
+    and a read timeout, retried with jittered exponential backoff on connection errors, timeouts and
+    5xx/429 responses, and guarded by a circuit breaker that fails fast once the error rate of recent
+    calls crosses a threshold.
+
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    @inject
+    def __init__(self, config: AbstractConfiguration):
+        super().__init__()
+        self.config = config
+        self.base_url = config.permission_service_url
+        self.timeout = (config.permissions_service_connect_timeout, config.permissions_service_read_timeout)
+        self.retries = config.permissions_service_retries
+        self.backoff = config.permissions_service_backoff
+        self.breaker = CircuitBreaker(
+            error_threshold=config.permissions_service_breaker_threshold,
+            min_calls=config.permissions_service_breaker_min_calls,
+            window_size=config.permissions_service_breaker_window,
+            reset_timeout=config.permissions_service_breaker_reset_timeout)
+
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.permissions_service_pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+
+        self._lock = Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        register_metrics('permissions_service', self.stats)
+
+    def get_permissions(self, person_id: str, access_token: str) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpenError('Permissions service circuit breaker is open.')
+
+        url = f'{self.base_url}/people/{person_id}/permissions'
+        try:
+            response = self._get_with_retries(url, {'Authorization': f'Bearer {access_token}'})
+            permissions = response.json()['response']
+        except Exception as e:
+            if self._is_service_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            with self._lock:
+                self.failures += 1
+            raise PermissionsServiceError(f'Failed to retrieve permissions for person {person_id}.') from e
+
+        self.breaker.record_success()
+        return permissions
+
+    def stats(self) -> dict:
+        pools = self._connection_pools()
+        return {
+            'breaker': self.breaker.stats(),
+            'pool': {
+                'max_size': self.adapter._pool_maxsize,
+                'hosts': len(pools),
+                'connections_opened': sum(p.num_connections for p in pools),
+                'idle_connections': sum(p.pool.qsize() for p in pools if p.pool is not None),
+                'in_flight': self.in_flight
+            },
+            'requests': self.requests,
+            'retried': self.retried,
+            'failures': self.failures
+        }
+
+    def _is_service_failure(self, error: Exception) -> bool:
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        response = getattr(error, 'response', None)
+        return isinstance(error, requests.exceptions.HTTPError) and response is not None and \
+            (response.status_code >= 500 or response.status_code in self.RETRY_STATUSES)
+
+    def _connection_pools(self) -> list:
+        container = self.adapter.poolmanager.pools
+        pools = []
+        for key in container.keys():
+            try:
+                pools.append(container[key])
+            except KeyError:
+                # Evicted since the keys were listed.
+                pass
+        return pools
+
+    def _get_with_retries(self, url: str, headers: dict):
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+                self.in_flight += 1
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in self.RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = requests.exceptions.HTTPError(f'{response.status_code} from permissions service', response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+            if attempt >= self.retries:
+                raise error
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            logging.warning(f'Authserver -> PermsAPI: {error}; retrying in {delay:.2f}s.')
+            time.sleep(delay)
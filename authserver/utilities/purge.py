@@ -0,0 +1,178 @@
+"""Expired Row Purge.
+
+Deletes access tokens, authorization codes, password recovery nonces and revocation log entries that
+expired more than a grace period ago. Rows are deleted in bounded batches, each in its own transaction
+(`DELETE ... WHERE (tableoid, ctid) IN (SELECT tableoid, ctid ... LIMIT n)`), so that a large backlog never holds locks or
+bloats a single transaction. A Postgres advisory lock makes sure that only one process purges at a time;
+the others skip their run.
+
+If `oauth2_tokens` is partitioned (see `partitions`), its expired tokens are dropped with their
+partitions instead, and each run creates the upcoming partitions.
+
+Run it with `python manager.py purge_expired`, or set `PURGE_INTERVAL` to run it from every worker in
+the background.
+
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from authserver.utilities.metrics import register_metrics
+from authserver.utilities.partitions import TokenPartitions
+
+# An arbitrary constant identifying the purge among the advisory locks of the database.
+ADVISORY_LOCK_KEY = 0x62685075726765
+
+# Table, expiry predicate. `:cutoff` is the latest expiry, as stored in the table, that is purged.
+TARGETS = OrderedDict([
+    # A token stays usable as a refresh token until twice its lifetime has passed.
+    ('oauth2_tokens', 'issued_at + expires_in * 2 < :cutoff'),
+    # Authorization codes expire 300 seconds after they are issued.
+    ('oauth2_authorization_codes', 'auth_time < :cutoff - 300'),
+    ('password_recovery', 'expiration_date < :cutoff_timestamp'),
+    ('oauth2_revocations', 'expires_at < :cutoff')
+])
+
+
+class ExpiredRowPurger(object):
+    """Purges expired rows in batches.
+
+    Args:
+        engine (obj): The SQLAlchemy engine of the authserver database.
+        batch_size (int): The most rows deleted per transaction.
+        grace_period (float): Seconds a row is kept after it expires.
+        pause (float): Seconds to sleep between batches, to leave I/O to the request path.
+        partitions (obj): The `TokenPartitions` maintained if `oauth2_tokens` is partitioned.
+
+    """
+
+    def __init__(self, engine, batch_size: int = 1000, grace_period: float = 3600, pause: float = 0,
+                 partitions: TokenPartitions = None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.grace_period = grace_period
+        self.pause = pause
+        self.partitions = partitions
+        self.runs = 0
+        self.skipped = 0
+        self.last_run = None
+
+    def run(self) -> dict:
+        """Purge every table once.
+
+        Returns:
+            dict: Whether the run was skipped because another process held the lock; per table, the
+                rows and batches purged and the mean and slowest batch latency in milliseconds; and the
+                token partitions created and dropped, if `oauth2_tokens` is partitioned.
+
+        """
+        started = time.perf_counter()
+        now = time.time()
+        params = {
+            'cutoff': int(now - self.grace_period),
+            'cutoff_timestamp': datetime.utcfromtimestamp(now) - timedelta(seconds=self.grace_period),
+            'limit': self.batch_size
+        }
+
+        with self.engine.connect() as connection:
+            if not connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY}).scalar():
+                self.skipped += 1
+                return {'skipped': True}
+            try:
+                partitions = None
+                targets = TARGETS
+                if self.partitions is not None and self.partitions.is_partitioned(connection):
+                    partitions = self.partitions.maintain(connection, now)
+                    targets = OrderedDict((t, p) for t, p in TARGETS.items() if t != 'oauth2_tokens')
+                tables = OrderedDict(
+                    (table, self._purge_table(connection, table, predicate, params))
+                    for table, predicate in targets.items())
+            finally:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+
+        result = {
+            'skipped': False,
+            'seconds': round(time.perf_counter() - started, 3),
+            'tables': tables
+        }
+        if partitions is not None:
+            result['partitions'] = partitions
+        self.runs += 1
+        self.last_run = result
+        logging.info(f'Purged expired rows: {dict((t, r["rows"]) for t, r in tables.items())}.')
+        return result
+
+    def stats(self) -> dict:
+        """Purge statistics for the metrics endpoint."""
+        return {'runs': self.runs, 'skipped': self.skipped, 'last_run': self.last_run}
+
+    def _purge_table(self, connection, table: str, predicate: str, params: dict) -> dict:
+        statement = text(
+            f'DELETE FROM {table} WHERE (tableoid, ctid) IN '
+            f'(SELECT tableoid, ctid FROM {table} WHERE {predicate} LIMIT :limit)')
+        rows = batches = 0
+        latencies = []
+        while True:
+            batch_started = time.perf_counter()
+            with connection.begin():
+                deleted = connection.execute(statement, params).rowcount
+            latencies.append(time.perf_counter() - batch_started)
+            rows += deleted
+            batches += 1
+            if deleted < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+
+        return {
+            'rows': rows,
+            'batches': batches,
+            'batch_avg_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'batch_max_ms': round(max(latencies) * 1000, 3)
+        }
+
+
+class PurgeScheduler(threading.Thread):
+    """Runs a purger every `interval` seconds in the background.
+
+    Args:
+        app (obj): The Flask application whose context the purge runs in.
+        purger (obj): The `ExpiredRowPurger`.
+        interval (float): Seconds between runs.
+
+    """
+
+    def __init__(self, app, purger: ExpiredRowPurger, interval: float):
+        super().__init__(name='purge-scheduler', daemon=True)
+        self.app = app
+        self.purger = purger
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.purger.run()
+            except Exception:
+                logging.exception('Failed to purge expired rows.')
+
+    def stop(self):
+        self.stopped.set()
+
+
+def create_purger(engine, config) -> ExpiredRowPurger:
+    """Build a purger from configuration and report its statistics at the metrics endpoint."""
+    partitions = TokenPartitions(
+        interval=config.token_partition_interval, premake=config.token_partition_premake,
+        grace_period=config.purge_grace_period)
+    purger = ExpiredRowPurger(
+        engine, batch_size=config.purge_batch_size, grace_period=config.purge_grace_period,
+        pause=config.purge_batch_pause, partitions=partitions)
+    register_metrics('purge', purger.stats)
+    return purger
@@ -0,0 +1,103 @@
+"""Query Budgets.
+
+Counts the SQL statements each request executes and compares the count with the budget of the view
+that handled it, so that a relationship loaded row by row (an N+1 query) shows up as soon as it is
+introduced. A view declares its budget with `@query_budget(n)`; other views get
+`QUERY_BUDGET_DEFAULT`, and a budget of 0 is not checked. A request over its budget is logged with
+its statements and counted in `/health/metrics`. With `QUERY_BUDGET_STRICT`, which is on under test,
+it raises `QueryBudgetExceeded` instead so that the test making the request fails.
+
+Statements run while a streamed response is being sent are not counted.
+
+"""
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from authserver.utilities.metrics import register_metrics
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(budget: int):
+    """Declare the most SQL statements a view may execute per request.
+
+    Args:
+        budget (int): The number of statements.
+
+    """
+    def decorator(func):
+        func.query_budget = budget
+        return func
+    return decorator
+
+
+class QueryBudget(object):
+    """Enforces query budgets on the requests of an application.
+
+    Args:
+        default_budget (int): The budget of views that do not declare one. 0 disables the check for them.
+        strict (bool): Raise `QueryBudgetExceeded` rather than log a warning.
+
+    """
+
+    def __init__(self, default_budget: int = 0, strict: bool = False):
+        self.default_budget = default_budget
+        self.strict = strict
+        self._endpoints = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        register_metrics('query_budget', self.stats)
+
+    def budget_for(self, app) -> int:
+        """The budget of the view handling the current request."""
+        view = app.view_functions.get(request.endpoint)
+        view_class = getattr(view, 'view_class', None)
+        if view_class is not None:
+            view = getattr(view_class, request.method.lower(), None)
+        return getattr(view, 'query_budget', self.default_budget)
+
+    def stats(self) -> dict:
+        """The most statements seen and the number of requests over budget, per endpoint."""
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            statements = g.get('query_budget_statements')
+            if statements is not None:
+                statements.append(statement)
+
+    def _before_request(self):
+        g.query_budget_statements = []
+
+    def _after_request(self, response):
+        statements = g.pop('query_budget_statements', None)
+        if statements is None or request.endpoint is None:
+            return response
+
+        budget = self.budget_for(current_app)
+        exceeded = bool(budget) and len(statements) > budget
+        with self._lock:
+            stats = self._endpoints.setdefault(request.endpoint, {'requests': 0, 'max_queries': 0, 'exceeded': 0})
+            stats['requests'] += 1
+            stats['max_queries'] = max(stats['max_queries'], len(statements))
+            stats['exceeded'] += int(exceeded)
+
+        if exceeded:
+            message = (f'{request.method} {request.path} ran {len(statements)} queries, over its budget of {budget}:\n' +
+                       '\n'.join(statements))
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logging.warning(message)
+        return response
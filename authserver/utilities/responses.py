@@ -5,6 +5,8 @@ from collections import OrderedDict
 # Collection of exceptions and associated error messages.
 EXCEPTION_TYPES = {
     'IntegrityError': 'A record with one or more unique fields already exists. Please re-check your request and try again.',
+    'PasswordHasherBusy': 'The server is busy. Please try again in a moment.',
+    'LoginThrottled': 'Too many login attempts. Please try again later.',
     'Unknown': 'An unknown error has occured and has been reported to our technical team.'
 }
 
@@ -39,6 +41,23 @@ class ResponseBody(object):
         response['response'] = results
         return response, response['code']
 
+    def get_page_response(self, results: list, next_cursor: str, message: str = 'Successfully retrieved resources'):
+        """Retrieve one page of a list of responses.
+
+        Args:
+            results (list): The results on this page.
+            next_cursor (str): The cursor of the next page, or None if this is the last page.
+            message (str): The message to include in the response.
+
+        Returns:
+            dict, int: The response object and HTTP status code.
+
+        """
+
+        response, code = self.get_all_response(results, message)
+        response['next'] = next_cursor
+        return response, code
+
     def get_one_response(self, result: dict, message: str = 'Successfully retrieved resource', request=None):
         """Retrieve a single response.
 
@@ -0,0 +1,62 @@
+"""Shared Memory Tables.
+
+Fixed-size tables that every worker on a host maps from one file, e.g. under `/dev/shm`. A file whose
+header or size does not match the table a worker expects is never resized in place, because other
+workers may still map it and would fault on the truncated pages. Instead a new table is built in a
+temporary file and renamed over the path; workers that mapped the old file keep a valid mapping of it
+until they restart.
+
+"""
+
+import fcntl
+import mmap
+import os
+
+
+def table_path(path: str, version: int, slots: int) -> str:
+    """The file of a table with a given layout, so that workers with different layouts use different files."""
+    return f'{path}.v{version}.{slots}'
+
+
+def open_shared_table(path: str, header: bytes, size: int) -> tuple:
+    """Map the table at a path, replacing the file if it was laid out differently.
+
+    Args:
+        path (str): The file backing the table.
+        header (bytes): The bytes the file must start with.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        tuple: The open file descriptor and the `mmap` of the file.
+
+    """
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        keep = False
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                # Replaced by another worker while this one waited for the lock.
+                continue
+            if os.fstat(fd).st_size == size and os.pread(fd, len(header), 0) == header:
+                keep = True
+                return fd, mmap.mmap(fd, size)
+            new_fd = _replace(path, header, size)
+            return new_fd, mmap.mmap(new_fd, size)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, 0)
+            if not keep:
+                os.close(fd)
+
+
+def _replace(path: str, header: bytes, size: int) -> int:
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(temporary_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.ftruncate(fd, size)
+        os.pwrite(fd, header, 0)
+        os.rename(temporary_path, path)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
@@ -0,0 +1,160 @@
+"""Bulk User Import.
+
+Creates users from NDJSON or CSV, one user per line or row, with the same fields as `POST /users`.
+Every row is validated with `UserSchema`. The passwords of the valid rows are hashed across a process
+pool, and the users are inserted `batch_size` rows at a time with a multi-row
+`INSERT ... ON CONFLICT (username) DO NOTHING`, each batch in its own transaction. A row that cannot
+be imported is reported with its line number and does not stop the rest of the import.
+
+"""
+
+import csv
+import json
+from datetime import datetime
+from uuid import uuid4
+
+from marshmallow import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from authserver.db import Role, User, UserSchema, db
+from authserver.utilities.passwords import DEFAULT_ROUNDS, hash_passwords
+
+
+def parse_ndjson(lines):
+    """Parse NDJSON users.
+
+    Args:
+        lines (iter): The lines of the document.
+
+    Yields:
+        tuple: The line number and the user as a dict, or the line number and None if the line is not a JSON object.
+
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def parse_csv(lines):
+    """Parse CSV users. The first row names the columns; empty cells are left out.
+
+    Args:
+        lines (iter): The lines of the document.
+
+    Yields:
+        tuple: The line number and the user as a dict.
+
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        if not any(row.values()):
+            continue
+        yield reader.line_num, {k: v for k, v in row.items() if k and v not in (None, '')}
+
+
+class UserImporter(object):
+    """Imports users in batches.
+
+    Args:
+        batch_size (int): The number of users inserted per transaction.
+        workers (int): The number of processes that hash passwords. Defaults to the number of CPUs.
+        rounds (int): The bcrypt cost of the password hashes.
+
+    """
+
+    def __init__(self, batch_size: int = 500, workers: int = None, rounds: int = DEFAULT_ROUNDS):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.rounds = rounds
+        self.schema = UserSchema()
+
+    def run(self, rows) -> dict:
+        """Import users.
+
+        Args:
+            rows (iter): Line numbers and users, as yielded by `parse_ndjson` or `parse_csv`.
+
+        Returns:
+            dict: The `created` users with their line and ID, and the `errors` with their line and messages.
+
+        """
+        created, errors, valid, usernames = [], [], [], set()
+        for line, row in rows:
+            if row is None:
+                errors.append({'line': line, 'messages': {'_schema': ['Not a JSON object.']}})
+                continue
+            try:
+                user = self.schema.load(row)
+            except ValidationError as error:
+                errors.append({'line': line, 'username': row.get('username'), 'messages': error.messages})
+                continue
+            if user['username'] in usernames:
+                errors.append({'line': line, 'username': user['username'],
+                               'messages': {'username': ['Appears more than once in the import.']}})
+                continue
+            usernames.add(user['username'])
+            valid.append((line, user))
+
+        valid = self._check_roles(valid, errors)
+        if valid:
+            password_hashes = hash_passwords([user.pop('password') for _, user in valid], self.workers, self.rounds)
+            for (_, user), password_hash in zip(valid, password_hashes):
+                user['password_hash'] = password_hash
+
+        for start in range(0, len(valid), self.batch_size):
+            self._insert(valid[start:start + self.batch_size], created, errors)
+
+        errors.sort(key=lambda error: error['line'])
+        return {'created': created, 'errors': errors}
+
+    def _check_roles(self, valid: list, errors: list) -> list:
+        role_ids = {user['role_id'] for _, user in valid if user.get('role_id')}
+        if not role_ids:
+            return valid
+        known = {role_id for role_id, in db.session.query(Role.id).filter(Role.id.in_(role_ids))}
+        checked = []
+        for line, user in valid:
+            if user.get('role_id') and user['role_id'] not in known:
+                errors.append({'line': line, 'username': user['username'], 'messages': {'role_id': ['Unknown role.']}})
+            else:
+                checked.append((line, user))
+        return checked
+
+    def _insert(self, batch: list, created: list, errors: list):
+        now = datetime.utcnow()
+        values = [{
+            'id': str(uuid4()).replace('-', ''),
+            'username': user['username'],
+            'password_hash': user['password_hash'],
+            'person_id': user.get('person_id'),
+            'role_id': user.get('role_id'),
+            'active': user.get('active', False),
+            'can_login': user.get('can_login', False),
+            'date_created': now,
+            'date_last_updated': now
+        } for _, user in batch]
+        statement = insert(User.__table__).values(values).on_conflict_do_nothing(
+            index_elements=['username']).returning(User.__table__.c.username, User.__table__.c.id)
+
+        try:
+            inserted = dict(db.session.execute(statement).fetchall())
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            for line, user in batch:
+                errors.append({'line': line, 'username': user['username'],
+                               'messages': {'_schema': [f'The batch could not be inserted ({type(error).__name__}).']}})
+            return
+
+        for line, user in batch:
+            if user['username'] in inserted:
+                created.append({'line': line, 'id': inserted[user['username']], 'username': user['username']})
+            else:
+                errors.append({'line': line, 'username': user['username'],
+                               'messages': {'username': ['A user with this username already exists.']}})
@@ -1,7 +1,16 @@
+import json
 import os
+import sys
+import time
 from flask_script import Manager
 from flask_migrate import MigrateCommand
 from authserver import create_app
+from authserver.config import ConfigurationFactory
+from authserver.db import db
+from authserver.utilities.export import EXPORTS, export_ndjson, gzip_stream
+from authserver.utilities.benchmarks import benchmark_jwt_signing, benchmark_token_lookup, calibrate_bcrypt_rounds
+from authserver.utilities.purge import create_purger
+from authserver.utilities.user_import import UserImporter, parse_csv, parse_ndjson
 
 environment = os.getenv('APP_ENV', None)
 app = application = create_app(environment)
@@ -9,5 +18,97 @@ app = application = create_app(environment)
 manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
+
+@manager.option('-n', '--iterations', dest='iterations', type=int, default=500)
+def benchmark_jwt(iterations):
+    """Compare the per-token cost of the supported JWT signing algorithms."""
+    print(f'{"algorithm":<10}{"sign ms":>10}{"verify ms":>12}{"bytes":>8}')
+    for algorithm, result in benchmark_jwt_signing(iterations).items():
+        print(f'{algorithm:<10}{result["sign_ms"]:>10}{result["verify_ms"]:>12}{result["token_bytes"]:>8}')
+
+
+@manager.option('-n', '--iterations', dest='iterations', type=int, default=2000)
+def benchmark_token_cache(iterations):
+    """Compare bearer token lookups in Postgres with the shared and per-worker token caches."""
+    print(f'{"lookup":<14}{"ms":>10}')
+    for strategy, mean_ms in benchmark_token_lookup(iterations).items():
+        print(f'{strategy:<14}{mean_ms:>10}')
+
+
+@manager.option('-t', '--target-ms', dest='target_ms', type=float, default=250)
+def calibrate_bcrypt(target_ms):
+    """Measure bcrypt on this machine and suggest a BCRYPT_ROUNDS for a target hash time."""
+    timings, suggested = calibrate_bcrypt_rounds(target_ms)
+    print(f'{"rounds":<8}{"ms":>10}')
+    for rounds, ms in timings.items():
+        print(f'{rounds:<8}{ms:>10}')
+    print(f'Suggested BCRYPT_ROUNDS={suggested} (currently {ConfigurationFactory.from_env().bcrypt_rounds}).')
+
+
+@manager.option('-b', '--batch-size', dest='batch_size', type=int, default=None)
+@manager.option('-g', '--grace-period', dest='grace_period', type=float, default=None)
+def purge_expired(batch_size, grace_period):
+    """Delete expired tokens, authorization codes, recovery nonces and revocations."""
+    purger = create_purger(db.engine, app.configuration)
+    purger.batch_size = batch_size or purger.batch_size
+    purger.grace_period = purger.grace_period if grace_period is None else grace_period
+    result = purger.run()
+    if result['skipped']:
+        print('Another process is purging; skipped.')
+        return
+    print(f'{"table":<28}{"rows":>10}{"batches":>9}{"avg ms":>10}{"max ms":>10}')
+    for table, stats in result['tables'].items():
+        print(f'{table:<28}{stats["rows"]:>10}{stats["batches"]:>9}{stats["batch_avg_ms"]:>10}{stats["batch_max_ms"]:>10}')
+    for action in ('created', 'dropped'):
+        for partition in result.get('partitions', {}).get(action, []):
+            print(f'{action.capitalize()} partition {partition}.')
+    print(f'Finished in {result["seconds"]} s.')
+
+
+@manager.command
+def partition_tokens():
+    """Convert oauth2_tokens into a table partitioned by issued_at."""
+    partitions = create_purger(db.engine, app.configuration).partitions
+    with db.engine.connect() as connection:
+        if partitions.is_partitioned(connection):
+            print('oauth2_tokens is already partitioned.')
+            return
+        result = partitions.convert(connection, time.time())
+    print(f'Partitioned oauth2_tokens by {partitions.interval}; created {", ".join(result["created"])}.')
+
+
+@manager.option('resource', choices=list(EXPORTS))
+@manager.option('-o', '--output', dest='output', default=None)
+@manager.option('-z', '--gzip', dest='compress', action='store_true')
+def export(resource, output, compress):
+    """Write every user, client, role or scope as NDJSON to a file or stdout."""
+    chunks = export_ndjson(resource, ConfigurationFactory.from_env().export_batch_size)
+    if compress:
+        chunks = gzip_stream(chunks)
+    out = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+@manager.option('path')
+@manager.option('-f', '--format', dest='file_format', choices=['ndjson', 'csv'], default=None)
+@manager.option('-w', '--workers', dest='workers', type=int, default=None)
+def import_users(path, file_format, workers):
+    """Create users from an NDJSON or CSV file, hashing passwords across a process pool (default: one per CPU)."""
+    config = ConfigurationFactory.from_env()
+    file_format = file_format or ('csv' if path.endswith('.csv') else 'ndjson')
+    with open(path, newline='') as users_file:
+        lines = users_file.read().splitlines()
+    importer = UserImporter(config.user_import_batch_size, workers, config.bcrypt_rounds)
+    result = importer.run(parse_csv(lines) if file_format == 'csv' else parse_ndjson(lines))
+    for error in result['errors']:
+        print(f'Line {error["line"]}: {json.dumps(error["messages"])}')
+    print(f'Created {len(result["created"])} users; {len(result["errors"])} rows failed.')
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,27 @@
+"""Add token reuse policy to client.
+
+Revision ID: 3a7e9d52c6b1
+Revises: 8b2f4c1d9e07
+Create Date: 2026-10-18 11:27:05.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7e9d52c6b1'
+down_revision = '8b2f4c1d9e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('oauth2_clients', sa.Column('token_reuse_min_remaining', sa.Integer(), nullable=True))
+    op.create_index('ix_oauth2_tokens_client_reuse', 'oauth2_tokens', ['client_id', 'scope', sa.text('issued_at DESC')],
+                    postgresql_where=sa.text('revoked = false AND user_id IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_oauth2_tokens_client_reuse', table_name='oauth2_tokens')
+    op.drop_column('oauth2_clients', 'token_reuse_min_remaining')
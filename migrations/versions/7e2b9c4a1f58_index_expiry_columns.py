@@ -0,0 +1,34 @@
+"""Index expiry columns for the purge of expired rows.
+
+Revision ID: 7e2b9c4a1f58
+Revises: c4d8e1f7a290
+Create Date: 2026-10-18 16:40:27.531906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2b9c4a1f58'
+down_revision = 'c4d8e1f7a290'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_oauth2_tokens_refresh_expires_at', 'oauth2_tokens', [sa.text('(issued_at + expires_in * 2)')]),
+    ('ix_oauth2_authorization_codes_auth_time', 'oauth2_authorization_codes', ['auth_time']),
+    ('ix_password_recovery_expiration_date', 'password_recovery', ['expiration_date'])
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
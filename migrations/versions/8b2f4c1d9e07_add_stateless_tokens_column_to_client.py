@@ -0,0 +1,24 @@
+"""Add stateless_tokens column to client.
+
+Revision ID: 8b2f4c1d9e07
+Revises: 631f37f8c085
+Create Date: 2026-10-18 10:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2f4c1d9e07'
+down_revision = '631f37f8c085'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('oauth2_clients', sa.Column('stateless_tokens', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('oauth2_clients', 'stateless_tokens')
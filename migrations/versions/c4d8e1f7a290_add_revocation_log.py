@@ -0,0 +1,32 @@
+"""Add revocation log.
+
+Revision ID: c4d8e1f7a290
+Revises: f1c6a8e2b4d3
+Create Date: 2026-10-18 15:12:44.208153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e1f7a290'
+down_revision = 'f1c6a8e2b4d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('oauth2_revocations',
+                    sa.Column('id', sa.BigInteger(), nullable=False),
+                    sa.Column('kind', sa.String(length=8), nullable=False),
+                    sa.Column('value', sa.String(length=64), nullable=False),
+                    sa.Column('expires_at', sa.Integer(), nullable=False),
+                    sa.Column('date_created', sa.TIMESTAMP(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_oauth2_revocations_expires_at', 'oauth2_revocations', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_oauth2_revocations_expires_at', table_name='oauth2_revocations')
+    op.drop_table('oauth2_revocations')
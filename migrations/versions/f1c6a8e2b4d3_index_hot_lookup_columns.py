@@ -0,0 +1,43 @@
+"""Index hot lookup columns.
+
+`oauth2_tokens.access_token`, `oauth2_authorization_codes.code` and `password_recovery.nonce`
+are already covered by their unique constraints and `authorized_clients` by its (user_id, client_id)
+primary key. This adds the indexes the remaining lookups and the ON DELETE CASCADE foreign keys need.
+They are built concurrently so that existing deployments keep serving tokens during the upgrade.
+
+Revision ID: f1c6a8e2b4d3
+Revises: 3a7e9d52c6b1
+Create Date: 2026-10-18 13:05:12.873410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6a8e2b4d3'
+down_revision = '3a7e9d52c6b1'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_oauth2_tokens_user_id', 'oauth2_tokens', ['user_id'], 'user_id IS NOT NULL'),
+    ('ix_oauth2_tokens_client_id', 'oauth2_tokens', ['client_id'], None),
+    ('ix_oauth2_clients_user_id', 'oauth2_clients', ['user_id'], None),
+    ('ix_oauth2_authorization_codes_user_id', 'oauth2_authorization_codes', ['user_id'], None),
+    ('ix_users_person_id', 'users', ['person_id'], 'person_id IS NOT NULL'),
+    ('ix_password_recovery_user_id', 'password_recovery', ['user_id'], None)
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True,
+                            postgresql_where=sa.text(where) if where else None)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
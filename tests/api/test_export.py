@@ -0,0 +1,49 @@
+import gzip
+import json
+
+from expects import be_none, equal, expect
+
+from tests.utils import post_users
+
+USERS = [
+    {'username': 'export_user_1', 'password': 'password', 'person_id': 'c0ffee-c0ffee-1', 'can_login': True},
+    {'username': 'export_user_2', 'password': 'password', 'person_id': 'c0ffee-c0ffee-2', 'can_login': True}
+]
+
+
+class TestExportResource:
+    def test_export_users(self, client, token_generator):
+        token = token_generator.get_token(client)
+        headers = {'authorization': f'bearer {token}'}
+        post_users(USERS, client, token)
+        users = client.get('/users?all=true', headers=headers).json['response']
+
+        response = client.get('/export/users', headers=headers)
+        expect(response.status_code).to(equal(200))
+        expect(response.mimetype).to(equal('application/x-ndjson'))
+        expect(response.headers.get('Content-Encoding')).to(be_none)
+        exported = [json.loads(line) for line in response.data.splitlines()]
+        expect(sorted(user['id'] for user in exported)).to(equal(sorted(user['id'] for user in users)))
+        expect(sorted(user['username'] for user in exported)).to(equal(sorted(user['username'] for user in users)))
+
+        response = client.get('/export/users', headers=dict(headers, **{'accept-encoding': 'gzip'}))
+        expect(response.status_code).to(equal(200))
+        expect(response.headers.get('Content-Encoding')).to(equal('gzip'))
+        expect([json.loads(line) for line in gzip.decompress(response.data).splitlines()]).to(equal(exported))
+
+        for user in users:
+            if user['username'] in [u['username'] for u in USERS]:
+                client.delete(f"/users/{user['id']}", headers=headers)
+
+    def test_export_every_resource(self, client, token_generator):
+        headers = {'authorization': f'bearer {token_generator.get_token(client)}'}
+        for resource in ('clients', 'roles', 'scopes'):
+            response = client.get(f'/export/{resource}', headers=headers)
+            expect(response.status_code).to(equal(200))
+            exported = [json.loads(line) for line in response.data.splitlines()]
+            listed = client.get(f'/{resource}?all=true', headers=headers).json['response']
+            expect(exported).to(equal(listed))
+
+    def test_export_unknown_resource(self, client, token_generator):
+        headers = {'authorization': f'bearer {token_generator.get_token(client)}'}
+        expect(client.get('/export/tokens', headers=headers).status_code).to(equal(404))
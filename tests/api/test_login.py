@@ -3,10 +3,12 @@ from unittest.mock import patch
 from urllib.parse import urlencode
 
 import pytest
-from expects import be_empty, equal, expect
+from expects import be_above, be_empty, equal, expect
 from flask import Response, session
 
 from authserver.db import User, db
+from authserver.utilities.login_throttle import LoginThrottle
+from authserver.utilities.passwords import PasswordHasherBusy
 
 
 USER_DATA = {
@@ -59,6 +61,32 @@ class TestLogin:
         assert "You did not enter valid login credentials." in str(
             response.data)
 
+    def test_login_while_password_hasher_busy(self, client):
+        USER_DATA["active"] = True
+        user = User(**USER_DATA)
+        db.session.add(user)
+
+        with patch('authserver.utilities.passwords.PasswordHasher.verify', side_effect=PasswordHasherBusy):
+            response = client.post(
+                '/', data={"username": "greg_henry", "password": "passw0rd!"})
+
+        expect(response.status_code).to(equal(503))
+        assert "The server is busy." in str(response.data)
+
+    def test_login_throttled_before_checking_the_password(self, client):
+        throttle = LoginThrottle(ip_limit=0, username_limit=1, delay_after=10)
+        throttle.attempt('127.0.0.1', 'greg_henry')
+
+        with patch('authserver.api.home.get_login_throttle', return_value=throttle), \
+                patch('authserver.utilities.passwords.PasswordHasher.verify') as verify:
+            response = client.post(
+                '/', data={"username": "greg_henry", "password": "passw0rd!"})
+
+        expect(response.status_code).to(equal(429))
+        expect(int(response.headers['Retry-After'])).to(be_above(0))
+        expect(verify.called).to(equal(False))
+        assert "Too many login attempts." in str(response.data)
+
     @pytest.mark.skip(reason=None)
     def test_session_clear_after_consent(self, client, user):
         with client:
@@ -1,11 +1,14 @@
 import pytest
 from uuid import uuid4
+import hashlib
 import json
 import time
 from flask import Response
-from expects import expect, be, equal, raise_error, be_above_or_equal, have_key
+from expects import expect, be, be_empty, be_below_or_equal, equal, raise_error, be_above_or_equal, have_key
 
-from authserver.db import db, OAuth2Token
+from authserver.db import db, OAuth2Client, OAuth2Token
+from authserver.oauth2 import get_revocation_log
+from tests.utils import count_queries
 
 
 class TestOAuth2Flows:
@@ -60,3 +63,178 @@ class TestOAuth2Flows:
         response = self._get_access_token(client)
         is_valid = self._validate_token(client, response['access_token'])
         expect(is_valid).to(be(True))
+
+    def test_token_endpoint_query_count(self, client, app, monkeypatch):
+        """Issuing a token writes the token once and never reads it back."""
+        monkeypatch.setenv('APP_ENV', 'PRODUCTION')
+        with app.app_context():
+            with count_queries(db.engine) as statements:
+                response = self._get_access_token(client)
+
+        expect(response).to(have_key('jwt'))
+        token_inserts = [s for s in statements if s.lstrip().upper().startswith('INSERT INTO OAUTH2_TOKENS')]
+        token_selects = [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'oauth2_tokens' in s]
+        expect(len(token_inserts)).to(equal(1))
+        expect(token_selects).to(be_empty)
+        # Client lookup, its roles and the token insert.
+        expect(len(statements)).to(be_below_or_equal(3))
+
+    def test_stateless_client_credentials_token(self, client, app):
+        """Clients opted in to stateless tokens get a self-validating token that is never stored."""
+        with app.app_context():
+            oauth_client = OAuth2Client.query.filter_by(client_id='d84UZXW7QcB5ufaVT15C9BtO').first()
+            oauth_client.stateless_tokens = True
+            db.session.commit()
+            try:
+                with count_queries(db.engine) as statements:
+                    response = self._get_access_token(client)
+                access_token = response['access_token']
+
+                expect([s for s in statements if 'oauth2_tokens' in s]).to(be_empty)
+                expect(self._validate_token(client, access_token)).to(be(True))
+
+                body = {
+                    'client_id': 'd84UZXW7QcB5ufaVT15C9BtO',
+                    'client_secret': 'cTQfd67c5uN9df8g56U8T5CwbF9S0LDgl4imUDguKkrGSuzI',
+                    'token': access_token
+                }
+                headers = {'content-type': 'application/json'}
+                revoke_response = client.post('/oauth/revoke', data=json.dumps(body), headers=headers)
+                expect(revoke_response.status_code).to(equal(200))
+                expect(self._validate_token(client, access_token)).to(be(False))
+            finally:
+                oauth_client.stateless_tokens = None
+                db.session.commit()
+
+    def test_client_credentials_token_reuse(self, client, app, monkeypatch):
+        """Clients with a reuse policy get their still valid token back without a new row."""
+        monkeypatch.setenv('APP_ENV', 'PRODUCTION')
+        with app.app_context():
+            oauth_client = OAuth2Client.query.filter_by(client_id='d84UZXW7QcB5ufaVT15C9BtO').first()
+            oauth_client.token_reuse_min_remaining = 60
+            db.session.commit()
+            try:
+                first = self._get_access_token(client)
+                with count_queries(db.engine) as statements:
+                    second = self._get_access_token(client)
+
+                expect(second['access_token']).to(equal(first['access_token']))
+                expect(second['jwt']).to(equal(first['jwt']))
+                expect([s for s in statements if s.lstrip().upper().startswith('INSERT')]).to(be_empty)
+
+                oauth_client.token_reuse_min_remaining = first['expires_in'] + 1
+                db.session.commit()
+                expect(self._get_access_token(client)['access_token']).not_to(equal(first['access_token']))
+            finally:
+                oauth_client.token_reuse_min_remaining = None
+                db.session.commit()
+
+    def test_token_lookups_are_cached(self, client, app):
+        """Repeated validation of a token does not reach the database; revoking it takes effect at once."""
+        access_token = self._get_access_token(client)['access_token']
+        headers = {'authorization': f'bearer {access_token}'}
+        expect(self._validate_token(client, access_token)).to(be(True))
+
+        with app.app_context():
+            with count_queries(db.engine) as statements:
+                expect(self._validate_token(client, access_token)).to(be(True))
+                expect(client.get('/users', headers=headers).status_code).to(equal(200))
+        expect([s for s in statements if 'oauth2_tokens' in s]).to(be_empty)
+
+        body = {
+            'client_id': 'd84UZXW7QcB5ufaVT15C9BtO',
+            'client_secret': 'cTQfd67c5uN9df8g56U8T5CwbF9S0LDgl4imUDguKkrGSuzI',
+            'token': access_token
+        }
+        client.post('/oauth/revoke', data=json.dumps(body), headers={'content-type': 'application/json'})
+        expect(client.get('/users', headers=headers).status_code).to(equal(401))
+        expect(self._validate_token(client, access_token)).to(be(False))
+
+    def test_batch_token_validation(self, client, app):
+        """Tokens that are not cached are looked up with one query."""
+        first = self._get_access_token(client)['access_token']
+        second = self._get_access_token(client)['access_token']
+        unknown = str(uuid4())
+        headers = {'content-type': 'application/json'}
+        credentials = {
+            'client_id': 'd84UZXW7QcB5ufaVT15C9BtO',
+            'client_secret': 'cTQfd67c5uN9df8g56U8T5CwbF9S0LDgl4imUDguKkrGSuzI'
+        }
+
+        response = client.post('/oauth/validate/batch', data=json.dumps({'tokens': [first]}), headers=headers)
+        expect(response.status_code).to(equal(401))
+        response = client.post('/oauth/validate/batch', data=json.dumps(
+            dict(credentials, client_secret='wrong', tokens=[first])), headers=headers)
+        expect(response.status_code).to(equal(401))
+
+        with app.app_context():
+            with count_queries(db.engine) as statements:
+                response = client.post('/oauth/validate/batch', data=json.dumps(
+                    dict(credentials, tokens=[first, unknown, second])), headers=headers)
+        expect(response.status_code).to(equal(200))
+        expect(len([s for s in statements if 'oauth2_tokens' in s])).to(equal(1))
+
+        results = response.json['messages']['tokens']
+        expect([result['token'] for result in results]).to(equal([first, unknown, second]))
+        expect([result['valid'] for result in results]).to(equal([True, False, True]))
+        expect(results[0]['client_id']).to(equal('d84UZXW7QcB5ufaVT15C9BtO'))
+        expect(results[0]['expires_at']).to(be_above_or_equal(int(time.time())))
+        expect(results[0]).to(have_key('scope'))
+
+        response = client.post('/oauth/validate/batch', data=json.dumps(
+            dict(credentials, tokens=[unknown] * 101)), headers=headers)
+        expect(response.status_code).to(equal(422))
+        response = client.post('/oauth/validate/batch', data=json.dumps(dict(credentials, tokens=first)), headers=headers)
+        expect(response.status_code).to(equal(422))
+
+    def test_token_introspection(self, client, app):
+        token = self._get_access_token(client)
+        body = {
+            'client_id': 'd84UZXW7QcB5ufaVT15C9BtO',
+            'client_secret': 'cTQfd67c5uN9df8g56U8T5CwbF9S0LDgl4imUDguKkrGSuzI',
+            'token': token['access_token']
+        }
+        headers = {'content-type': 'application/json'}
+
+        response = client.post('/oauth/introspect', data=json.dumps(body), headers=headers)
+        expect(response.status_code).to(equal(200))
+        expect(response.json['active']).to(be(True))
+        expect(response.json['client_id']).to(equal('d84UZXW7QcB5ufaVT15C9BtO'))
+        expect(response.json['exp']).to(be_above_or_equal(int(time.time())))
+        max_age = int(response.headers['Cache-Control'].split('=')[1])
+        expect(max_age).to(be_below_or_equal(min(300, token['expires_in'])))
+
+        client.post('/oauth/revoke', data=json.dumps(body), headers=headers)
+        response = client.post('/oauth/introspect', data=json.dumps(body), headers=headers)
+        expect(response.json).to(equal({'active': False}))
+        expect(response.headers['Cache-Control']).to(equal('no-store'))
+
+        body['client_secret'] = 'wrong'
+        response = client.post('/oauth/introspect', data=json.dumps(body), headers=headers)
+        expect(response.status_code).to(equal(401))
+
+    def test_revocation_feed(self, client, app, monkeypatch):
+        """Revoked tokens are published through the change feed and the filter snapshot."""
+        monkeypatch.setattr(get_revocation_log(), 'settle_seconds', 0)
+        access_token = self._get_access_token(client)['access_token']
+        headers = {'authorization': f'bearer {access_token}'}
+        cursor = client.get('/oauth/revocations', headers=headers).json['cursor']
+
+        revoked = self._get_access_token(client)['access_token']
+        body = {
+            'client_id': 'd84UZXW7QcB5ufaVT15C9BtO',
+            'client_secret': 'cTQfd67c5uN9df8g56U8T5CwbF9S0LDgl4imUDguKkrGSuzI',
+            'token': revoked
+        }
+        client.post('/oauth/revoke', data=json.dumps(body), headers={'content-type': 'application/json'})
+
+        feed = client.get(f'/oauth/revocations?since={cursor}', headers=headers).json
+        digest = hashlib.sha256(revoked.encode('utf-8')).hexdigest()
+        expect([entry[:2] for entry in feed['revocations']]).to(equal([['token', digest]]))
+        expect(feed['more']).to(be(False))
+        expect(client.get(f'/oauth/revocations?since={feed["cursor"]}', headers=headers).json['revocations']).to(
+            be_empty)
+
+        snapshot = client.get('/oauth/revocations/filter', headers=headers).json
+        expect(snapshot['cursor']).to(equal(feed['cursor']))
+        expect(snapshot['filter']['count']).to(be_above_or_equal(1))
@@ -0,0 +1,64 @@
+import json
+
+from expects import be_true, contain, equal, expect
+
+from authserver.db import User, db
+
+
+def _ndjson(rows):
+    return '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+
+
+class TestUserImportResource:
+    def test_import_ndjson(self, mocker, client):
+        mocker.patch('authlib.integrations.flask_oauth2.ResourceProtector.acquire_token', return_value=True)
+        existing = User(username='import_existing', password='password')
+        db.session.add(existing)
+        db.session.commit()
+
+        body = _ndjson([
+            {'username': 'import_1', 'password': 'secret-1', 'person_id': 'p1', 'active': True, 'can_login': True},
+            {'username': 'import_2', 'password': 'secret-2'},
+            {'username': 'import_1', 'password': 'again'},
+            {'username': 'import_existing', 'password': 'password'},
+            {'username': 'import_3'},
+            'not json',
+            {'username': 'import_4', 'password': 'secret-4', 'role_id': 'no-such-role'}
+        ])
+        response = client.post('/users/import', data=body, headers={'content-type': 'application/x-ndjson'})
+        expect(response.status_code).to(equal(200))
+        result = response.json['messages']
+
+        expect([user['username'] for user in result['created']]).to(equal(['import_1', 'import_2']))
+        expect([error['line'] for error in result['errors']]).to(equal([3, 4, 5, 6, 7]))
+        expect(result['errors'][1]['messages']['username'][0]).to(contain('already exists'))
+        expect(result['errors'][2]['messages']).to(equal({'password': ['Missing data for required field.']}))
+
+        user = User.query.filter_by(username='import_1').first()
+        expect(user.id).to(equal(result['created'][0]['id']))
+        expect(user.verify_password('secret-1')).to(be_true)
+        expect((user.person_id, user.active, user.can_login)).to(equal(('p1', True, True)))
+
+        User.query.filter(User.username.in_(['import_1', 'import_2', 'import_existing'])).delete(synchronize_session=False)
+        db.session.commit()
+
+    def test_import_csv(self, mocker, client):
+        mocker.patch('authlib.integrations.flask_oauth2.ResourceProtector.acquire_token', return_value=True)
+        body = 'username,password,person_id,active\nimport_csv_1,secret,,true\nimport_csv_2,secret,p2,false\n'
+        response = client.post('/users/import', data=body, headers={'content-type': 'text/csv'})
+        expect(response.status_code).to(equal(200))
+        expect(response.json['messages']['errors']).to(equal([]))
+        expect([user['line'] for user in response.json['messages']['created']]).to(equal([2, 3]))
+
+        users = {user.username: user for user in User.query.filter(User.username.like('import_csv_%'))}
+        expect((users['import_csv_1'].person_id, users['import_csv_1'].active)).to(equal((None, True)))
+        expect((users['import_csv_2'].person_id, users['import_csv_2'].active)).to(equal(('p2', False)))
+
+        User.query.filter(User.username.like('import_csv_%')).delete(synchronize_session=False)
+        db.session.commit()
+
+    def test_import_too_many_rows(self, mocker, client):
+        mocker.patch('authlib.integrations.flask_oauth2.ResourceProtector.acquire_token', return_value=True)
+        body = _ndjson({'username': f'import_{i}', 'password': 'secret'} for i in range(101))
+        response = client.post('/users/import', data=body, headers={'content-type': 'application/x-ndjson'})
+        expect(response.status_code).to(equal(422))
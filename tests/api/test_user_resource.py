@@ -1,12 +1,14 @@
 import json
 
 import pytest
-from expects import be, be_above_or_equal, contain, equal, expect, raise_error, have_len
+from expects import be, be_above_or_equal, be_below_or_equal, be_none, contain, equal, expect, raise_error, have_len
 from flask import Response
 from time import sleep
 
 from authserver.api.oauth2 import _store_client_authorization
-from tests.utils import post_users
+from authserver.db import RevocationLogEntry, Role, User, db
+from authserver.oauth2.rfc6749.token_cache import token_digest
+from tests.utils import count_queries, post_users
 
 
 USERS = [
@@ -59,6 +61,22 @@ class TestUserResource:
         for user in added_users:
             added_user_ids.append(user["id"])
 
+        # Page through all users two at a time
+        paged_ids, after = [], None
+        while True:
+            url = "/users?limit=2" + (f"&after={after}" if after else "")
+            response_data = client.get(url, headers=headers).json
+            expect(len(response_data["response"])).to(be_below_or_equal(2))
+            paged_ids.extend(user["id"] for user in response_data["response"])
+            after = response_data["next"]
+            if after is None:
+                break
+        expect(sorted(paged_ids)).to(equal(sorted(user["id"] for user in added_users)))
+
+        response_data = client.get("/users?all=true", headers=headers).json
+        expect(len(response_data["response"])).to(equal(len(added_users)))
+        expect(response_data["next"]).to(be_none)
+
         # Attempt to POST an existing user
         response = client.post(
             "/users", data=json.dumps(USERS[0]), headers=headers)
@@ -70,10 +88,11 @@ class TestUserResource:
                 "/users/{}".format(user["id"]), headers=headers)
             expect(response.status_code).to(be(200))
 
-        # Update a user with a PATCH
-        user_id = added_users[len(added_users) - 1]["id"]
+        # Update a user with a PATCH. Users are listed by ID, so pick one of the users posted above.
+        posted_user = [user for user in added_users if user["person_id"]][-1]
+        user_id = posted_user["id"]
         new_person_id = str(
-            reversed(added_users[len(added_users) - 1]["person_id"]))
+            reversed(posted_user["person_id"]))
         single_field_update = {"person_id": new_person_id}
         response = client.patch(
             "/users/{}".format(user_id),
@@ -91,7 +110,7 @@ class TestUserResource:
         expect(response.status_code).to(equal(422))
 
         # Rename a user with a PUT, providing the entire object
-        user_to_update = added_users[len(added_users) - 1]
+        user_to_update = posted_user
         user_to_update["password"] = "password"
         user_to_update.pop("role", None)
         user_to_update.pop("date_created", None)
@@ -123,6 +142,31 @@ class TestUserResource:
 
         return response.json["response"][0]["id"]
 
+    def test_get_users_loads_roles_in_one_query(self, mocker, client):
+        mocker.patch(
+            "authlib.integrations.flask_oauth2.ResourceProtector.acquire_token",
+            return_value=True,
+        )
+        headers = {}
+        role = Role(role="query_budget_role", description="Query budget role")
+        db.session.add(role)
+        db.session.flush()
+        users = [User(username=f"query_budget_{i}", password="password", role_id=role.id) for i in range(5)]
+        db.session.add_all(users)
+        db.session.commit()
+
+        with count_queries(db.engine) as statements:
+            response = client.get("/users?all=true", headers=headers)
+        expect(response.status_code).to(equal(200))
+        listed = [u for u in response.json["response"] if u["username"].startswith("query_budget_")]
+        expect([u["role"]["role"] for u in listed]).to(equal(["query_budget_role"] * 5))
+        expect(len(statements)).to(be_below_or_equal(3))
+
+        for user in users:
+            db.session.delete(user)
+        db.session.delete(role)
+        db.session.commit()
+
 
 class TestPOSTUserResource:
     def test_post_user_invalid_action(self, mocker, client, user):
@@ -182,6 +226,32 @@ class TestPOSTUserResource:
         # Clean up (n.b., clean up should happen in the conftest – between each test.)
         client.delete(f"/users/{user.id}", headers={})
 
+    def test_post_users_bulk_deactivate(self, mocker, client, user, oauth_client, oauth_token):
+        mocker.patch(
+            "authlib.integrations.flask_oauth2.ResourceProtector.acquire_token",
+            return_value=True,
+        )
+
+        response = client.post(
+            "/users/deactivate", data=json.dumps({"ids": [user.id, "123bad"]}), headers={}
+        )
+        expect(response.status_code).to(equal(200))
+        expect(response.json["messages"]["deactivated"]).to(equal([user.id]))
+        expect(response.json["messages"]["not_found"]).to(equal(["123bad"]))
+
+        response = client.get("/users/{}".format(user.id), headers={})
+        expect(response.json["response"]["active"]).to(be(False))
+        expect(response.json["response"]["can_login"]).to(be(False))
+        expect(oauth_token.revoked).to(be(True))
+        expect(oauth_client.client_secret).to(be(None))
+        expect(RevocationLogEntry.query.filter_by(
+            kind="token", value=token_digest(oauth_token.access_token)).count()).to(equal(1))
+
+        response = client.post("/users/deactivate", data=json.dumps({"ids": "123bad"}), headers={})
+        expect(response.status_code).to(equal(422))
+
+        client.delete(f"/users/{user.id}", headers={})
+
     def test_post_user_activate_invalid_user_id(self, mocker, client):
         mocker.patch(
             "authlib.integrations.flask_oauth2.ResourceProtector.acquire_token",
@@ -0,0 +1,37 @@
+"""Unit tests for the Well-Known API"""
+
+import json
+
+import jwt
+from expects import be_none, equal, expect
+from flask import Response
+
+from authserver.oauth2 import get_signing_key_manager
+
+
+class TestWellKnown():
+    def test_jwks_verifies_signed_tokens(self, client):
+        response: Response = client.get('/.well-known/jwks.json')
+        expect(response.status_code).to(equal(200))
+        expect(response.headers['Cache-Control']).to(equal('public, max-age=3600'))
+
+        token = get_signing_key_manager().sign({'iss': 'brighthive-authserver'})
+        kid = jwt.get_unverified_header(token)['kid']
+        jwk = next(key for key in response.json['keys'] if key['kid'] == kid)
+        public_key = jwt.algorithms.get_default_algorithms()[jwk['alg']].from_jwk(json.dumps(jwk))
+        expect(jwt.decode(token, public_key, algorithms=[jwk['alg']])['iss']).to(equal('brighthive-authserver'))
+
+    def test_conditional_requests(self, client):
+        etag = client.get('/.well-known/jwks.json').headers['ETag']
+        response: Response = client.get('/.well-known/jwks.json', headers={'If-None-Match': etag})
+        expect(response.status_code).to(equal(304))
+        expect(response.data).to(equal(b''))
+
+    def test_discovery_document(self, client):
+        response: Response = client.get('/.well-known/openid-configuration')
+        expect(response.status_code).to(equal(200))
+        expect(response.headers.get('ETag')).not_to(be_none)
+        expect(response.json['issuer']).to(equal('brighthive-authserver'))
+        expect(response.json['jwks_uri']).to(equal('http://localhost/.well-known/jwks.json'))
+        expect(response.json['token_endpoint']).to(equal('http://localhost/oauth/token'))
+        expect(response.json['introspection_endpoint']).to(equal('http://localhost/oauth/introspect'))
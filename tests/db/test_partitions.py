@@ -0,0 +1,67 @@
+import time
+
+from expects import contain, equal, expect
+from sqlalchemy import text
+
+from authserver.db import db
+from authserver.utilities.partitions import TokenPartitions
+
+DAY = 86400
+
+# A stand-in for oauth2_tokens in its own schema, so that converting it leaves the real table alone.
+TOKENS_TABLE = '''
+CREATE TABLE oauth2_tokens (
+    id SERIAL PRIMARY KEY,
+    client_id VARCHAR(48),
+    access_token VARCHAR(255) NOT NULL UNIQUE,
+    scope TEXT,
+    revoked BOOLEAN,
+    issued_at INTEGER NOT NULL,
+    expires_in INTEGER NOT NULL,
+    user_id VARCHAR REFERENCES public.users(id) ON DELETE CASCADE
+)
+'''
+
+
+def _insert(connection, access_token, issued_at):
+    connection.execute(text(
+        'INSERT INTO oauth2_tokens (access_token, scope, revoked, issued_at, expires_in) '
+        "VALUES (:access_token, '', false, :issued_at, 300)"), {'access_token': access_token, 'issued_at': issued_at})
+
+
+def _partition_of(connection, access_token):
+    return connection.execute(text(
+        'SELECT tableoid::regclass::text FROM oauth2_tokens WHERE access_token = :access_token'),
+        {'access_token': access_token}).scalar()
+
+
+class TestTokenPartitions:
+    def test_convert_create_and_drop(self, app):
+        now = time.time()
+        partitions = TokenPartitions(interval='day', premake=2, grace_period=3600)
+        with app.app_context():
+            with db.engine.connect() as connection:
+                connection.execute(text('CREATE SCHEMA partition_test'))
+                try:
+                    connection.execute(text('SET search_path TO partition_test, public'))
+                    connection.execute(text(TOKENS_TABLE))
+                    _insert(connection, 'old', int(now) - 60 * DAY)
+                    _insert(connection, 'current', int(now))
+
+                    result = partitions.convert(connection, now)
+                    expect(partitions.is_partitioned(connection)).to(equal(True))
+                    expect(len(result['created'])).to(equal(2))
+                    expect(_partition_of(connection, 'old')).to(equal('oauth2_tokens_legacy'))
+
+                    _insert(connection, 'soon', int(now) + 2 * DAY)
+                    _insert(connection, 'later', int(now) + 10 * DAY)
+                    expect(_partition_of(connection, 'later')).to(equal('oauth2_tokens_default'))
+
+                    result = partitions.maintain(connection, now + 9 * DAY)
+                    expect(result['dropped']).to(contain('oauth2_tokens_legacy'))
+                    expect(_partition_of(connection, 'later')).to(equal(result['created'][1]))
+                    expect(_partition_of(connection, 'current')).to(equal(None))
+                    expect(_partition_of(connection, 'soon')).to(equal(None))
+                finally:
+                    connection.execute(text('DROP SCHEMA partition_test CASCADE'))
+                    connection.execute(text('SET search_path TO DEFAULT'))
@@ -0,0 +1,49 @@
+import time
+from uuid import uuid4
+
+from expects import be_none, equal, expect
+from sqlalchemy import text
+
+from authserver.db import OAuth2Token, RevocationLogEntry, db
+from authserver.utilities.purge import ADVISORY_LOCK_KEY, ExpiredRowPurger
+
+
+def _token(issued_at, expires_in=300):
+    token = OAuth2Token(access_token=str(uuid4()), client_id='d84UZXW7QcB5ufaVT15C9BtO', token_type='Bearer',
+                        scope='', revoked=False, issued_at=issued_at, expires_in=expires_in)
+    db.session.add(token)
+    return token
+
+
+class TestExpiredRowPurger:
+    def test_purges_expired_rows_in_batches(self, app):
+        with app.app_context():
+            now = int(time.time())
+            expired = [_token(now - 10000).access_token for _ in range(3)]
+            # Past its access expiry but still usable as a refresh token.
+            refreshable = _token(now - 400).access_token
+            # Past its refresh expiry but within the grace period.
+            recent = _token(now - 1000).access_token
+            db.session.add(RevocationLogEntry(kind='jti', value=str(uuid4()), expires_at=now - 10000))
+            db.session.commit()
+
+            result = ExpiredRowPurger(db.engine, batch_size=2, grace_period=3600).run()
+            expect(result['skipped']).to(equal(False))
+            expect(result['tables']['oauth2_tokens']['rows']).to(equal(3))
+            expect(result['tables']['oauth2_tokens']['batches']).to(equal(2))
+            expect(result['tables']['oauth2_revocations']['rows']).to(equal(1))
+
+            remaining = {t.access_token for t in OAuth2Token.query.filter(
+                OAuth2Token.access_token.in_(expired + [refreshable, recent]))}
+            expect(remaining).to(equal({refreshable, recent}))
+
+    def test_only_one_process_purges_at_a_time(self, app):
+        with app.app_context():
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                try:
+                    purger = ExpiredRowPurger(db.engine)
+                    expect(purger.run()).to(equal({'skipped': True}))
+                    expect(purger.last_run).to(be_none)
+                finally:
+                    connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
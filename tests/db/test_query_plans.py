@@ -0,0 +1,64 @@
+"""Query plan regression tests.
+
+Each hot lookup is planned with sequential scans disabled. If no index can serve it the planner still
+has to fall back to a sequential scan, so the tests keep working on the tiny test tables.
+
+"""
+
+import pytest
+from expects import be_empty, expect
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from authserver.db import (AuthorizedClient, OAuth2AuthorizationCode, OAuth2Client, OAuth2Token,
+                           PasswordRecovery, RevocationLogEntry, Role, Scope, User, db)
+
+HOT_QUERIES = {
+    'token by access token': lambda: OAuth2Token.query.filter_by(access_token='token'),
+    'token by refresh token': lambda: OAuth2Token.query.filter_by(refresh_token='token'),
+    'tokens of a user': lambda: OAuth2Token.query.filter_by(user_id='user'),
+    'tokens of a client': lambda: OAuth2Token.query.filter_by(client_id='client'),
+    'reusable client token': lambda: OAuth2Token.query.filter(
+        OAuth2Token.client_id == 'client', OAuth2Token.scope == '', OAuth2Token.revoked == False,  # noqa: E712
+        OAuth2Token.user_id == None).order_by(OAuth2Token.issued_at.desc()).limit(1),  # noqa: E711
+    'client by client id': lambda: OAuth2Client.query.filter_by(client_id='client'),
+    'clients of a user': lambda: OAuth2Client.query.filter_by(user_id='user'),
+    'authorization code': lambda: OAuth2AuthorizationCode.query.filter_by(code='code', client_id='client'),
+    'authorized client': lambda: AuthorizedClient.query.filter_by(user_id='user', client_id='client', authorized=True),
+    'user by person id': lambda: User.query.filter_by(person_id='person'),
+    'user by username': lambda: User.query.filter_by(username='user'),
+    'password recovery nonce': lambda: PasswordRecovery.query.filter_by(nonce='nonce'),
+    'revocations since cursor': lambda: RevocationLogEntry.query.filter(
+        RevocationLogEntry.id > 100, RevocationLogEntry.expires_at > 0).order_by(RevocationLogEntry.id).limit(1000),
+    'unexpired revocations': lambda: RevocationLogEntry.query.filter(RevocationLogEntry.expires_at > 2000000000),
+    'page of users': lambda: User.query.filter(User.id > 'user').order_by(User.id).limit(101),
+    'page of clients': lambda: OAuth2Client.query.filter(OAuth2Client.id > 'client').order_by(OAuth2Client.id).limit(101),
+    'page of roles': lambda: Role.query.filter(Role.id > 'role').order_by(Role.id).limit(101),
+    'page of scopes': lambda: Scope.query.filter(Scope.id > 'scope').order_by(Scope.id).limit(101),
+    'purge expired tokens': lambda: OAuth2Token.query.filter(
+        OAuth2Token.issued_at + OAuth2Token.expires_in * 2 < 100).limit(1000),
+    'purge expired codes': lambda: OAuth2AuthorizationCode.query.filter(OAuth2AuthorizationCode.auth_time < 100).limit(1000),
+    'purge expired recovery nonces': lambda: PasswordRecovery.query.filter(
+        PasswordRecovery.expiration_date < '2000-01-01').limit(1000)
+}
+
+
+def _sequential_scans(plan: dict) -> list:
+    scans = [plan['Relation Name']] if plan['Node Type'] == 'Seq Scan' else []
+    for child in plan.get('Plans', []):
+        scans.extend(_sequential_scans(child))
+    return scans
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize('name', HOT_QUERIES.keys())
+    def test_hot_query_uses_an_index(self, app, name):
+        with app.app_context():
+            query = HOT_QUERIES[name]()
+            sql = str(query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+            with db.engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(text('SET LOCAL enable_seqscan = off'))
+                    plan = connection.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+
+            expect(_sequential_scans(plan[0]['Plan'])).to(be_empty)
@@ -0,0 +1,65 @@
+"""Unit tests for the permissions service cache."""
+
+from threading import Event, Thread
+
+from expects import be_true, equal, expect
+
+from authserver.oauth2 import PermissionsCache
+
+
+class TestPermissionsCache:
+    def test_fresh_entries_are_served_from_cache(self):
+        calls = []
+
+        def fetch(person_id):
+            calls.append(person_id)
+            return {'role': 'admin'}
+
+        cache = PermissionsCache(ttl=60)
+        expect(cache.get('p1', fetch)).to(equal({'role': 'admin'}))
+        expect(cache.get('p1', fetch)).to(equal({'role': 'admin'}))
+        expect(calls).to(equal(['p1']))
+
+    def test_concurrent_misses_share_one_fetch(self):
+        release = Event()
+        calls = []
+
+        def fetch(person_id):
+            calls.append(person_id)
+            release.wait(5)
+            return {'role': 'viewer'}
+
+        cache = PermissionsCache(ttl=60)
+        results = []
+        threads = [Thread(target=lambda: results.append(cache.get('p1', fetch))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        expect(len(calls)).to(equal(1))
+        expect(results).to(equal([{'role': 'viewer'}] * 5))
+
+    def test_stale_entry_served_on_error(self):
+        cache = PermissionsCache(ttl=0, stale_ttl=0)
+        expect(cache.get('p1', lambda _: {'role': 'admin'})).to(equal({'role': 'admin'}))
+
+        def failing_fetch(person_id):
+            raise ConnectionError('permissions service is down')
+
+        expect(cache.get('p1', failing_fetch)).to(equal({'role': 'admin'}))
+        expect(cache.get('p2', failing_fetch)).to(equal({}))
+        expect(cache.stats()['served_stale_on_error']).to(equal(1))
+
+    def test_invalidate(self):
+        calls = []
+
+        def fetch(person_id):
+            calls.append(person_id)
+            return {'call': len(calls)}
+
+        cache = PermissionsCache(ttl=60)
+        cache.get('p1', fetch)
+        expect(cache.invalidate('p1')).to(be_true)
+        expect(cache.get('p1', fetch)).to(equal({'call': 2}))
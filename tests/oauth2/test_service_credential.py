@@ -0,0 +1,48 @@
+"""Unit tests for the cached service JWT."""
+
+import time
+
+import jwt
+from expects import equal, expect
+
+from authserver.oauth2 import ServiceCredential
+
+
+def _minter(lifetime):
+    minted = []
+
+    def mint():
+        minted.append(1)
+        return jwt.encode({'n': len(minted), 'exp': int(time.time()) + lifetime}, 'secret', algorithm='HS256')
+
+    return mint, minted
+
+
+class TestServiceCredential:
+    def test_reused_until_refresh_margin(self):
+        mint, minted = _minter(3600)
+        credential = ServiceCredential(refresh_margin=60)
+
+        first = credential.get(mint)
+        expect(credential.get(mint)).to(equal(first))
+        expect(len(minted)).to(equal(1))
+
+    def test_minted_again_when_nearly_expired(self):
+        mint, minted = _minter(10)
+        credential = ServiceCredential(refresh_margin=5, min_remaining=30)
+
+        credential.get(mint)
+        credential.get(mint)
+        expect(len(minted)).to(equal(2))
+
+    def test_refreshed_in_background_within_margin(self):
+        mint, minted = _minter(120)
+        credential = ServiceCredential(refresh_margin=300, min_remaining=30)
+
+        first = credential.get(mint)
+        expect(credential.get(mint)).to(equal(first))
+        for _ in range(50):
+            if len(minted) == 2:
+                break
+            time.sleep(0.01)
+        expect(len(minted)).to(equal(2))
@@ -0,0 +1,133 @@
+"""Unit tests for the token lookup cache shared between workers."""
+
+import multiprocessing
+import os
+import time
+
+from expects import be_none, equal, expect
+
+from authserver.db import OAuth2Token
+from authserver.oauth2 import SharedTokenCache
+
+
+def _token(access_token, user_id=None, client_id='client-1', expires_in=300):
+    return OAuth2Token(id=1, access_token=access_token, user_id=user_id, client_id=client_id, token_type='Bearer',
+                       scope='read write', revoked=False, issued_at=int(time.time()), expires_in=expires_in)
+
+
+def _fail(token_string):
+    raise AssertionError(f'{token_string} was loaded from the database')
+
+
+def _invalidate_in_other_process(path, token_string):
+    SharedTokenCache(path, slots=64).invalidate(token_string)
+
+
+class TestSharedTokenCache:
+    def test_hits_are_served_from_the_shared_table(self, tmp_path):
+        path = str(tmp_path / 'token-cache')
+        cache = SharedTokenCache(path, slots=64)
+        cache.get('abc', lambda t: _token(t, user_id='user-1'))
+
+        token = SharedTokenCache(path, slots=64).get('abc', _fail)
+        expect(token.access_token).to(equal('abc'))
+        expect(token.user_id).to(equal('user-1'))
+        expect(token.client_id).to(equal('client-1'))
+        expect(token.scope).to(equal('read write'))
+        expect(token.get_expires_at() > time.time()).to(equal(True))
+
+    def test_unknown_and_expired_tokens(self, tmp_path):
+        calls = []
+
+        def load(token_string):
+            calls.append(token_string)
+            return _token(token_string, expires_in=0) if token_string == 'expired' else None
+
+        cache = SharedTokenCache(str(tmp_path / 'token-cache'), slots=64, negative_ttl=60)
+        expect(cache.get('nope', load)).to(be_none)
+        expect(cache.get('nope', load)).to(be_none)
+        cache.get('expired', load)
+        cache.get('expired', load)
+        expect(calls).to(equal(['nope', 'expired', 'expired']))
+        expect(cache.stats()['negative_hits']).to(equal(1))
+
+    def test_get_many_loads_only_uncached_tokens(self, tmp_path):
+        batches = []
+
+        def load_many(token_strings):
+            batches.append(token_strings)
+            return {t: _token(t) for t in token_strings if t != 'nope'}
+
+        cache = SharedTokenCache(str(tmp_path / 'token-cache'), slots=64)
+        cache.get('a', lambda t: _token(t))
+        tokens = cache.get_many(['a', 'b', 'nope'], load_many)
+        expect(batches).to(equal([['b', 'nope']]))
+        expect(tokens['b'].access_token).to(equal('b'))
+        expect(tokens['nope']).to(be_none)
+
+        cache.get_many(['a', 'b', 'nope'], load_many)
+        expect(len(batches)).to(equal(1))
+
+    def test_invalidation_is_visible_to_other_processes(self, tmp_path):
+        path = str(tmp_path / 'token-cache')
+        cache = SharedTokenCache(path, slots=64)
+        cache.get('a', lambda t: _token(t, user_id='user-1'))
+        cache.get('b', lambda t: _token(t, client_id='client-2'))
+
+        process = multiprocessing.get_context('fork').Process(target=_invalidate_in_other_process, args=(path, 'a'))
+        process.start()
+        process.join()
+
+        expect(cache.get('a', lambda t: None)).to(be_none)
+        expect(cache.invalidate_client('client-2')).to(equal(1))
+        expect(cache.get('b', lambda t: None)).to(be_none)
+
+    def test_invalidate_users(self, tmp_path):
+        cache = SharedTokenCache(str(tmp_path / 'token-cache'), slots=64)
+        for token_string, user_id in (('a', 'user-1'), ('b', 'user-2'), ('c', 'user-3')):
+            cache.get(token_string, lambda t: _token(t, user_id=user_id))
+
+        expect(cache.invalidate_users(['user-1', 'user-3', 'user-4'])).to(equal(2))
+        expect(cache.get('a', lambda t: None)).to(be_none)
+        expect(cache.get('b', _fail).user_id).to(equal('user-2'))
+
+    def test_stale_loads_are_not_stored_after_an_invalidation(self, tmp_path):
+        cache = SharedTokenCache(str(tmp_path / 'token-cache'), slots=64)
+
+        def load_then_revoke(token_string):
+            # Another worker revokes the token while this one is still reading it from the database.
+            cache.invalidate(token_string)
+            return _token(token_string)
+
+        cache.get('a', load_then_revoke)
+        calls = []
+        cache.get('a', lambda t: calls.append(t) or _token(t))
+        expect(calls).to(equal(['a']))
+
+    def test_stale_loads_are_not_stored_after_invalidating_their_user(self, tmp_path):
+        cache = SharedTokenCache(str(tmp_path / 'token-cache'), slots=64)
+
+        def load_then_deactivate(token_string):
+            # The user is deactivated while this worker is reading a token of theirs that is not cached yet.
+            cache.invalidate_user('user-1')
+            return _token(token_string, user_id='user-1')
+
+        cache.get('a', load_then_deactivate)
+        calls = []
+        cache.get('a', lambda t: calls.append(t) or _token(t, user_id='user-1'))
+        expect(calls).to(equal(['a']))
+
+    def test_a_different_layout_uses_a_new_file(self, tmp_path):
+        path = str(tmp_path / 'token-cache')
+        old = SharedTokenCache(path, slots=64)
+        old.get('a', _token)
+        old_inode = os.stat(old.path).st_ino
+        with open(old.path, 'r+b') as f:
+            # Left behind by an earlier version of the table.
+            f.write(b'XXXX')
+
+        new = SharedTokenCache(path, slots=64)
+
+        expect(os.stat(new.path).st_ino).not_to(equal(old_inode))
+        expect(old.get('a', _fail).access_token).to(equal('a'))
+        expect(SharedTokenCache(path, slots=128).path).not_to(equal(new.path))
@@ -0,0 +1,131 @@
+"""Unit tests for the JWT signing key manager."""
+
+import os
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from expects import be, be_none, equal, expect, have_key, have_keys, raise_error
+
+from authserver.oauth2 import SigningKeyError, SigningKeyManager, set_signing_key_manager
+from authserver.oauth2.rfc6749.authorization_server import BrighthiveJWT
+
+
+def _write_key(path, private_key):
+    with open(path, 'wb') as fh:
+        fh.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()))
+    return private_key
+
+
+def _write_rsa_key(path):
+    return _write_key(path, rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend()))
+
+
+class TestSigningKeyManager:
+    def test_sign_with_kid(self, tmp_path):
+        key_path = str(tmp_path / 'jwtRS256.key')
+        private_key = _write_rsa_key(key_path)
+        manager = SigningKeyManager(private_key_path=key_path)
+
+        token = manager.sign({'sub': 'abc'})
+        header = jwt.get_unverified_header(token)
+        expect(header['kid']).to(equal(manager.active_key.kid))
+        expect(header['alg']).to(equal('RS256'))
+
+        claims = jwt.decode(token, private_key.public_key(), algorithms=['RS256'])
+        expect(claims['sub']).to(equal('abc'))
+        expect(manager.stats()['sign_count']).to(equal(1))
+
+    def test_hot_reload_and_rotation(self, tmp_path):
+        key_path = str(tmp_path / 'active.key')
+        old_path = str(tmp_path / 'previous.key')
+        _write_rsa_key(key_path)
+        _write_rsa_key(old_path)
+        manager = SigningKeyManager(private_key_path=key_path, additional_key_paths=[old_path], reload_interval=0)
+        first_kid = manager.active_key.kid
+        expect(len(manager.keys())).to(equal(2))
+
+        # Replace the active key on disk; the manager should pick it up without a restart.
+        new_private_key = _write_rsa_key(key_path)
+        stat = os.stat(key_path)
+        os.utime(key_path, (stat.st_atime, stat.st_mtime + 10))
+
+        token = manager.sign({'sub': 'abc'})
+        expect(manager.active_key.kid).not_to(equal(first_kid))
+        expect(manager.get_key(first_kid)).to(be_none)
+        claims = jwt.decode(token, new_private_key.public_key(), algorithms=['RS256'])
+        expect(claims).to(have_key('sub'))
+
+    def test_missing_key_file_keeps_previous_key(self, tmp_path):
+        key_path = str(tmp_path / 'jwtRS256.key')
+        _write_rsa_key(key_path)
+        manager = SigningKeyManager(private_key_path=key_path, reload_interval=0)
+        kid = manager.active_key.kid
+
+        os.remove(key_path)
+        expect(manager.active_key.kid).to(equal(kid))
+        expect(manager.sign({}) is not None).to(be(True))
+
+    def test_algorithm_selection_and_jwks(self, tmp_path):
+        rsa_path = str(tmp_path / 'jwtRS256.key')
+        ec_path = str(tmp_path / 'jwtES256.key')
+        ed_path = str(tmp_path / 'jwtEdDSA.key')
+        _write_rsa_key(rsa_path)
+        ec_key = _write_key(ec_path, ec.generate_private_key(ec.SECP256R1(), backend=default_backend()))
+        ed_key = _write_key(ed_path, ed25519.Ed25519PrivateKey.generate())
+        manager = SigningKeyManager(private_key_path=rsa_path, additional_key_paths=[ec_path, ed_path], algorithm='ES256')
+
+        token = manager.sign({'sub': 'abc'})
+        expect(jwt.get_unverified_header(token)['alg']).to(equal('ES256'))
+        expect(jwt.decode(token, ec_key.public_key(), algorithms=['ES256'])['sub']).to(equal('abc'))
+
+        token = manager.sign({'sub': 'abc'}, algorithm='EdDSA')
+        expect(jwt.decode(token, ed_key.public_key(), algorithms=['EdDSA'])['sub']).to(equal('abc'))
+
+        jwks = manager.jwks()['keys']
+        expect([k['alg'] for k in jwks]).to(equal(['RS256', 'ES256', 'EdDSA']))
+        expect(jwks[1]).to(have_keys(kty='EC', crv='P-256', use='sig'))
+        expect(jwks[2]).to(have_keys(kty='OKP', crv='Ed25519'))
+        expect(len({k['kid'] for k in jwks})).to(equal(3))
+
+    def test_unknown_algorithm(self, tmp_path):
+        key_path = str(tmp_path / 'jwtRS256.key')
+        _write_rsa_key(key_path)
+        manager = SigningKeyManager(private_key_path=key_path)
+        expect(lambda: manager.sign({}, algorithm='ES256')).to(raise_error(SigningKeyError))
+
+    def test_jwt_for_an_audience_uses_its_algorithm(self, tmp_path):
+        rsa_path = str(tmp_path / 'jwtRS256.key')
+        ed_path = str(tmp_path / 'jwtEdDSA.key')
+        _write_rsa_key(rsa_path)
+        _write_key(ed_path, ed25519.Ed25519PrivateKey.generate())
+        manager = SigningKeyManager(private_key_path=rsa_path, additional_key_paths=[ed_path],
+                                    audience_algorithms={'brighthive-permissions-service': 'EdDSA'})
+        set_signing_key_manager(manager)
+        try:
+            brighthive_jwt = BrighthiveJWT()
+            token = brighthive_jwt.make_jwt({'sub': 'abc'}, audience='brighthive-permissions-service')
+            expect(jwt.get_unverified_header(token)['alg']).to(equal('EdDSA'))
+            expect(jwt.get_unverified_header(brighthive_jwt.make_jwt({'sub': 'abc'}))['alg']).to(equal('RS256'))
+        finally:
+            set_signing_key_manager(None)
+
+    def test_audience_algorithm_without_a_loaded_key_falls_back_to_the_default(self, tmp_path):
+        rsa_path = str(tmp_path / 'jwtRS256.key')
+        ed_path = str(tmp_path / 'jwtEdDSA.key')
+        _write_rsa_key(rsa_path)
+        manager = SigningKeyManager(private_key_path=rsa_path, additional_key_paths=[ed_path], reload_interval=0,
+                                    audience_algorithms={'brighthive-permissions-service': 'EdDSA'})
+        set_signing_key_manager(manager)
+        try:
+            token = BrighthiveJWT().make_jwt({'sub': 'abc'}, audience='brighthive-permissions-service')
+            expect(jwt.get_unverified_header(token)['alg']).to(equal('RS256'))
+
+            _write_key(ed_path, ed25519.Ed25519PrivateKey.generate())
+            expect(manager.algorithm_for_audience('brighthive-permissions-service')).to(equal('EdDSA'))
+        finally:
+            set_signing_key_manager(None)
@@ -0,0 +1,54 @@
+"""Unit tests for stateless access tokens."""
+
+from types import SimpleNamespace
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import rsa
+from expects import be_false, be_none, be_true, equal, expect
+
+from authserver.oauth2 import SigningKey, SigningKeyManager, StatelessTokens, is_stateless_token
+
+
+def _key_manager():
+    manager = SigningKeyManager()
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    manager.add_key(SigningKey(private_key), active=True)
+    return manager
+
+
+class TestStatelessTokens:
+    def test_issue_and_verify(self):
+        tokens = StatelessTokens(_key_manager())
+        access_token = tokens.issue(SimpleNamespace(client_id='client-1'), 'read write', 300)
+        expect(is_stateless_token(access_token)).to(be_true)
+
+        token = tokens.verify(access_token)
+        expect(token.client_id).to(equal('client-1'))
+        expect(token.get_scope()).to(equal('read write'))
+        expect(token.revoked).to(be_false)
+        expect(token.is_access_token_expired()).to(be_false)
+        expect(token.get_expires_at()).to(equal(token.issued_at + 300))
+
+    def test_rejects_tampered_and_foreign_tokens(self):
+        manager = _key_manager()
+        tokens = StatelessTokens(manager)
+        access_token = tokens.issue(SimpleNamespace(client_id='client-1'), '', 300)
+
+        header, payload, signature = access_token.split('.')
+        expect(tokens.verify(f'{header}.{payload}.{signature[::-1]}')).to(be_none)
+        # JWTs signed with the same keys for other purposes are not access tokens.
+        expect(tokens.verify(manager.sign({'client_id': 'client-1', 'jti': 'x', 'iat': 0, 'exp': 1}))).to(be_none)
+        expect(StatelessTokens(_key_manager()).verify(access_token)).to(be_none)
+        expect(is_stateless_token('0123456789abcdef')).to(be_false)
+
+    def test_expired_and_revoked(self):
+        tokens = StatelessTokens(_key_manager())
+        client = SimpleNamespace(client_id='client-1')
+
+        expired = tokens.verify(tokens.issue(client, '', -1))
+        expect(expired.is_access_token_expired()).to(be_true)
+
+        access_token = tokens.issue(client, '', 300)
+        expect(tokens.revoke(tokens.verify(access_token))).to(be_true)
+        expect(tokens.verify(access_token).revoked).to(be_true)
+        expect(tokens.stats()['revoked']).to(equal(1))
@@ -0,0 +1,113 @@
+"""Unit tests for the validated token cache."""
+
+import time
+from unittest.mock import patch
+
+from expects import be_none, equal, expect
+
+from authserver.db import OAuth2Token
+from authserver.oauth2 import TokenCache
+
+
+def _token(access_token, user_id=None, client_id='client-1', expires_in=300):
+    return OAuth2Token(id=1, access_token=access_token, user_id=user_id, client_id=client_id, token_type='Bearer',
+                       scope='', revoked=False, issued_at=int(time.time()), expires_in=expires_in)
+
+
+class TestTokenCache:
+    def test_hits_are_served_from_memory(self):
+        calls = []
+
+        def load(token_string):
+            calls.append(token_string)
+            return _token(token_string)
+
+        cache = TokenCache()
+        expect(cache.get('abc', load).access_token).to(equal('abc'))
+        expect(cache.get('abc', load).access_token).to(equal('abc'))
+        expect(calls).to(equal(['abc']))
+        expect(cache.stats()['hits']).to(equal(1))
+
+    def test_unknown_tokens_are_cached_briefly(self):
+        calls = []
+
+        def load(token_string):
+            calls.append(token_string)
+            return None
+
+        cache = TokenCache(negative_ttl=60)
+        expect(cache.get('nope', load)).to(be_none)
+        expect(cache.get('nope', load)).to(be_none)
+        expect(len(calls)).to(equal(1))
+        expect(cache.stats()['negative_hits']).to(equal(1))
+
+        cache = TokenCache(negative_ttl=0)
+        cache.get('nope', load)
+        cache.get('nope', load)
+        expect(len(calls)).to(equal(3))
+
+    def test_entries_expire_with_the_token(self):
+        calls = []
+
+        def load(token_string):
+            calls.append(token_string)
+            return _token(token_string, expires_in=0)
+
+        cache = TokenCache()
+        cache.get('abc', load)
+        cache.get('abc', load)
+        expect(len(calls)).to(equal(2))
+
+    def test_invalidation(self):
+        cache = TokenCache()
+        cache.get('a', lambda t: _token(t, user_id='user-1'))
+        cache.get('b', lambda t: _token(t, user_id='user-2', client_id='client-2'))
+        cache.get('c', lambda t: _token(t, user_id='user-3'))
+
+        expect(cache.invalidate('a')).to(equal(True))
+        expect(cache.invalidate_client('client-2')).to(equal(1))
+        expect(cache.invalidate_user('user-3')).to(equal(1))
+        expect(cache.stats()['size']).to(equal(0))
+
+    def test_invalidate_users(self):
+        cache = TokenCache()
+        for token_string, user_id in (('a', 'user-1'), ('b', 'user-2'), ('c', 'user-3')):
+            cache.get(token_string, lambda t: _token(t, user_id=user_id))
+
+        expect(cache.invalidate_users(['user-1', 'user-3', 'user-4'])).to(equal(2))
+        expect(cache.stats()['size']).to(equal(1))
+
+    def test_get_many_loads_only_uncached_tokens(self):
+        batches = []
+
+        def load_many(token_strings):
+            batches.append(token_strings)
+            return {t: _token(t) for t in token_strings if t != 'nope'}
+
+        cache = TokenCache()
+        cache.get('a', lambda t: _token(t))
+        tokens = cache.get_many(['a', 'b', 'nope'], load_many)
+        expect(batches).to(equal([['b', 'nope']]))
+        expect(tokens['b'].access_token).to(equal('b'))
+        expect(tokens['nope']).to(be_none)
+
+        cache.get_many(['a', 'b', 'nope'], load_many)
+        expect(len(batches)).to(equal(1))
+
+    def test_revocation_in_another_worker_is_seen_within_the_max_ttl(self):
+        database = {'abc': _token('abc', user_id='user-1')}
+
+        def load(token_string):
+            return database.get(token_string)
+
+        revoking_worker, other_worker = TokenCache(max_ttl=5), TokenCache(max_ttl=5)
+        revoking_worker.get('abc', load)
+        other_worker.get('abc', load)
+
+        database['abc'] = _token('abc', user_id='user-1')
+        database['abc'].revoked = True
+        revoking_worker.invalidate('abc')
+        expect(revoking_worker.get('abc', load).revoked).to(equal(True))
+
+        with patch('time.time', return_value=time.time() + 6):
+            expect(other_worker.get('abc', load).revoked).to(equal(True))
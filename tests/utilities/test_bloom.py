@@ -0,0 +1,36 @@
+"""Unit tests for the Bloom filter."""
+
+import base64
+import hashlib
+
+from expects import be_below, equal, expect
+
+from authserver.utilities.bloom import BloomFilter
+
+
+def _published_contains(published, value):
+    # The lookup a resource server performs on the published filter.
+    bits = base64.b64decode(published['bits'])
+    digest = hashlib.sha256(value.encode('utf-8')).digest()
+    h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:16], 'big')
+    positions = ((h1 + i * h2) % published['size'] for i in range(published['hashes']))
+    return all(bits[n // 8] & (1 << (n % 8)) for n in positions)
+
+
+class TestBloomFilter:
+    def test_members_and_false_positives(self):
+        bloom = BloomFilter(1000, false_positive_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'member-{i}')
+
+        expect(all(f'member-{i}' in bloom for i in range(1000))).to(equal(True))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        expect(false_positives).to(be_below(300))
+
+    def test_published_filter(self):
+        bloom = BloomFilter(10)
+        bloom.add('revoked')
+        published = bloom.to_dict()
+        expect(published['count']).to(equal(1))
+        expect(_published_contains(published, 'revoked')).to(equal(True))
+        expect(_published_contains(published, 'not-revoked')).to(equal(False))
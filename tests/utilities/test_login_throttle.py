@@ -0,0 +1,97 @@
+"""Unit tests for login throttling."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+from expects import be_above, equal, expect
+
+from authserver.utilities.login_throttle import LoginThrottle, LoginThrottled
+
+
+class TestLoginThrottle:
+    def test_refuses_a_username_over_its_limit(self):
+        throttle = LoginThrottle(ip_limit=0, username_limit=3, delay_after=10)
+        for _ in range(3):
+            throttle.attempt('10.0.0.1', 'greg_henry')
+
+        with pytest.raises(LoginThrottled) as e:
+            throttle.attempt('10.0.0.2', 'Greg_Henry')
+
+        expect(e.value.retry_after).to(be_above(0))
+        expect(throttle.attempt('10.0.0.2', 'someone_else')).to(equal(0))
+        expect(throttle.stats()['throttled_username']).to(equal(1))
+
+    def test_refuses_an_ip_over_its_limit(self):
+        throttle = LoginThrottle(ip_limit=2, username_limit=0, delay_after=10)
+        throttle.attempt('10.0.0.1', 'user_1')
+        throttle.attempt('10.0.0.1', 'user_2')
+
+        with pytest.raises(LoginThrottled):
+            throttle.attempt('10.0.0.1', 'user_3')
+        expect(throttle.stats()['throttled_ip']).to(equal(1))
+
+    def test_delays_progressively(self):
+        throttle = LoginThrottle(ip_limit=0, username_limit=0, delay_after=2, delay_max=2)
+        delays = [throttle.attempt('10.0.0.1', 'greg_henry') for _ in range(7)]
+
+        expect(delays).to(equal([0, 0, 0.25, 0.5, 1, 2, 2]))
+        expect(throttle.stats()['delayed']).to(equal(5))
+
+    def test_success_clears_the_username(self):
+        throttle = LoginThrottle(ip_limit=0, username_limit=2, delay_after=10)
+        throttle.attempt('10.0.0.1', 'greg_henry')
+        throttle.attempt('10.0.0.1', 'greg_henry')
+        throttle.succeeded('10.0.0.1', 'greg_henry')
+
+        throttle.attempt('10.0.0.1', 'greg_henry')
+
+    def test_successful_logins_do_not_count_against_the_ip(self):
+        throttle = LoginThrottle(ip_limit=2, username_limit=0, delay_after=1)
+        for i in range(5):
+            expect(throttle.attempt('10.0.0.1', f'user_{i}')).to(equal(0))
+            throttle.succeeded('10.0.0.1', f'user_{i}')
+
+        throttle.attempt('10.0.0.1', 'user_5')
+        throttle.attempt('10.0.0.1', 'user_6')
+        with pytest.raises(LoginThrottled):
+            throttle.attempt('10.0.0.1', 'user_7')
+
+    def test_counts_slide_out_of_the_window(self):
+        throttle = LoginThrottle(ip_limit=0, username_limit=2, window=60, delay_after=10)
+        with patch('authserver.utilities.login_throttle.time.time', return_value=6010.0):
+            throttle.attempt('10.0.0.1', 'greg_henry')
+            throttle.attempt('10.0.0.1', 'greg_henry')
+            with pytest.raises(LoginThrottled):
+                throttle.attempt('10.0.0.1', 'greg_henry')
+        with patch('authserver.utilities.login_throttle.time.time', return_value=6100.0):
+            # Two thirds of the previous fixed window have slid out, leaving an estimate of 0.67 attempts.
+            throttle.attempt('10.0.0.1', 'greg_henry')
+            throttle.attempt('10.0.0.1', 'greg_henry')
+            with pytest.raises(LoginThrottled):
+                throttle.attempt('10.0.0.1', 'greg_henry')
+
+    def test_shares_counts_through_a_file(self, tmp_path):
+        path = str(tmp_path / 'login-throttle')
+        first = LoginThrottle(ip_limit=0, username_limit=2, delay_after=10, path=path, slots=64)
+        second = LoginThrottle(ip_limit=0, username_limit=2, delay_after=10, path=path, slots=64)
+        first.attempt('10.0.0.1', 'greg_henry')
+        second.attempt('10.0.0.2', 'greg_henry')
+
+        with pytest.raises(LoginThrottled):
+            first.attempt('10.0.0.3', 'greg_henry')
+
+    def test_a_different_layout_replaces_the_file_instead_of_resizing_it(self, tmp_path):
+        path = str(tmp_path / 'login-throttle')
+        old = LoginThrottle(ip_limit=0, username_limit=1, delay_after=10, path=path, slots=64)
+        old.attempt('10.0.0.1', 'greg_henry')
+        old_inode = os.stat(old.path).st_ino
+
+        new = LoginThrottle(ip_limit=0, username_limit=1, window=60, delay_after=10, path=path, slots=64)
+
+        expect(os.stat(new.path).st_ino).not_to(equal(old_inode))
+        new.attempt('10.0.0.1', 'greg_henry')
+        with pytest.raises(LoginThrottled):
+            # The old mapping still works, on the replaced file.
+            old.attempt('10.0.0.1', 'greg_henry')
+        expect(os.listdir(str(tmp_path))).to(equal([os.path.basename(new.path)]))
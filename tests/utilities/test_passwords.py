@@ -0,0 +1,75 @@
+"""Unit tests for password hashing."""
+
+import threading
+
+import bcrypt
+import pytest
+from expects import be_false, be_true, equal, expect
+
+from authserver.utilities.passwords import PasswordHasher, PasswordHasherBusy, hash_passwords, hash_rounds
+
+
+class TestHashPasswords:
+    def test_hashes_in_order_across_processes(self):
+        passwords = [f'password-{i}' for i in range(6)]
+        hashes = hash_passwords(passwords, workers=2)
+
+        expect(len(hashes)).to(equal(6))
+        expect(all(bcrypt.checkpw(p.encode('utf-8'), h.encode('utf-8')) for p, h in zip(passwords, hashes))).to(be_true)
+
+    def test_hashes_inline_with_one_worker(self):
+        [password_hash] = hash_passwords(['password'], workers=4)
+        expect(bcrypt.checkpw(b'password', password_hash.encode('utf-8'))).to(be_true)
+
+    def test_hashes_at_the_given_cost(self):
+        [password_hash] = hash_passwords(['password'], workers=1, rounds=5)
+        expect(hash_rounds(password_hash)).to(equal(5))
+
+
+class TestPasswordHasher:
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(workers=2, max_queue=4)
+        password_hash = hasher.hash('password')
+
+        expect(hasher.verify('password', password_hash)).to(be_true)
+        expect(hasher.verify('wrong', password_hash)).to(be_false)
+        expect(hasher.verify('password', 'not a hash')).to(be_false)
+        stats = hasher.stats()
+        expect((stats['completed'], stats['pending'], stats['rejected'])).to(equal((4, 0, 0)))
+
+    def test_refuses_work_beyond_the_queue(self):
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+        blocked = [threading.Thread(target=hasher._run, args=(release.wait,)) for _ in range(2)]
+        for thread in blocked:
+            thread.start()
+        while hasher.stats()['pending'] < 2:
+            release.wait(0.01)
+
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('password')
+
+        release.set()
+        for thread in blocked:
+            thread.join()
+        expect(hasher.stats()['rejected']).to(equal(1))
+        expect(hasher.stats()['max_pending']).to(equal(2))
+        expect(hasher.verify('password', hasher.hash('password'))).to(be_true)
+
+    def test_rehashes_hashes_made_at_another_cost(self):
+        hasher = PasswordHasher(workers=1, max_queue=1, rounds=5)
+        old_hash = bcrypt.hashpw(b'password', bcrypt.gensalt(4)).decode('utf-8')
+        expect(hasher.needs_rehash(old_hash)).to(be_true)
+        expect(hasher.needs_rehash(hasher.hash('password'))).to(be_false)
+        expect(hasher.needs_rehash('not a hash')).to(be_false)
+
+        stored = []
+        hasher.rehash_later('password', stored.append)
+        for _ in range(500):
+            if hasher.stats()['rehashed']:
+                break
+            threading.Event().wait(0.01)
+
+        expect(hash_rounds(stored[0])).to(equal(5))
+        expect(hasher.verify('password', stored[0])).to(be_true)
+        expect(hasher.stats()['rehashed']).to(equal(1))
@@ -0,0 +1,72 @@
+"""Unit tests for the permissions service client."""
+
+import pytest
+import requests
+from expects import equal, expect, raise_error
+
+from authserver.config import ConfigurationFactory
+from authserver.utilities.circuit_breaker import CircuitBreaker, CircuitOpenError
+from authserver.utilities.permissions_service import PermissionsServiceError, RequestsPermissionsService
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(str(self.status_code), response=self)
+
+
+@pytest.fixture
+def permissions_service():
+    config = ConfigurationFactory.get_config('TESTING')
+    config.permission_service_url = 'http://permissions.local'
+    config.permissions_service_backoff = 0
+    config.permissions_service_breaker_min_calls = 2
+    config.permissions_service_breaker_window = 2
+    return RequestsPermissionsService(config)
+
+
+class TestPermissionsService:
+    def test_retries_server_errors(self, permissions_service, mocker):
+        responses = [FakeResponse(503), FakeResponse(200, {'response': {'role': 'admin'}})]
+        get = mocker.patch.object(permissions_service.session, 'get', side_effect=lambda *a, **kw: responses.pop(0))
+
+        expect(permissions_service.get_permissions('p1', 'token')).to(equal({'role': 'admin'}))
+        expect(get.call_count).to(equal(2))
+        expect(get.call_args[1]['timeout']).to(equal(permissions_service.timeout))
+
+    def test_breaker_opens_and_fails_fast(self, permissions_service, mocker):
+        get = mocker.patch.object(permissions_service.session, 'get', side_effect=requests.exceptions.ConnectTimeout())
+
+        for _ in range(2):
+            expect(lambda: permissions_service.get_permissions('p1', 'token')).to(raise_error(PermissionsServiceError))
+        calls = get.call_count
+
+        expect(lambda: permissions_service.get_permissions('p1', 'token')).to(raise_error(CircuitOpenError))
+        expect(get.call_count).to(equal(calls))
+        expect(permissions_service.stats()['breaker']['state']).to(equal(CircuitBreaker.OPEN))
+
+    def test_client_errors_do_not_open_the_breaker(self, permissions_service, mocker):
+        get = mocker.patch.object(permissions_service.session, 'get', return_value=FakeResponse(404))
+
+        for _ in range(3):
+            expect(lambda: permissions_service.get_permissions('p1', 'token')).to(raise_error(PermissionsServiceError))
+
+        expect(get.call_count).to(equal(3))
+        expect(permissions_service.stats()['breaker']['state']).to(equal(CircuitBreaker.CLOSED))
+        expect(permissions_service.stats()['failures']).to(equal(3))
+
+    def test_breaker_half_open_trial(self):
+        breaker = CircuitBreaker(error_threshold=0.5, min_calls=1, window_size=1, reset_timeout=0)
+        breaker.record_failure()
+        expect(breaker.state).to(equal(CircuitBreaker.HALF_OPEN))
+        expect(breaker.allow()).to(equal(True))
+        expect(breaker.allow()).to(equal(False))
+        breaker.record_success()
+        expect(breaker.state).to(equal(CircuitBreaker.CLOSED))
@@ -0,0 +1,68 @@
+"""Unit tests for query budgets."""
+
+import pytest
+from expects import equal, expect
+from flask import Flask
+from flask_restful import Api, Resource
+from sqlalchemy import create_engine, text
+
+from authserver.utilities.query_budgets import QueryBudget, QueryBudgetExceeded, query_budget
+
+
+def _app(strict: bool, default_budget: int = 0):
+    app = Flask(__name__)
+    app.testing = True
+    engine = create_engine('sqlite://')
+    budget = QueryBudget(default_budget=default_budget, strict=strict)
+    budget.init_app(app, engine)
+
+    def run(queries: int):
+        with engine.connect() as connection:
+            for _ in range(queries):
+                connection.execute(text('SELECT 1'))
+        return 'ok'
+
+    @app.route('/budgeted/<int:queries>')
+    @query_budget(2)
+    def budgeted(queries):
+        return run(queries)
+
+    @app.route('/default/<int:queries>')
+    def default(queries):
+        return run(queries)
+
+    class BudgetedResource(Resource):
+        @query_budget(1)
+        def get(self, queries):
+            return run(queries)
+
+    Api(app).add_resource(BudgetedResource, '/resource/<int:queries>')
+    return app, budget
+
+
+class TestQueryBudget:
+    def test_within_budget(self):
+        app, budget = _app(strict=True)
+        expect(app.test_client().get('/budgeted/2').status_code).to(equal(200))
+        expect(budget.stats()['budgeted']).to(equal({'requests': 1, 'max_queries': 2, 'exceeded': 0}))
+
+    def test_strict_budget_fails_the_request(self):
+        app, _ = _app(strict=True)
+        with pytest.raises(QueryBudgetExceeded):
+            app.test_client().get('/budgeted/3')
+        with pytest.raises(QueryBudgetExceeded):
+            app.test_client().get('/resource/2')
+
+    def test_budget_is_logged_when_not_strict(self, caplog):
+        app, budget = _app(strict=False)
+        expect(app.test_client().get('/resource/2').status_code).to(equal(200))
+        expect(budget.stats()['budgetedresource']['exceeded']).to(equal(1))
+        expect('over its budget of 1' in caplog.text).to(equal(True))
+
+    def test_default_budget(self):
+        app, _ = _app(strict=True)
+        expect(app.test_client().get('/default/10').status_code).to(equal(200))
+
+        app, _ = _app(strict=True, default_budget=5)
+        with pytest.raises(QueryBudgetExceeded):
+            app.test_client().get('/default/6')
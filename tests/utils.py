@@ -1,6 +1,8 @@
 import json
+from contextlib import contextmanager
 
 from expects import expect, equal, be_above_or_equal
+from sqlalchemy import event
 
 
 def post_users(users, client, token):
@@ -21,3 +23,21 @@ def post_users(users, client, token):
     expect(len(user_ids)).to(be_above_or_equal(len(users)))
 
     return user_ids
+
+
+@contextmanager
+def count_queries(engine):
+    '''
+    Context manager that records every SQL statement executed on `engine`.
+    '''
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)